@@ -1,10 +1,10 @@
 import argparse
-from ethos.utils import get_audio_url, fetch_tracks_list
-from ethos.player import MusicPlayer, TrackInfo
+from ethos.utils import Search, UserFiles
+from ethos.player import MusicPlayer
 from ethos.tools import helper
 from rich.console import Console
 import asyncio
-import time
+import threading
 
 class ArgumentParser():
     """Argument Parser class for ethos cli"""
@@ -31,7 +31,7 @@ class ArgumentParser():
 
         track = args.track if args.track else str(input("Enter track name to play :"))
         self.console.print(f"[cyan]Fetching track: {track}")
-        tracks_list = await fetch_tracks_list(track)
+        tracks_list = await Search.fetch_tracks_list(track)
         track_no = 0
         if not args.track_no:
             if tracks_list:
@@ -39,7 +39,7 @@ class ArgumentParser():
                 self.console.print("\n".join(tracks_list))
                 track_no = int(input("Enter track number :"))
         track_name = helper.Format.clean_hashtag(tracks_list[track_no-1])
-        track_url = get_audio_url(track_name+"official music video")
+        track_url = Search.get_audio_url(track_name+"official music video")
 
         if not track_url:
             self.console.print(f"[red]Could not fetch URL for {track_name}")
@@ -48,14 +48,60 @@ class ArgumentParser():
         volume = args.volume if args.volume else 50
         self.console.print("[deep pink]Playing at default volume: 50")
         self.player.set_volume(volume)
+
+        track_ended = threading.Event()
+        self.player.on("end_reached", lambda event: track_ended.set())
+        self.player.on("error", lambda event: track_ended.set())
         self.player.play(track_url)
         
         self.console.print(f"[deep pink]Playing {track_name}")
-        track_length = TrackInfo.get_audio_duration_int(track_url)
-        while TrackInfo.get_current_time_int(self.player) < track_length:
-            time.sleep(1)
-        if TrackInfo.get_current_time_int(self.player) == track_length:
+        await asyncio.to_thread(track_ended.wait)
+
+    async def watch(self, args) -> None:
+        """Keeps the library index in sync with the music folder until interrupted"""
+        watcher = self.player.watch_library()
+        if not watcher:
+            self.console.print("[red]Local music folder is not set.")
+            return
+        self.console.print(f"[magenta]Watching {self.player.library_path} for changes, press Ctrl+C to stop")
+        try:
+            await asyncio.to_thread(threading.Event().wait)
+        finally:
+            self.player.unwatch_library()
+
+    async def download_playlist(self, args) -> None:
+        """Downloads every track of a playlist into the audio cache for offline playback"""
+        tracks = UserFiles.fetch_tracks_from_playlist(args.playlist)
+        if not tracks:
+            self.console.print(f"[red]Playlist {args.playlist} is empty or does not exist.")
+            return
+        finished = []
+
+        def progress(track):
+            finished.append(track)
+            if track.status == "downloaded":
+                detail = f"{track.bytes / 2**20:.1f} MiB in {track.seconds:.1f}s ({track.throughput / 2**20:.2f} MiB/s)"
+            else:
+                detail = track.error or track.status
+            self.console.print(f"[cyan][{len(finished)}/{len(tracks)}] {track.track}: {detail}")
+
+        self.console.print(f"[magenta]Downloading {len(tracks)} tracks of {args.playlist}")
+        try:
+            report = await Search.sync_tracks(tracks, progress)
+        finally:
+            Search.close_resolver_pool()
+            Search.close_audio_proxy()
+        self.console.print(f"[deep pink]{report.summary()}")
+
+    async def stats(self, args) -> None:
+        """Shows the most played tracks of a period"""
+        try:
+            lines = UserFiles.listening_stats(args.period, args.limit)
+        except ValueError as e:
+            self.console.print(f"[red]{e}")
             return
+        self.console.print(f"[magenta]Listening stats ({args.period}):")
+        self.console.print("\n".join(lines))
 
     async def listen(self) -> None:
         """Listens to commands from cli"""
@@ -76,6 +122,18 @@ class ArgumentParser():
         self.play_parser.add_argument("volume", type=int, nargs="?", help="volume of the player")
         self.play_parser.set_defaults(func=self.play)
 
+        self.watch_parser = self.subparsers.add_parser("watch", help="keep the library index in sync with the music folder")
+        self.watch_parser.set_defaults(func=self.watch)
+
+        self.download_parser = self.subparsers.add_parser("download-playlist", help="download a playlist for offline playback")
+        self.download_parser.add_argument("playlist", type=str, help="name of the playlist to download")
+        self.download_parser.set_defaults(func=self.download_playlist)
+
+        self.stats_parser = self.subparsers.add_parser("stats", help="show the most played tracks")
+        self.stats_parser.add_argument("period", type=str, nargs="?", default="month", help="today, week, month, year or all")
+        self.stats_parser.add_argument("--limit", type=int, default=10, help="number of tracks to show")
+        self.stats_parser.set_defaults(func=self.stats)
+
         self.args = self.parser.parse_args()
 
         if hasattr(self.args, "func"):
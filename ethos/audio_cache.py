@@ -0,0 +1,392 @@
+import re
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import httpx
+
+CHUNK_SIZE = 64 * 1024
+# A range starting further than this past the downloaded bytes is fetched from
+# upstream directly instead of waiting for the download to get there
+LOOKAHEAD = 2 * 1024 * 1024
+
+
+class AudioCache:
+    """
+    Size-bounded on-disk cache of streamed audio, keyed by YouTube video id.
+
+    Audio is stored as `<key>.audio` in `directory` and indexed in `audio.db`.
+    Once the stored audio exceeds `max_bytes`, complete entries are evicted least
+    recently used first (`policy="lru"`) or least often used first (`policy="lfu"`).
+    Entries left incomplete by an interrupted download are discarded on start-up.
+    """
+    def __init__(self, directory: Optional[Path] = None, max_bytes: int = 2 * 1024 ** 3, policy: str = "lru"):
+        if policy not in ("lru", "lfu"):
+            raise ValueError(f"Unknown eviction policy: {policy}")
+        self.directory = directory or Path.home() / ".ethos" / "audio"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.directory / "audio.db", check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL DEFAULT 0,
+                    content_type TEXT,
+                    complete INTEGER NOT NULL DEFAULT 0,
+                    uses INTEGER NOT NULL DEFAULT 0,
+                    last_used REAL NOT NULL
+                );
+            """)
+            for (key,) in self.conn.execute("SELECT key FROM entries WHERE complete = 0").fetchall():
+                self.path(key).unlink(missing_ok=True)
+            self.conn.execute("DELETE FROM entries WHERE complete = 0")
+
+    def path(self, key: str) -> Path:
+        return self.directory / f"{re.sub(r'[^A-Za-z0-9_-]', '_', key)}.audio"
+
+    def lookup(self, key: str) -> Optional[Path]:
+        """Return the file of a fully cached track and count the use, or None"""
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT complete FROM entries WHERE key = ?", (key,)).fetchone()
+            if not row or not row[0] or not self.path(key).exists():
+                return None
+            self.conn.execute("UPDATE entries SET uses = uses + 1, last_used = ? WHERE key = ?", (time.time(), key))
+        return self.path(key)
+
+    def is_complete(self, key: str) -> bool:
+        with self.lock:
+            row = self.conn.execute("SELECT complete FROM entries WHERE key = ?", (key,)).fetchone()
+        return bool(row and row[0]) and self.path(key).exists()
+
+    def content_type(self, key: str) -> Optional[str]:
+        with self.lock:
+            row = self.conn.execute("SELECT content_type FROM entries WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def begin(self, key: str, content_type: Optional[str]) -> Path:
+        """Start storing a track, returning the file to write it to"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries (key, content_type, complete, uses, last_used) VALUES (?, ?, 0, 1, ?)",
+                (key, content_type, time.time()),
+            )
+        return self.path(key)
+
+    def finish(self, key: str, protected: frozenset = frozenset()) -> None:
+        """Mark a track as fully stored and evict other entries if the cache is over its size limit"""
+        size = self.path(key).stat().st_size
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE entries SET size = ?, complete = 1 WHERE key = ?", (size, key))
+        self.evict(protected | {key})
+
+    def discard(self, key: str) -> None:
+        """Forget a track whose download failed"""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+        self.path(key).unlink(missing_ok=True)
+
+    def evict(self, protected: frozenset = frozenset()) -> list[str]:
+        """Evict complete entries until the cache fits in `max_bytes`, sparing `protected` keys"""
+        order = "last_used" if self.policy == "lru" else "uses, last_used"
+        evicted = []
+        with self.lock, self.conn:
+            total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            for key, size in self.conn.execute(f"SELECT key, size FROM entries WHERE complete = 1 ORDER BY {order}").fetchall():
+                if total <= self.max_bytes:
+                    break
+                if key in protected:
+                    continue
+                self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.path(key).unlink(missing_ok=True)
+                total -= size
+                evicted.append(key)
+        return evicted
+
+    def stats(self) -> dict:
+        """Number and total size of the fully cached tracks"""
+        with self.lock:
+            entries, size = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries WHERE complete = 1"
+            ).fetchone()
+        return {"entries": entries, "bytes": size, "max_bytes": self.max_bytes, "policy": self.policy}
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+class Download(threading.Thread):
+    """Downloads a track into the cache while the proxy serves the bytes already written"""
+    def __init__(self, proxy: "AudioProxy", key: str, url: str):
+        super().__init__(name=f"ethos-audio-{key}", daemon=True)
+        self.proxy = proxy
+        self.key = key
+        self.url = url
+        self.path: Optional[Path] = None
+        self.content_type: Optional[str] = None
+        self.total: Optional[int] = None
+        self.written = 0
+        self.started_headers = False
+        self.done = False
+        self.error: Optional[Exception] = None
+        self.condition = threading.Condition()
+
+    def run(self) -> None:
+        try:
+            with self.proxy.client.stream("GET", self.url) as response:
+                response.raise_for_status()
+                length = response.headers.get("Content-Length")
+                with self.condition:
+                    self.total = int(length) if length else None
+                    self.content_type = response.headers.get("Content-Type")
+                    self.path = self.proxy.cache.begin(self.key, self.content_type)
+                    file = open(self.path, "wb")
+                    self.started_headers = True
+                    self.condition.notify_all()
+                with file:
+                    for chunk in response.iter_bytes(CHUNK_SIZE):
+                        file.write(chunk)
+                        file.flush()
+                        with self.condition:
+                            self.written += len(chunk)
+                            self.condition.notify_all()
+            if self.total is not None and self.written != self.total:
+                raise IOError(f"Incomplete download: {self.written} of {self.total} bytes")
+            self.total = self.written
+            if not self.proxy.stopped:
+                self.proxy.cache.finish(self.key, self.proxy.active_keys())
+        except Exception as e:
+            self.error = e
+            if not self.proxy.stopped:
+                self.proxy.cache.discard(self.key)
+        finally:
+            with self.condition:
+                self.done = True
+                self.condition.notify_all()
+            self.proxy.forget(self)
+
+    def wait_for_headers(self, timeout: float) -> bool:
+        with self.condition:
+            return self.condition.wait_for(lambda: self.started_headers or self.done, timeout)
+
+    def available(self, offset: int, timeout: float = 30) -> int:
+        """Wait until the byte at `offset` is written, or the download ends. Returns the bytes written."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.written > offset or self.done, timeout)
+            return self.written
+
+
+class AudioProxy:
+    """
+    Local HTTP server on 127.0.0.1 that plays streamed tracks through the audio cache.
+
+    The first request for a track starts a download that tees the upstream stream
+    into the cache. Range requests are answered from the bytes downloaded so far,
+    waiting for the download to catch up, or, for a seek far beyond it, from
+    upstream directly. Fully cached tracks are played from disk.
+    """
+    def __init__(self, cache: AudioCache):
+        self.cache = cache
+        self.client = httpx.Client(follow_redirects=True, timeout=httpx.Timeout(30.0, connect=10.0))
+        self.sources: dict[str, str] = {}
+        self.downloads: dict[str, Download] = {}
+        self.lock = threading.Lock()
+        self.server: Optional[ThreadingHTTPServer] = None
+        self.thread: Optional[threading.Thread] = None
+        self.stopped = False
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    def start(self) -> None:
+        """Start serving in a background thread on a free port"""
+        if self.server:
+            return
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="ethos-audio-proxy", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """Stop serving and abort running downloads, which are discarded on the next start"""
+        self.stopped = True
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        self.client.close()
+        with self.lock:
+            downloads = list(self.downloads.values())
+        for download in downloads:
+            download.join(timeout=2)
+
+    def source(self, key: str, url: str) -> str:
+        """
+        Return what the player should open for a track.
+
+        Args:
+        - key (str): Stable id of the track, e.g. its YouTube video id.
+        - url (str): The upstream stream URL.
+
+        Returns:
+        - str: The cached file if the track is fully cached, otherwise a 127.0.0.1 URL.
+        """
+        path = self.cache.lookup(key)
+        if path:
+            return str(path)
+        self.start()
+        with self.lock:
+            self.sources[key] = url
+        return f"http://127.0.0.1:{self.port}/stream/{key}"
+
+    def download(self, key: str) -> Optional[Download]:
+        """Return the running download of a track, starting it if needed"""
+        with self.lock:
+            download = self.downloads.get(key)
+            if download is None and key in self.sources and not self.cache.is_complete(key):
+                download = self.downloads[key] = Download(self, key, self.sources[key])
+                download.start()
+            return download
+
+    def forget(self, download: Download) -> None:
+        with self.lock:
+            if self.downloads.get(download.key) is download:
+                del self.downloads[download.key]
+
+    def active_keys(self) -> frozenset:
+        with self.lock:
+            return frozenset(self.downloads)
+
+    def handler(self):
+        proxy = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                match = re.fullmatch(r"/stream/([A-Za-z0-9_-]+)", self.path)
+                if not match:
+                    self.send_error(404)
+                    return
+                try:
+                    proxy.serve(self, match.group(1))
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+        return Handler
+
+    @staticmethod
+    def parse_range(header: Optional[str], total: Optional[int]) -> Optional[tuple[int, Optional[int]]]:
+        """Parse a single `bytes=start-end` range, returning (start, end) with `end` inclusive"""
+        match = re.fullmatch(r"bytes=(\d*)-(\d*)", header or "")
+        if not match or not (match.group(1) or match.group(2)):
+            return None
+        if not match.group(1):
+            if total is None:
+                return None
+            return max(0, total - int(match.group(2))), total - 1
+        end = int(match.group(2)) if match.group(2) else None
+        if total is not None:
+            end = total - 1 if end is None else min(end, total - 1)
+        return int(match.group(1)), end
+
+    def serve(self, request: BaseHTTPRequestHandler, key: str) -> None:
+        download = self.download(key)
+        if download is None:
+            if self.cache.is_complete(key):
+                self.serve_file(request, key)
+            else:
+                request.send_error(404)
+            return
+        if not download.wait_for_headers(30):
+            # the origin has not answered yet, there is no file to serve from
+            request.send_error(504)
+            return
+        if download.error or download.path is None or download.total is None and download.done:
+            request.send_error(502)
+            return
+
+        byte_range = self.parse_range(request.headers.get("Range"), download.total)
+        if byte_range and byte_range[0] > download.written + LOOKAHEAD:
+            self.passthrough(request, download.url, byte_range)
+            return
+
+        start, end = self.respond_headers(request, download.total, download.content_type)
+        with open(download.path, "rb") as file:
+            position = start
+            while end is None or position <= end:
+                written = download.available(position)
+                if written <= position:
+                    break
+                file.seek(position)
+                length = written - position if end is None else min(written, end + 1) - position
+                while length > 0:
+                    data = file.read(min(CHUNK_SIZE, length))
+                    if not data:
+                        break
+                    request.wfile.write(data)
+                    position += len(data)
+                    length -= len(data)
+
+    def serve_file(self, request: BaseHTTPRequestHandler, key: str) -> None:
+        path = self.cache.path(key)
+        start, end = self.respond_headers(request, path.stat().st_size, self.cache.content_type(key))
+        with open(path, "rb") as file:
+            file.seek(start)
+            self.copy(file, request, end - start + 1)
+
+    def respond_headers(self, request: BaseHTTPRequestHandler, total: Optional[int], content_type: Optional[str]) -> tuple[int, Optional[int]]:
+        """Send the status and headers of a full or range response, returning the byte range to send"""
+        byte_range = self.parse_range(request.headers.get("Range"), total)
+        if byte_range and total is not None and byte_range[0] >= total:
+            request.send_response(416)
+            request.send_header("Content-Range", f"bytes */{total}")
+            request.send_header("Content-Length", "0")
+            request.end_headers()
+            return 0, -1
+        if byte_range and total is not None:
+            start, end = byte_range
+            request.send_response(206)
+            request.send_header("Content-Range", f"bytes {start}-{end}/{total}")
+        else:
+            start, end = 0, total - 1 if total is not None else None
+            request.send_response(200)
+        request.send_header("Accept-Ranges", "bytes" if total is not None else "none")
+        request.send_header("Content-Type", content_type or "application/octet-stream")
+        if end is not None:
+            request.send_header("Content-Length", str(end - start + 1))
+        else:
+            request.send_header("Connection", "close")
+            request.close_connection = True
+        request.end_headers()
+        return start, end
+
+    def passthrough(self, request: BaseHTTPRequestHandler, url: str, byte_range: tuple[int, Optional[int]]) -> None:
+        """Relay a range request to upstream without caching it"""
+        start, end = byte_range
+        headers = {"Range": f"bytes={start}-{'' if end is None else end}"}
+        with self.client.stream("GET", url, headers=headers) as response:
+            request.send_response(response.status_code)
+            for header in ("Content-Type", "Content-Length", "Content-Range", "Accept-Ranges"):
+                if header in response.headers:
+                    request.send_header(header, response.headers[header])
+            request.end_headers()
+            for chunk in response.iter_bytes(CHUNK_SIZE):
+                request.wfile.write(chunk)
+
+    @staticmethod
+    def copy(file, request: BaseHTTPRequestHandler, length: int) -> None:
+        while length > 0:
+            data = file.read(min(CHUNK_SIZE, length))
+            if not data:
+                break
+            request.wfile.write(data)
+            length -= len(data)
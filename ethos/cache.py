@@ -0,0 +1,246 @@
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from typing import Optional
+from urllib.parse import urlparse, parse_qs
+
+
+class StreamCache:
+    """
+    Persistent cache of resolved YouTube streams.
+
+    Maps a normalized search query to the video id and the resolved stream URL.
+    googlevideo stream URLs carry their own expiry; once it has passed only the
+    stream URL needs resolving again, from the cached video id, instead of a full
+    search. Entries are evicted least recently used first beyond `max_entries`.
+    """
+    def __init__(self, db_path: Optional[Path] = None, max_entries: int = 2000, expiry_margin: float = 300):
+        self.db_path = db_path or Path.home() / ".ethos" / "cache.db"
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.expiry_margin = expiry_margin
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS streams (
+                    query TEXT PRIMARY KEY,
+                    video_id TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    expires REAL,
+                    last_used REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS streams_last_used ON streams (last_used);
+            """)
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """Normalize a search query so that case and spacing differences share an entry"""
+        return " ".join(query.lower().split())
+
+    @staticmethod
+    def url_expiry(url: str) -> Optional[float]:
+        """
+        Read the expiry timestamp embedded in a googlevideo stream URL.
+
+        It is either an `expire` query parameter or an `/expire/<timestamp>/` path segment.
+
+        Returns:
+        - float: The unix timestamp the URL expires at, or None if it has none.
+        """
+        parsed = urlparse(url)
+        expire = parse_qs(parsed.query).get("expire")
+        if expire:
+            try:
+                return float(expire[0])
+            except ValueError:
+                return None
+        parts = parsed.path.split("/")
+        if "expire" in parts:
+            index = parts.index("expire")
+            try:
+                return float(parts[index + 1])
+            except (IndexError, ValueError):
+                return None
+        return None
+
+    def get(self, query: str) -> Optional[tuple[str, Optional[str]]]:
+        """
+        Look up a query.
+
+        Returns:
+        - tuple: (video id, stream URL) on a hit. The URL is None when it has expired
+                 and must be resolved again from the video id. None on a miss.
+        """
+        key = self.normalize(query)
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT video_id, url, expires FROM streams WHERE query = ?", (key,)).fetchone()
+            if not row:
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE streams SET last_used = ? WHERE query = ?", (time.time(), key))
+
+        video_id, url, expires = row
+        if expires is not None and expires - self.expiry_margin <= time.time():
+            self.expired += 1
+            return video_id, None
+        self.hits += 1
+        return video_id, url
+
+    def put(self, query: str, video_id: str, url: str) -> None:
+        """Store the resolved stream of a query, evicting the least recently used entries if full"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO streams (query, video_id, url, expires, last_used) VALUES (?, ?, ?, ?, ?)",
+                (self.normalize(query), video_id, url, self.url_expiry(url), time.time()),
+            )
+            self.conn.execute(
+                "DELETE FROM streams WHERE query IN "
+                "(SELECT query FROM streams ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def stats(self) -> dict:
+        """Hit, miss and expiry counters of this session and the number of cached streams"""
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM streams").fetchone()[0]
+        lookups = self.hits + self.misses + self.expired
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+        }
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+class SearchCache:
+    """
+    Two-tier cache of search results, keyed by search type and normalized query.
+
+    A small in-memory LRU sits in front of an on-disk table that survives restarts.
+    Results younger than `ttl` are fresh. Older results are still served, but
+    reported as stale so the caller can refresh them in the background, until they
+    are older than `max_stale`, after which they count as a miss.
+    """
+    def __init__(self, db_path: Optional[Path] = None, ttl: float = 3600, max_stale: float = 7 * 24 * 3600,
+                 memory_entries: int = 256, max_entries: int = 5000):
+        self.db_path = db_path or Path.home() / ".ethos" / "cache.db"
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self.memory: OrderedDict[str, tuple[list, float]] = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS searches (
+                    key TEXT PRIMARY KEY,
+                    results TEXT NOT NULL,
+                    fetched REAL NOT NULL,
+                    last_used REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS searches_last_used ON searches (last_used);
+            """)
+
+    @staticmethod
+    def key(kind: str, query: str) -> str:
+        return f"{kind}:{StreamCache.normalize(query)}"
+
+    def get(self, kind: str, query: str) -> Optional[tuple[list, bool]]:
+        """
+        Look up the results of a search.
+
+        Returns:
+        - tuple: (results, stale) on a hit, where `stale` means the results are older
+                 than the TTL and should be refreshed. None on a miss.
+        """
+        key = self.key(kind, query)
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry:
+                self.memory.move_to_end(key)
+                in_memory = True
+            else:
+                in_memory = False
+                with self.conn:
+                    row = self.conn.execute("SELECT results, fetched FROM searches WHERE key = ?", (key,)).fetchone()
+                    if row:
+                        self.conn.execute("UPDATE searches SET last_used = ? WHERE key = ?", (now, key))
+                        entry = json.loads(row[0]), row[1]
+                        self._remember(key, entry)
+
+            if not entry or now - entry[1] > self.max_stale:
+                self.misses += 1
+                return None
+            stale = now - entry[1] > self.ttl
+            if stale:
+                self.stale_hits += 1
+            elif in_memory:
+                self.memory_hits += 1
+            else:
+                self.disk_hits += 1
+        return entry[0], stale
+
+    def put(self, kind: str, query: str, results: list) -> None:
+        """Store the results of a search, evicting the least recently used entries if full"""
+        key = self.key(kind, query)
+        now = time.time()
+        with self.lock, self.conn:
+            self._remember(key, (results, now))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO searches (key, results, fetched, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(results), now, now),
+            )
+            self.conn.execute(
+                "DELETE FROM searches WHERE key IN "
+                "(SELECT key FROM searches ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def _remember(self, key: str, entry: tuple[list, float]) -> None:
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Hit and miss counters of this session and the number of cached searches"""
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM searches").fetchone()[0]
+            memory = len(self.memory)
+        hits = self.memory_hits + self.disk_hits + self.stale_hits
+        lookups = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_entries": memory,
+            "entries": entries,
+        }
+
+    def clear(self) -> None:
+        with self.lock, self.conn:
+            self.memory.clear()
+            self.conn.execute("DELETE FROM searches")
+
+    def close(self) -> None:
+        self.conn.close()
@@ -5,6 +5,12 @@ from typing import Optional
 
 load_dotenv()
 
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.flac', '.m4a')
+SEARCH_CACHE_TTL = 3600.0
+RESOLVER_WORKERS = 2
+AUDIO_CACHE_SIZE_MB = 2048
+AUDIO_CACHE_POLICY = "lru"
+
 class ConfigManager:
     """
     Manages the configuration for the application, including methods
@@ -24,16 +30,81 @@ class ConfigManager:
             return Path(self.env_music_folder)
         return None
 
-    def get_music_folder_from_rc(self) -> Optional[Path]:
+    def get_from_rc(self, key: str) -> Optional[str]:
+        """Read the value of `key` from the configuration file, if set"""
         if self.config_file.exists():
             with open(self.config_file, "r") as file:
                 for line in file:
-                    if line.startswith("MUSIC_FOLDER="):
-                        music_folder = line.split("=", 1)[1].strip()
-                        if music_folder:
-                            return Path(music_folder)
+                    if line.startswith(f"{key}="):
+                        value = line.split("=", 1)[1].strip()
+                        if value:
+                            return value
+        return None
+
+    def get_music_folder_from_rc(self) -> Optional[Path]:
+        music_folder = self.get_from_rc("MUSIC_FOLDER")
+        if music_folder:
+            return Path(music_folder)
         return None
 
+    def get_audio_extensions(self) -> tuple[str, ...]:
+        """
+        Retrieve the audio file extensions indexed from the music folder.
+
+        Read as a comma separated list (e.g. `.mp3,.flac,.ogg`) from the `AUDIO_EXTENSIONS`
+        environment variable, then the configuration file, falling back to `AUDIO_EXTENSIONS`.
+        """
+        extensions = os.getenv("AUDIO_EXTENSIONS") or self.get_from_rc("AUDIO_EXTENSIONS")
+        if not extensions:
+            return AUDIO_EXTENSIONS
+        return tuple(
+            "." + extension.strip().lstrip(".").lower()
+            for extension in extensions.split(",")
+            if extension.strip()
+        )
+
+    def get_search_cache_ttl(self) -> float:
+        """
+        Retrieve how long cached search results stay fresh, in seconds.
+
+        Read from the `SEARCH_CACHE_TTL` environment variable, then the configuration file,
+        falling back to `SEARCH_CACHE_TTL`.
+        """
+        ttl = os.getenv("SEARCH_CACHE_TTL") or self.get_from_rc("SEARCH_CACHE_TTL")
+        try:
+            return float(ttl) if ttl else SEARCH_CACHE_TTL
+        except ValueError:
+            return SEARCH_CACHE_TTL
+
+    def get_resolver_workers(self) -> int:
+        """
+        Retrieve the number of yt-dlp worker processes resolving stream URLs.
+
+        Read from the `RESOLVER_WORKERS` environment variable, then the configuration file,
+        falling back to `RESOLVER_WORKERS`. 0 resolves in the app process instead.
+        """
+        workers = os.getenv("RESOLVER_WORKERS") or self.get_from_rc("RESOLVER_WORKERS")
+        try:
+            return max(0, int(workers)) if workers else RESOLVER_WORKERS
+        except ValueError:
+            return RESOLVER_WORKERS
+
+    def get_audio_cache_settings(self) -> tuple[int, str]:
+        """
+        Retrieve the size limit in bytes and the eviction policy of the streamed audio cache.
+
+        Read from the `AUDIO_CACHE_SIZE` (MiB) and `AUDIO_CACHE_POLICY` (`lru` or `lfu`)
+        environment variables, then the configuration file, falling back to
+        `AUDIO_CACHE_SIZE_MB` and `AUDIO_CACHE_POLICY`.
+        """
+        size = os.getenv("AUDIO_CACHE_SIZE") or self.get_from_rc("AUDIO_CACHE_SIZE")
+        policy = (os.getenv("AUDIO_CACHE_POLICY") or self.get_from_rc("AUDIO_CACHE_POLICY") or AUDIO_CACHE_POLICY).lower()
+        try:
+            size_mb = int(size) if size else AUDIO_CACHE_SIZE_MB
+        except ValueError:
+            size_mb = AUDIO_CACHE_SIZE_MB
+        return size_mb * 1024 * 1024, policy if policy in ("lru", "lfu") else AUDIO_CACHE_POLICY
+
     def prompt_user_for_music_folder(self) -> Path:
         """
         Prompt the user to input their music folder path and save it to the configuration file.
@@ -42,8 +113,13 @@ class ConfigManager:
         """
         music_folder = input("Please enter the path to your music folder: ").strip()
         self.config_dir.mkdir(exist_ok=True)
+        lines = []
+        if self.config_file.exists():
+            with open(self.config_file, "r") as file:
+                lines = [line for line in file if not line.startswith("MUSIC_FOLDER=")]
         with open(self.config_file, "w") as file:
             file.write(f"MUSIC_FOLDER={music_folder}\n")
+            file.writelines(lines)
         return Path(music_folder)
 
     def fetch_config(self) -> Optional[Path]:   #TODO:  use this function to retrieve the spotify api-key also.
@@ -85,5 +161,45 @@ def get_music_folder() -> Optional[Path]:
     return config_manager.fetch_config()
 
 
+def get_audio_extensions() -> tuple[str, ...]:
+    """
+    Retrieves the audio file extensions to index using the `ConfigManager`.
+
+    :return: A tuple of lowercase extensions including the leading dot.
+    """
+    config_manager = ConfigManager()
+    return config_manager.get_audio_extensions()
+
+
+def get_search_cache_ttl() -> float:
+    """
+    Retrieves the search cache TTL using the `ConfigManager`.
+
+    :return: The number of seconds cached search results stay fresh.
+    """
+    config_manager = ConfigManager()
+    return config_manager.get_search_cache_ttl()
+
+
+def get_resolver_workers() -> int:
+    """
+    Retrieves the number of resolver worker processes using the `ConfigManager`.
+
+    :return: The number of worker processes, 0 to resolve in the app process.
+    """
+    config_manager = ConfigManager()
+    return config_manager.get_resolver_workers()
+
+
+def get_audio_cache_settings() -> tuple[int, str]:
+    """
+    Retrieves the streamed audio cache settings using the `ConfigManager`.
+
+    :return: The size limit in bytes and the eviction policy.
+    """
+    config_manager = ConfigManager()
+    return config_manager.get_audio_cache_settings()
+
+
 # FIXME: Handle the case where Windows users accidentally use a single backslash
 # in the path (escape character issues). Implement sanitization for such paths.
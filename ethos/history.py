@@ -0,0 +1,83 @@
+import time
+import threading
+from typing import Optional
+from ethos.userstore import UserStore
+
+FLUSH_BATCH = 32
+FLUSH_INTERVAL = 60.0
+
+
+class PlayLog:
+    """
+    Buffers play events and writes them to the user store in batches.
+
+    The player reports the start of each track, its progress and how it ended; finished
+    plays are kept in memory and written in one transaction once FLUSH_BATCH of them
+    are pending or FLUSH_INTERVAL seconds passed since the last write, instead of one
+    commit per play. `close` writes whatever is still pending.
+    """
+    def __init__(self, store: UserStore, batch: int = FLUSH_BATCH, interval: float = FLUSH_INTERVAL):
+        self.store = store
+        self.batch = batch
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.pending: list[dict] = []
+        self.current: Optional[dict] = None
+        self.last_flush = time.monotonic()
+
+    def started(self, track: str, source: str, track_id: Optional[str] = None) -> None:
+        """
+        Start logging a play. A play still in progress is finished as skipped.
+
+        Args:
+        - track (str): The track, as "<song> by <artist>".
+        - source (str): "local" for library files, "stream" otherwise.
+        """
+        self.finished(skipped=True)
+        with self.lock:
+            self.current = {"track": track, "track_id": track_id, "source": source,
+                            "started_at": time.time(), "listened": 0.0, "skipped": False}
+
+    def progress(self, seconds: float) -> None:
+        """Record how far into the current track playback got"""
+        with self.lock:
+            if self.current:
+                self.current["listened"] = max(self.current["listened"], seconds)
+
+    def finished(self, skipped: bool = False) -> None:
+        """Finish the current play, if any, and queue it for writing"""
+        with self.lock:
+            if not self.current:
+                return
+            self.current["skipped"] = skipped
+            self.pending.append(self.current)
+            self.current = None
+            due = len(self.pending) >= self.batch or time.monotonic() - self.last_flush >= self.interval
+        if due:
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        Write the pending plays in one transaction.
+
+        Returns:
+        - int: Number of plays written.
+        """
+        with self.lock:
+            plays, self.pending = self.pending, []
+            self.last_flush = time.monotonic()
+        if not plays:
+            return 0
+        try:
+            self.store.record_plays(plays)
+        except Exception as e:
+            print(f"Error writing play history: {e}")
+            with self.lock:
+                self.pending[:0] = plays
+            return 0
+        return len(plays)
+
+    def close(self) -> None:
+        """Finish the current play and write everything pending"""
+        self.finished(skipped=False)
+        self.flush()
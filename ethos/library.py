@@ -0,0 +1,467 @@
+import os
+import re
+import sqlite3
+import threading
+import itertools
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, List, Iterable, Iterator, Callable
+from ethos.config import AUDIO_EXTENSIONS
+
+# Number of probed tracks written to the index per transaction
+BATCH_SIZE = 200
+# Change sets smaller than this are probed in-process rather than paying for a process pool
+PARALLEL_THRESHOLD = 32
+
+
+@dataclass
+class LibraryTrack:
+    """A track stored in the library index. Duration is in seconds."""
+    path: str
+    size: int
+    mtime: float
+    duration: int = 0
+    title: Optional[str] = None
+    artist: Optional[str] = None
+    album: Optional[str] = None
+
+
+def probe_file(path: str) -> dict:
+    """
+    Read the duration and tags of a local audio file with libvlc.
+
+    Args:
+    - path (str): The full path to the audio file.
+
+    Returns:
+    - dict: The duration, title, artist and album of the file. Tags missing from the
+            file are None and the title falls back to the file name.
+    """
+    from ethos.player import TrackInfo, TrackMetadata
+    import vlc
+
+    metadata = TrackMetadata()
+    try:
+        media = vlc.Media(path)
+        if TrackInfo.parse_media(media):
+            metadata = TrackInfo._read_metadata(media)
+    except Exception as e:
+        print(f"Error probing {path}: {e}")
+
+    return {
+        "duration": metadata.duration,
+        "title": metadata.tags.get("title") or Path(path).stem,
+        "artist": metadata.tags.get("artist"),
+        "album": metadata.tags.get("album"),
+    }
+
+
+def _probe_row(probe: Callable[[str], dict], path: str, directory: str, size: int, mtime: float) -> tuple:
+    """Probe a file and return its row for the tracks table"""
+    tags = probe(path)
+    return (path, directory, size, mtime, tags["duration"], tags["title"], tags["artist"], tags["album"])
+
+
+class LibraryIndex:
+    """
+    Persistent index of the local music library.
+
+    Tracks are stored with their size, mtime, duration and tags in a SQLite database
+    (`~/.ethos/library.db`). Rescans only list directories whose mtime changed since the
+    last scan and only probe files whose size or mtime changed.
+    """
+    def __init__(self, db_path: Optional[Path] = None, extensions: Iterable[str] = AUDIO_EXTENSIONS,
+                 probe: Optional[Callable[[str], dict]] = None):
+        self.db_path = db_path or Path.home() / ".ethos" / "library.db"
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.extensions = tuple(extension.lower() for extension in extensions)
+        self.probe = probe
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.create_function("file_stem", 1, lambda path: Path(path).stem, deterministic=True)
+        # Lets INSERT OR REPLACE fire the delete trigger that keeps the search index in sync
+        self.conn.execute("PRAGMA recursive_triggers = ON")
+        self.lock = threading.RLock()
+        self._create_tables()
+
+    def _create_tables(self) -> None:
+        with self.lock, self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS tracks (
+                    path TEXT PRIMARY KEY,
+                    directory TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime REAL NOT NULL,
+                    duration INTEGER NOT NULL DEFAULT 0,
+                    title TEXT,
+                    artist TEXT,
+                    album TEXT
+                );
+                CREATE INDEX IF NOT EXISTS tracks_directory ON tracks (directory);
+                CREATE INDEX IF NOT EXISTS tracks_artist ON tracks (artist COLLATE NOCASE);
+                CREATE INDEX IF NOT EXISTS tracks_album ON tracks (album COLLATE NOCASE);
+
+                CREATE TABLE IF NOT EXISTS directories (
+                    path TEXT PRIMARY KEY,
+                    parent TEXT,
+                    mtime REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS directories_parent ON directories (parent);
+            """)
+            has_search = self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tracks_search'"
+            ).fetchone()
+            self.conn.executescript("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS tracks_search USING fts5 (
+                    title, artist, filename,
+                    tokenize = 'unicode61 remove_diacritics 2',
+                    prefix = '1 2 3'
+                );
+                CREATE TRIGGER IF NOT EXISTS tracks_search_insert AFTER INSERT ON tracks BEGIN
+                    INSERT INTO tracks_search (rowid, title, artist, filename)
+                    VALUES (new.rowid, new.title, new.artist, file_stem(new.path));
+                END;
+                CREATE TRIGGER IF NOT EXISTS tracks_search_delete AFTER DELETE ON tracks BEGIN
+                    DELETE FROM tracks_search WHERE rowid = old.rowid;
+                END;
+            """)
+            if not has_search:
+                self.conn.execute(
+                    "INSERT INTO tracks_search (rowid, title, artist, filename) "
+                    "SELECT rowid, title, artist, file_stem(path) FROM tracks"
+                )
+
+    def scan(self, root: Path, workers: Optional[int] = None,
+             progress: Optional[Callable[[int, int], None]] = None,
+             stop: Optional[threading.Event] = None) -> int:
+        """
+        Bring the index up to date with the files under `root`.
+
+        Directories whose mtime did not change are not listed again; their known
+        subdirectories are visited from the index instead. New or modified files are
+        probed across a process pool and written back in batches, so an interrupted
+        scan keeps every finished batch and resumes from there on the next run.
+
+        Args:
+        - root (Path): The library folder to scan.
+        - workers (int): Number of probing processes. Defaults to the CPU count, 0 probes in-process.
+        - progress (Callable): Called with (probed, total) after each batch is written.
+        - stop (threading.Event): Ends the scan early, between directories or batches, once set.
+
+        Returns:
+        - int: The number of tracks that were added, updated or removed.
+        """
+        root = str(Path(root).resolve())
+        return self._update([(root, None)], workers=workers, progress=progress, batch_size=BATCH_SIZE, stop=stop)
+
+    def refresh(self, directories: Iterable[str], workers: Optional[int] = 0) -> int:
+        """
+        Re-read directories reported changed by a file system watcher.
+
+        Each directory is listed even if its mtime did not change (files modified in
+        place do not touch it), its subtree is brought up to date and everything is
+        written in a single transaction.
+
+        Args:
+        - directories (Iterable[str]): The changed directories.
+        - workers (int): Number of probing processes. Defaults to probing in-process.
+
+        Returns:
+        - int: The number of tracks that were added, updated or removed.
+        """
+        roots = []
+        with self.lock:
+            for directory in {str(Path(directory).resolve()) for directory in directories}:
+                row = self.conn.execute("SELECT parent FROM directories WHERE path = ?", (directory,)).fetchone()
+                roots.append((directory, row[0] if row else os.path.dirname(directory)))
+        return self._update(roots, workers=workers, force={root for root, _ in roots})
+
+    def _update(self, roots: list[tuple[str, Optional[str]]], workers: Optional[int] = None,
+                progress: Optional[Callable[[int, int], None]] = None, force: Iterable[str] = (),
+                batch_size: Optional[int] = None, stop: Optional[threading.Event] = None) -> int:
+        """Walk the given (directory, parent) roots and bring their subtrees up to date"""
+        changes = 0
+        seen = set()
+        stack = list(roots)
+        directories = {}
+        to_probe = []
+
+        while stack:
+            if stop and stop.is_set():
+                return changes
+            directory, parent = stack.pop()
+            try:
+                mtime = os.stat(directory).st_mtime
+            except OSError:
+                continue
+            seen.add(directory)
+
+            with self.lock:
+                row = self.conn.execute("SELECT mtime FROM directories WHERE path = ?", (directory,)).fetchone()
+                if row and row[0] == mtime and directory not in force:
+                    subdirs = self.conn.execute("SELECT path FROM directories WHERE parent = ?", (directory,)).fetchall()
+                    stack.extend((subdir, directory) for (subdir,) in subdirs)
+                    continue
+
+            subdirs, files = self._list_directory(directory)
+            stack.extend((subdir, directory) for subdir in subdirs)
+            with self.lock, self.conn:
+                # Remember new subdirectories right away so an interrupted scan still visits them
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO directories (path, parent, mtime) VALUES (?, ?, -1)",
+                    ((subdir, directory) for subdir in subdirs),
+                )
+            changed, removed = self._diff_directory(directory, files)
+            to_probe.extend(changed)
+            changes += removed
+            directories[directory] = (parent, mtime)
+
+        changes += self._probe_and_store(to_probe, directories, workers, progress, batch_size, stop)
+        if stop and stop.is_set():
+            return changes
+        for root, _ in roots:
+            changes += self._remove_missing_directories(root, seen)
+        return changes
+
+    def _list_directory(self, directory: str) -> tuple[list[str], list[tuple[str, int, float]]]:
+        """List the subdirectories and audio files (with size and mtime) of a directory"""
+        subdirs, files = [], []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                        elif entry.name.lower().endswith(self.extensions):
+                            stat = entry.stat()
+                            files.append((entry.path, stat.st_size, stat.st_mtime))
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        return subdirs, files
+
+    def _diff_directory(self, directory: str, files: list[tuple[str, int, float]]) -> tuple[list[tuple], int]:
+        """
+        Compare the files of a directory with the index and drop the tracks that are gone.
+
+        Returns:
+        - tuple: The (path, directory, size, mtime) of new or modified files, and the
+                 number of tracks removed.
+        """
+        with self.lock:
+            known = {
+                path: (size, mtime)
+                for path, size, mtime in self.conn.execute(
+                    "SELECT path, size, mtime FROM tracks WHERE directory = ?", (directory,)
+                )
+            }
+        changed = [(path, directory, size, mtime) for path, size, mtime in files if known.get(path) != (size, mtime)]
+        removed = known.keys() - {path for path, _, _ in files}
+        if removed:
+            with self.lock, self.conn:
+                self.conn.executemany("DELETE FROM tracks WHERE path = ?", ((path,) for path in removed))
+        return changed, len(removed)
+
+    def sync_directory(self, directory: str, files: list[tuple[str, int, float]]) -> int:
+        """
+        Update the tracks of a single directory, probing only new or modified files.
+
+        Args:
+        - directory (str): The directory the files belong to.
+        - files (list): (path, size, mtime) of every audio file currently in the directory.
+
+        Returns:
+        - int: The number of tracks that were added, updated or removed.
+        """
+        changed, removed = self._diff_directory(directory, files)
+        return removed + self._probe_and_store(changed, {}, workers=0)
+
+    def _probe_and_store(self, to_probe: list[tuple], directories: dict, workers: Optional[int] = None,
+                         progress: Optional[Callable[[int, int], None]] = None,
+                         batch_size: Optional[int] = None, stop: Optional[threading.Event] = None) -> int:
+        """
+        Probe files and write them to the index in batches of `batch_size` (all at once if None),
+        stopping after the current batch once `stop` is set.
+
+        A directory's mtime is only recorded once all of its files are written, so a
+        directory interrupted mid-scan is listed again on the next scan.
+        """
+        remaining = Counter(directory for _, directory, _, _ in to_probe)
+        self._store_batch([], [directory for directory in directories if not remaining[directory]], directories)
+
+        batch = []
+        stored = 0
+        for row in self._probe_files(to_probe, workers):
+            batch.append(row)
+            if batch_size and len(batch) >= batch_size:
+                stored += self._flush(batch, remaining, directories)
+                if progress:
+                    progress(stored, len(to_probe))
+                if stop and stop.is_set():
+                    break
+        if batch:
+            stored += self._flush(batch, remaining, directories)
+            if progress:
+                progress(stored, len(to_probe))
+        return stored
+
+    def _flush(self, batch: list[tuple], remaining: Counter, directories: dict) -> int:
+        """Write a batch of probed tracks and record the directories it completes"""
+        finished = []
+        for row in batch:
+            remaining[row[1]] -= 1
+            if not remaining[row[1]] and row[1] in directories:
+                finished.append(row[1])
+        count = len(batch)
+        self._store_batch(batch, finished, directories)
+        batch.clear()
+        return count
+
+    def _store_batch(self, rows: list[tuple], finished: list[str], directories: dict) -> None:
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO tracks (path, directory, size, mtime, duration, title, artist, album) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO directories (path, parent, mtime) VALUES (?, ?, ?)",
+                ((directory, *directories[directory]) for directory in finished),
+            )
+
+    def _probe_files(self, to_probe: list[tuple], workers: Optional[int] = None) -> Iterator[tuple]:
+        """
+        Probe files and yield index rows as they complete.
+
+        Small change sets are probed in-process; larger ones are fanned out across a
+        process pool with a bounded number of files in flight.
+        """
+        probe = self.probe or probe_file
+        workers = (os.cpu_count() or 1) if workers is None else workers
+        if workers == 0 or len(to_probe) < PARALLEL_THRESHOLD:
+            for entry in to_probe:
+                yield _probe_row(probe, *entry)
+            return
+
+        entries = iter(to_probe)
+        # Forking from the watcher thread of a process running Textual and libvlc is unsafe
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            in_flight = set()
+            for entry in itertools.islice(entries, workers * 4):
+                in_flight.add(executor.submit(_probe_row, probe, *entry))
+            try:
+                while in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+                        entry = next(entries, None)
+                        if entry is not None:
+                            in_flight.add(executor.submit(_probe_row, probe, *entry))
+            finally:
+                # An abandoned scan does not wait for the files still queued
+                for future in in_flight:
+                    future.cancel()
+
+    def _remove_missing_directories(self, root: str, seen: set) -> int:
+        """Drop directories under `root` that no longer exist, along with their tracks"""
+        with self.lock, self.conn:
+            known = [path for (path,) in self.conn.execute(
+                "SELECT path FROM directories WHERE path = ? OR (path >= ? AND path < ?)",
+                (root, *self._prefix_range(root)),
+            )]
+            missing = [path for path in known if path not in seen]
+            removed = 0
+            for path in missing:
+                removed += self.conn.execute("DELETE FROM tracks WHERE directory = ?", (path,)).rowcount
+                self.conn.execute("DELETE FROM directories WHERE path = ?", (path,))
+        return removed
+
+    @staticmethod
+    def _prefix_range(prefix: str) -> tuple[str, str]:
+        """Bounds matching every path inside the directory `prefix` using the primary key index"""
+        prefix = prefix.rstrip(os.sep) + os.sep
+        return prefix, prefix + "\U0010ffff"
+
+    def query(self, artist: Optional[str] = None, album: Optional[str] = None,
+              prefix: Optional[str] = None, limit: Optional[int] = None) -> List[LibraryTrack]:
+        """
+        Query tracks from the index.
+
+        Args:
+        - artist (str): Only return tracks by this artist (case-insensitive).
+        - album (str): Only return tracks from this album (case-insensitive).
+        - prefix (str): Only return tracks inside this directory.
+        - limit (int): Maximum number of tracks to return.
+
+        Returns:
+        - list[LibraryTrack]: The matching tracks ordered by path.
+        """
+        clauses, params = [], []
+        if artist is not None:
+            clauses.append("artist = ? COLLATE NOCASE")
+            params.append(artist)
+        if album is not None:
+            clauses.append("album = ? COLLATE NOCASE")
+            params.append(album)
+        if prefix is not None:
+            clauses.append("path >= ? AND path < ?")
+            params.extend(self._prefix_range(str(Path(prefix).resolve())))
+
+        sql = "SELECT path, size, mtime, duration, title, artist, album FROM tracks"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY path"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        with self.lock:
+            return [LibraryTrack(*row) for row in self.conn.execute(sql, params)]
+
+    def search(self, text: str, limit: int = 10, prefix: Optional[str] = None) -> List[LibraryTrack]:
+        """
+        Fuzzy search tracks by title, artist and file name.
+
+        Every word of `text` is matched as a token prefix, so "aft hou" finds
+        "After Hours". Results are ranked by relevance.
+
+        Args:
+        - text (str): The search text.
+        - limit (int): Maximum number of tracks to return.
+        - prefix (str): Only return tracks inside this directory.
+
+        Returns:
+        - list[LibraryTrack]: The best matching tracks first.
+        """
+        words = re.findall(r"\w+", text.lower())
+        if not words:
+            return []
+
+        sql = (
+            "SELECT t.path, t.size, t.mtime, t.duration, t.title, t.artist, t.album "
+            "FROM tracks_search JOIN tracks t ON t.rowid = tracks_search.rowid "
+            "WHERE tracks_search MATCH ?"
+        )
+        params = [" ".join(f'"{word}"*' for word in words)]
+        if prefix is not None:
+            sql += " AND t.path >= ? AND t.path < ?"
+            params.extend(self._prefix_range(str(Path(prefix).resolve())))
+        sql += " ORDER BY bm25(tracks_search) LIMIT ?"
+        params.append(limit)
+
+        with self.lock:
+            return [LibraryTrack(*row) for row in self.conn.execute(sql, params)]
+
+    def get(self, path: str) -> Optional[LibraryTrack]:
+        """Return the indexed track at `path`, or None if it is not indexed"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT path, size, mtime, duration, title, artist, album FROM tracks WHERE path = ?", (path,)
+            ).fetchone()
+        return LibraryTrack(*row) if row else None
+
+    def close(self) -> None:
+        self.conn.close()
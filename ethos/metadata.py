@@ -0,0 +1,132 @@
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional
+from ethos.cache import StreamCache
+
+
+class MetadataStore:
+    """
+    Local store of Spotify track and artist metadata.
+
+    Filled from batch hydration and from search results, so that playlists can be
+    shown with durations and artwork without a request per track. Tracks can be
+    looked up by Spotify id, or by name and artist for playlist entries saved
+    without an id.
+    """
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = db_path or Path.home() / ".ethos" / "metadata.db"
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock, self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS tracks (
+                    id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    artists TEXT NOT NULL,
+                    artist_ids TEXT NOT NULL,
+                    album TEXT,
+                    duration_ms INTEGER,
+                    image TEXT,
+                    name_key TEXT NOT NULL,
+                    artists_key TEXT NOT NULL,
+                    artist_key TEXT NOT NULL,
+                    updated REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS tracks_name_key ON tracks (name_key);
+                CREATE TABLE IF NOT EXISTS artists (
+                    id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    genres TEXT NOT NULL,
+                    image TEXT,
+                    updated REAL NOT NULL
+                );
+            """)
+
+    @staticmethod
+    def track_row(track: dict) -> tuple:
+        """Flatten a Spotify track object into a `tracks` row"""
+        artists = [artist["name"] for artist in track.get("artists", [])]
+        album = track.get("album") or {}
+        images = album.get("images") or []
+        return (
+            track["id"],
+            track["name"],
+            ", ".join(artists),
+            json.dumps([artist.get("id") for artist in track.get("artists", [])]),
+            album.get("name"),
+            track.get("duration_ms"),
+            images[0]["url"] if images else None,
+            StreamCache.normalize(track["name"]),
+            StreamCache.normalize(", ".join(artists)),
+            StreamCache.normalize(artists[0]) if artists else "",
+            time.time(),
+        )
+
+    def put_tracks(self, tracks: list[dict]) -> None:
+        """Store Spotify track objects, replacing older metadata of the same tracks"""
+        rows = [self.track_row(track) for track in tracks if track and track.get("id")]
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def put_artists(self, artists: list[dict]) -> None:
+        """Store Spotify artist objects, replacing older metadata of the same artists"""
+        rows = [
+            (
+                artist["id"],
+                artist["name"],
+                json.dumps(artist.get("genres", [])),
+                artist["images"][0]["url"] if artist.get("images") else None,
+                time.time(),
+            )
+            for artist in artists if artist and artist.get("id")
+        ]
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO artists VALUES (?, ?, ?, ?, ?)", rows)
+
+    def get_tracks(self, ids: list[str]) -> dict[str, dict]:
+        """Return the stored metadata of the given track ids, keyed by id"""
+        return self._get_many("tracks", ids)
+
+    def get_artists(self, ids: list[str]) -> dict[str, dict]:
+        """Return the stored metadata of the given artist ids, keyed by id"""
+        return self._get_many("artists", ids)
+
+    def missing(self, table: str, ids: list[str]) -> list[str]:
+        """Return the ids, in order and without duplicates, that are not stored yet"""
+        stored = self._get_many(table, ids)
+        return [item for item in dict.fromkeys(ids) if item and item not in stored]
+
+    def _get_many(self, table: str, ids: list[str]) -> dict[str, dict]:
+        ids = list(dict.fromkeys(item for item in ids if item))
+        found = {}
+        with self.lock:
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                rows = self.conn.execute(
+                    f"SELECT * FROM {table} WHERE id IN ({', '.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update((row["id"], dict(row)) for row in rows)
+        return found
+
+    def find_track(self, name: str, artist: str) -> Optional[dict]:
+        """
+        Look up a track by name and artist.
+
+        `artist` may be the first artist only or all artists joined with ", ".
+        """
+        artist = StreamCache.normalize(artist)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT * FROM tracks WHERE name_key = ? AND (artists_key = ? OR artist_key = ?) "
+                "ORDER BY updated DESC LIMIT 1",
+                (StreamCache.normalize(name), artist, artist),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def close(self) -> None:
+        self.conn.close()
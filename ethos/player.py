@@ -1,7 +1,64 @@
 import vlc
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Optional, List
-from ethos.config import get_music_folder
+from typing import Optional, List, Callable, AsyncIterator
+from ethos.config import get_music_folder, get_audio_extensions
+from ethos.library import LibraryIndex, LibraryTrack
+from ethos.watcher import LibraryWatcher
+
+# Seconds to wait for libvlc to parse a track before giving up
+PARSE_TIMEOUT = 5.0
+
+
+@dataclass
+class TrackMetadata:
+    """Metadata of a parsed track. Duration is in seconds and bitrate in bits per second."""
+    duration: int = 0
+    codec: Optional[str] = None
+    bitrate: Optional[int] = None
+    tags: dict = field(default_factory=dict)
+
+
+class DurationCache:
+    """
+    A small LRU cache mapping a track path or URL to its duration in seconds.
+
+    Durations are filled once when a track starts playing so that progress
+    updates never have to parse the media again.
+    """
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self._durations: "OrderedDict[str, int]" = OrderedDict()
+
+    def get(self, track_path: str) -> Optional[int]:
+        """Return the cached duration for a track, or None if it is not cached"""
+        duration = self._durations.get(track_path)
+        if duration is not None:
+            self._durations.move_to_end(track_path)
+        return duration
+
+    def set(self, track_path: str, duration: int) -> None:
+        """Store the duration of a track, evicting the least recently used entry if full"""
+        if duration <= 0:
+            return
+        self._durations[track_path] = duration
+        self._durations.move_to_end(track_path)
+        while len(self._durations) > self.maxsize:
+            self._durations.popitem(last=False)
+
+    def clear(self) -> None:
+        self._durations.clear()
+
+    def __contains__(self, track_path: str) -> bool:
+        return track_path in self._durations
+
+    def __len__(self) -> int:
+        return len(self._durations)
+
 
 class MusicPlayer:
     """
@@ -11,35 +68,165 @@ class MusicPlayer:
     files, playing, pausing, resuming, stopping tracks, and adjusting volume.
     It integrates with the VLC media player for handling playback.
     """
+    EVENTS = {
+        "end_reached": vlc.EventType.MediaPlayerEndReached,
+        "error": vlc.EventType.MediaPlayerEncounteredError,
+        "buffering": vlc.EventType.MediaPlayerBuffering,
+        "time_changed": vlc.EventType.MediaPlayerTimeChanged,
+    }
+
     def __init__(self):
         self.vlc_instance = vlc.Instance()
         self.player = self.vlc_instance.media_player_new()
         self.current_track: Optional[str] = None
         self.is_playing = False
         self.library_path: Optional[Path] = get_music_folder()
+        self.library: Optional[LibraryIndex] = None
+        self.watcher: Optional[LibraryWatcher] = None
         self.queue = None
+        self.callbacks = {name: [] for name in (*self.EVENTS, "track_changed")}
+        self._attach_events(self.player)
+
+        # Gapless playback keeps a second player warm with the next track
+        self.gapless = False
+        self.crossfade = 0
+        self.standby = self.vlc_instance.media_player_new()
+        self.next_track: Optional[str] = None
+        self.standby_cache = 0.0
+        self._switch_lock = threading.Lock()
+        self._fading = False
+        self._attach_events(self.standby)
+
+    def _attach_events(self, player) -> None:
+        """Subscribe to the libvlc events of a media player"""
+        events = player.event_manager()
+        for name, event_type in self.EVENTS.items():
+            events.event_attach(event_type, self._dispatch, name, player)
+
+    def _dispatch(self, event, name: str, player=None) -> None:
+        """Forward a libvlc event of the active player to the callbacks registered for it"""
+        if player is not None and player is not self.player:
+            if player is self.standby and name == "buffering":
+                self.standby_cache = event.u.new_cache
+            return
+
+        if name == "end_reached" and self.next_track:
+            # libvlc must not be called from its own event thread
+            threading.Thread(target=self._switch_to_next, daemon=True).start()
+            return
+        if name == "time_changed" and self.crossfade and self.next_track and not self._fading:
+            duration = TrackInfo.durations.get(self.current_track)
+            if duration and duration * 1000 - event.u.new_time <= self.crossfade * 1000:
+                self._fading = True
+                threading.Thread(target=self._switch_to_next, args=(self.crossfade,), daemon=True).start()
+
+        if name in ("end_reached", "error"):
+            self.is_playing = False
+        self._emit(name, event)
+
+    def _emit(self, name: str, event) -> None:
+        for callback in list(self.callbacks[name]):
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"Error in {name} callback: {e}")
+
+    def on(self, name: str, callback: Callable) -> None:
+        """
+        Register a callback for a player event.
+
+        Callbacks run on libvlc's event thread and receive the libvlc event. They
+        must not call back into the player directly; hand the work off to another
+        thread or event loop instead.
+
+        Args:
+        - name (str): One of "end_reached", "error", "buffering" or "time_changed".
+        - callback (Callable): Function called with the libvlc event.
+        """
+        self.callbacks[name].append(callback)
+
+    def off(self, name: str, callback: Callable) -> None:
+        """Unregister a callback previously registered with `on`"""
+        if callback in self.callbacks[name]:
+            self.callbacks[name].remove(callback)
+
+    async def event_stream(self, *names: str) -> AsyncIterator[str]:
+        """
+        Yield the names of player events as they happen.
+
+        Args:
+        - names (str): The events to listen for. Defaults to all events.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        forwarders = {
+            name: (lambda event, name=name: loop.call_soon_threadsafe(queue.put_nowait, name))
+            for name in (names or self.EVENTS)
+        }
+        for name, forward in forwarders.items():
+            self.on(name, forward)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            for name, forward in forwarders.items():
+                self.off(name, forward)
         
     def set_library(self, path: str) -> bool:
-        """Set and validate the music library path"""
+        """Set and validate the music library path, moving the library watcher to it if running"""
         library = Path(path)
         if library.exists() and library.is_dir():
             self.library_path = library
+            if self.watcher:
+                self.watch_library()
             return True
         return False
+
+    def search_library(self, text: str, limit: int = 5) -> List[LibraryTrack]:
+        """Fuzzy search the local library by title, artist and file name"""
+        if not self.library_path:
+            return []
+        try:
+            return self.get_library().search(text, limit=limit, prefix=str(self.library_path))
+        except Exception as e:
+            print(f"Error searching library: {e}")
+            return []
+
+    def watch_library(self) -> Optional[LibraryWatcher]:
+        """Keep the library index in sync with the music folder in the background"""
+        self.unwatch_library()
+        if not self.library_path:
+            return None
+        self.watcher = LibraryWatcher(self.get_library(), self.library_path)
+        self.watcher.start()
+        return self.watcher
+
+    def unwatch_library(self) -> None:
+        """Stop the library watcher if it is running"""
+        if self.watcher:
+            self.watcher.stop()
+            self.watcher = None
     
-    def get_library_songs(self) -> List[str]:
-        """Get all audio files from the library"""
+    def get_library(self) -> LibraryIndex:
+        """Get the persistent library index, opening it on first use"""
+        if self.library is None:
+            self.library = LibraryIndex(extensions=get_audio_extensions())
+        return self.library
+
+    def get_library_songs(self, progress: Optional[Callable[[int, int], None]] = None) -> List[str]:
+        """
+        Get all audio files from the library, rescanning only directories that changed.
+
+        Args:
+        - progress (Callable): Called with (probed, total) while new files are being probed.
+        """
         if not self.library_path:
             print("Local music folder is not set.")
             return []
-            
-        audio_extensions = ('.mp3', '.wav', '.flac', '.m4a')
-        songs = []
-        
-        for file in self.library_path.rglob("*"):
-            if file.suffix.lower() in audio_extensions:
-                songs.append(str(file))
-        return songs
+
+        library = self.get_library()
+        library.scan(self.library_path, progress=progress)
+        return [track.path for track in library.query(prefix=str(self.library_path))]
 
     def play(self, track_path: str) -> bool:
         """
@@ -54,16 +241,98 @@ class MusicPlayer:
         - bool: True if the track was successfully loaded and playback started,
                 False otherwise (e.g., invalid file path or VLC initialization error).
         """
+        if track_path == self.next_track:
+            self._switch_to_next()
+            return True
+
         try:
+            self.disarm_next()
             media = self.vlc_instance.media_new(track_path)
             self.player.set_media(media)
             self.player.play()
             self.current_track = track_path
+            if media.get_duration() > 0:
+                TrackInfo.durations.set(track_path, media.get_duration() // 1000)
             self.is_playing = True
             return True
         except Exception:
             return False
 
+    def arm_next(self, track_path: str) -> bool:
+        """
+        Open and buffer the next track on the standby player so it can start without a gap.
+
+        The media is opened paused and muted; it is switched in when the current track
+        ends, or `crossfade` seconds before that if crossfading is enabled.
+
+        Args:
+        - track_path (str): The full path or URL to the next audio track.
+
+        Returns:
+        - bool: True if the track was armed, False otherwise.
+        """
+        if track_path == self.next_track:
+            return True
+        try:
+            media = self.vlc_instance.media_new(track_path)
+            media.add_option(":start-paused")
+            self.standby.audio_set_volume(0)
+            self.standby_cache = 0.0
+            self.standby.set_media(media)
+            self.standby.play()
+            self.next_track = track_path
+            return True
+        except Exception:
+            self.next_track = None
+            return False
+
+    def is_next_buffered(self) -> bool:
+        """Whether the armed track has been opened and buffered, or failed trying"""
+        if not self.next_track:
+            return True
+        return self.standby_cache >= 100 or self.standby.get_state() in (vlc.State.Paused, vlc.State.Error)
+
+    def disarm_next(self) -> None:
+        """Release the track waiting on the standby player"""
+        if self.next_track:
+            self.standby.stop()
+            self.next_track = None
+
+    def _switch_to_next(self, fade: float = 0) -> None:
+        """
+        Swap the armed standby player in for the active one.
+
+        Args:
+        - fade (float): Seconds to crossfade the two players over. 0 switches instantly.
+        """
+        with self._switch_lock:
+            try:
+                if not self.next_track:
+                    return
+                outgoing, incoming = self.player, self.standby
+                volume = outgoing.audio_get_volume()
+
+                self.player, self.standby = incoming, outgoing
+                self.current_track, self.next_track = self.next_track, None
+                self.is_playing = True
+                incoming.set_pause(0)
+
+                if fade > 0:
+                    steps = max(int(fade * 20), 1)
+                    for step in range(1, steps + 1):
+                        incoming.audio_set_volume(volume * step // steps)
+                        outgoing.audio_set_volume(volume * (steps - step) // steps)
+                        time.sleep(fade / steps)
+                incoming.audio_set_volume(volume)
+                outgoing.stop()
+            finally:
+                self._fading = False
+        self._emit("track_changed", None)
+
+    def set_crossfade(self, seconds: int) -> None:
+        """Set the crossfade between tracks in seconds. 0 disables crossfading."""
+        self.crossfade = max(0, seconds)
+
     def pause(self):
         """Pause the current playback"""
         if self.is_playing:
@@ -84,6 +353,7 @@ class MusicPlayer:
         sets the playback state to "not playing."
         """
         self.player.stop()
+        self.disarm_next()
         self.is_playing = False
         self.current_track = None
 
@@ -146,28 +416,98 @@ class MusicPlayer:
 class TrackInfo:
     """
     A class for managing audio track metadata and playback progress.
+
+    Track durations are kept in a shared LRU cache keyed by track path or URL,
+    filled by `MusicPlayer.play` and read by the progress helpers.
     """
 
+    durations = DurationCache()
+
+    TAGS = {
+        "title": vlc.Meta.Title,
+        "artist": vlc.Meta.Artist,
+        "album": vlc.Meta.Album,
+        "genre": vlc.Meta.Genre,
+        "date": vlc.Meta.Date,
+        "track_number": vlc.Meta.TrackNumber,
+    }
+
     @staticmethod
-    def get_audio_duration(audio_path: str) -> str:
-        """Get the duration of an audio file in minutes and seconds."""
+    async def get_metadata(audio_path: str, timeout: float = PARSE_TIMEOUT) -> TrackMetadata:
+        """
+        Parse a track without blocking the event loop and return its metadata.
+
+        Waits on libvlc's parsed-changed event instead of polling the media.
+
+        Args:
+        - audio_path (str): The full path or URL to the audio track.
+        - timeout (float): Seconds to wait for parsing before giving up.
+
+        Returns:
+        - TrackMetadata: The parsed metadata, or an empty TrackMetadata if parsing
+                         failed or timed out.
+        """
+        loop = asyncio.get_running_loop()
+        parsed = asyncio.Event()
         try:
             media = vlc.Media(audio_path)
-            media_player = vlc.MediaPlayer()
-            media_player.set_media(media)
+            events = media.event_manager()
+            events.event_attach(vlc.EventType.MediaParsedChanged, lambda event: loop.call_soon_threadsafe(parsed.set))
+            try:
+                media.parse_with_options(vlc.MediaParseFlag.network, int(timeout * 1000))
+                await asyncio.wait_for(parsed.wait(), timeout)
+            finally:
+                events.event_detach(vlc.EventType.MediaParsedChanged)
+        except asyncio.TimeoutError:
+            print(f"Timed out parsing {audio_path}")
+            return TrackMetadata()
+        except Exception as e:
+            print(f"Error retrieving metadata: {e}")
+            return TrackMetadata()
 
-            media.parse_with_options(1, 0)
-            while media.get_duration() < 0:
-                continue
+        metadata = TrackInfo._read_metadata(media)
+        TrackInfo.durations.set(audio_path, metadata.duration)
+        return metadata
 
-            total_seconds = media.get_duration() // 1000 
-            minutes = total_seconds // 60
-            seconds = total_seconds % 60
+    @staticmethod
+    def parse_media(media: vlc.Media, timeout: float = PARSE_TIMEOUT) -> bool:
+        """
+        Parse a media synchronously, blocking until libvlc reports it parsed or the timeout expires.
 
-            return f"{minutes}:{seconds:02}"
-        except Exception as e:
-            print(f"Error retrieving duration: {e}")
-            return "0:00"
+        Returns:
+        - bool: True if the media was parsed within the timeout, False otherwise.
+        """
+        parsed = threading.Event()
+        events = media.event_manager()
+        events.event_attach(vlc.EventType.MediaParsedChanged, lambda event: parsed.set())
+        try:
+            media.parse_with_options(vlc.MediaParseFlag.network, int(timeout * 1000))
+            return parsed.wait(timeout)
+        finally:
+            events.event_detach(vlc.EventType.MediaParsedChanged)
+
+    @staticmethod
+    def _read_metadata(media: vlc.Media) -> TrackMetadata:
+        """Read duration, codec, bitrate and tags from an already parsed media"""
+        metadata = TrackMetadata(duration=max(media.get_duration(), 0) // 1000)
+        for track in media.tracks_get() or []:
+            if track.type == vlc.TrackType.audio:
+                metadata.codec = track.codec.to_bytes(4, "little").decode(errors="ignore").strip()
+                metadata.bitrate = track.bitrate or None
+                break
+        for tag, meta in TrackInfo.TAGS.items():
+            value = media.get_meta(meta)
+            if value:
+                metadata.tags[tag] = value
+        return metadata
+
+    @staticmethod
+    def get_audio_duration(audio_path: str) -> str:
+        """Get the duration of an audio file in minutes and seconds."""
+        total_seconds = TrackInfo.get_audio_duration_int(audio_path)
+        minutes = total_seconds // 60
+        seconds = total_seconds % 60
+        return f"{minutes}:{seconds:02}"
 
 
     @staticmethod
@@ -182,21 +522,46 @@ class TrackInfo:
     @staticmethod
     def get_audio_duration_int(audio_path: str) -> int:
             """Get the duration of an audio file in seconds."""
+            cached = TrackInfo.durations.get(audio_path)
+            if cached is not None:
+                return cached
+
             try:
                 media = vlc.Media(audio_path)
-                media_player = vlc.MediaPlayer()
-                media_player.set_media(media)
-
-                media.parse_with_options(1, 0)
-                while media.get_duration() < 0:
-                    continue
+                if not TrackInfo.parse_media(media):
+                    print(f"Timed out parsing {audio_path}")
+                    return 0
 
                 # Return the duration in seconds
-                return media.get_duration() // 1000
+                duration = max(media.get_duration(), 0) // 1000
+                TrackInfo.durations.set(audio_path, duration)
+                return duration
             except Exception as e:
                 print(f"Error retrieving duration: {e}")
                 return 0
     
+    @staticmethod
+    def get_cached_duration(music_player: "MusicPlayer") -> int:
+        """
+        Get the duration of the current track in seconds without parsing the media.
+
+        The duration is read from the cache. On a miss it falls back to the length
+        reported by the playing media player, which is cached once it is known.
+        """
+        track = music_player.current_track
+        cached = TrackInfo.durations.get(track)
+        if cached is not None:
+            return cached
+
+        try:
+            length = music_player.player.get_length()
+        except Exception:
+            return 0
+        if length > 0:
+            TrackInfo.durations.set(track, length // 1000)
+            return length // 1000
+        return 0
+
     @staticmethod
     def get_current_time_int(music_player: "MusicPlayer") -> int:
         """Get the current playback time in seconds."""
@@ -221,7 +586,7 @@ class TrackInfo:
         if not music_player.current_track:
             return 0.0
 
-        duration = TrackInfo.get_audio_duration_int(music_player.current_track)
+        duration = TrackInfo.get_cached_duration(music_player)
         current_time = TrackInfo.get_current_time_int(music_player)
 
         if duration > 0:
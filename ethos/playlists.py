@@ -0,0 +1,105 @@
+import json
+import bisect
+from pathlib import Path
+from typing import Optional
+
+
+class PlaylistStore:
+    """
+    Reads the legacy playlist files, a JSON array per playlist, and diffs playlists.
+
+    Entries are keyed on their Spotify id (entries saved without one on name and
+    artist), so `diff` turns one version of a playlist into the next as additions,
+    removals, moves and metadata updates. Playlists now live in the `UserStore`
+    database, which migrates these files once and uses `diff` to update only the
+    rows that changed.
+    """
+    def __init__(self, directory: Optional[Path] = None):
+        self.directory = directory or Path.home() / ".ethos" / "userfiles" / "playlists"
+
+    def path(self, name: str) -> Path:
+        return self.directory / f"{name}.json"
+
+    def names(self) -> list[str]:
+        """Names of all stored playlists"""
+        if not self.directory.exists():
+            return []
+        return sorted(path.stem for path in self.directory.glob("*.json"))
+
+    @staticmethod
+    def keys(entries: list[dict]) -> list[str]:
+        """
+        Stable key of every entry: its Spotify id, or name and artist when it has none.
+        Repeated tracks get an occurrence suffix, so every key is unique.
+        """
+        seen = {}
+        keys = []
+        for entry in entries:
+            key = entry.get("id") or f"{entry.get('name', '')}\0{entry.get('artist', '')}".lower()
+            seen[key] = seen.get(key, 0) + 1
+            keys.append(key if seen[key] == 1 else f"{key}#{seen[key]}")
+        return keys
+
+    @staticmethod
+    def diff(old: list[dict], new: list[dict]) -> dict:
+        """
+        Compute the changes turning `old` into `new`.
+
+        Entries kept in the same relative order (the longest increasing run of their
+        old positions) stay put; every other entry of `new` is removed, if it existed,
+        and inserted at its final index. Kept entries whose metadata changed are updated.
+
+        Returns:
+        - dict: "remove" (keys), "add" ([index, key, entry] in ascending index order) and
+                "update" ([key, entry]).
+        """
+        old_keys, new_keys = PlaylistStore.keys(old), PlaylistStore.keys(new)
+        old_index = {key: index for index, key in enumerate(old_keys)}
+        kept = [(index, old_index[key]) for index, key in enumerate(new_keys) if key in old_index]
+        stable = {new_index for new_index, _ in PlaylistStore.longest_increasing(kept)}
+
+        new_set = set(new_keys)
+        remove = [key for key in old_keys if key not in new_set]
+        add, update = [], []
+        for index, (key, entry) in enumerate(zip(new_keys, new)):
+            if index in stable:
+                if old[old_index[key]] != entry:
+                    update.append([key, entry])
+                continue
+            if key in old_index:
+                remove.append(key)
+            add.append([index, key, entry])
+        return {"remove": remove, "add": add, "update": update}
+
+    @staticmethod
+    def longest_increasing(pairs: list[tuple[int, int]]) -> list[tuple[int, int]]:
+        """Longest subsequence of (new index, old index) pairs whose old indexes increase, in O(n log n)"""
+        tails, tail_pairs, previous = [], [], []
+        for position, (_, old) in enumerate(pairs):
+            slot = bisect.bisect_left(tails, old)
+            if slot == len(tails):
+                tails.append(old)
+                tail_pairs.append(position)
+            else:
+                tails[slot] = old
+                tail_pairs[slot] = position
+            previous.append(tail_pairs[slot - 1] if slot else -1)
+        result = []
+        position = tail_pairs[-1] if tail_pairs else -1
+        while position != -1:
+            result.append(pairs[position])
+            position = previous[position]
+        return result[::-1]
+
+    @staticmethod
+    def is_empty(delta: dict) -> bool:
+        return not (delta["remove"] or delta["add"] or delta["update"])
+
+    def load(self, name: str) -> list[dict]:
+        """Return the entries of a playlist, an empty list if it does not exist"""
+        try:
+            with open(self.path(name), 'r') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        return json.loads(data) if data.strip() else []
@@ -0,0 +1,234 @@
+import sys
+import queue
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import Future
+from typing import Callable, Optional
+from ethos.config import RESOLVER_WORKERS
+from ethos.scheduler import Priority, current_priority
+
+
+class ResolverCrashed(Exception):
+    """Raised for a resolve job whose worker process died while running it"""
+
+
+class YoutubeDLExtractor:
+    """Holds a warm `YoutubeDL` instance inside a resolver worker"""
+    OPTIONS = {
+        'format': 'bestaudio/best',
+        'noplaylist': True,
+        'quiet': True,
+        'default_search': 'ytsearch1',
+    }
+
+    def __init__(self):
+        from yt_dlp import YoutubeDL
+        self.ydl = YoutubeDL(self.OPTIONS)
+
+    def extract(self, target: str) -> dict:
+        result = self.ydl.extract_info(target, download=False)
+        if 'entries' in result:
+            result = result['entries'][0]
+        return {key: result.get(key) for key in ("id", "url", "title", "duration")}
+
+
+def rss_mb() -> float:
+    """Peak resident memory of the current process in MiB, 0 where unavailable"""
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def worker_main(conn, extractor_factory: Callable, max_jobs: int, max_rss: float) -> None:
+    """
+    Entry point of a resolver worker process.
+
+    Builds the extractor once, then answers resolve jobs from `conn` until told to
+    stop. Each answer is `(ok, result or error message, retire)`; the worker asks to
+    be retired and exits after `max_jobs` jobs or once it grows past `max_rss` MiB.
+    """
+    extractor = extractor_factory()
+    conn.send("ready")
+    jobs = 0
+    while True:
+        try:
+            target = conn.recv()
+        except EOFError:
+            return
+        if target is None:
+            return
+        jobs += 1
+        try:
+            answer = (True, extractor.extract(target))
+        except Exception as e:
+            answer = (False, f"{type(e).__name__}: {e}")
+        retire = jobs >= max_jobs or (max_rss and rss_mb() > max_rss)
+        conn.send((*answer, bool(retire)))
+        if retire:
+            return
+
+
+class ResolverWorker:
+    """Parent-side handle of one worker process, driven by its own dispatch thread"""
+    def __init__(self, pool: "ResolverPool", index: int):
+        self.pool = pool
+        self.index = index
+        self.process: Optional[multiprocessing.Process] = None
+        self.conn = None
+        self.ready = False
+        self.restarts = 0
+        self.thread = threading.Thread(target=self.run, name=f"ethos-resolver-{index}", daemon=True)
+
+    def spawn(self) -> None:
+        context = self.pool.context
+        self.conn, child = context.Pipe()
+        self.process = context.Process(
+            target=worker_main,
+            args=(child, self.pool.extractor_factory, self.pool.max_jobs, self.pool.max_rss),
+            name=f"ethos-resolver-{self.index}",
+            daemon=True,
+        )
+        self.process.start()
+        child.close()
+        self.ready = False
+
+    def receive(self):
+        """Wait for the next message of the worker, raising ResolverCrashed if it dies first"""
+        while not self.conn.poll(0.2):
+            if not self.process.is_alive():
+                raise ResolverCrashed(f"resolver worker exited with code {self.process.exitcode}")
+        try:
+            return self.conn.recv()
+        except (EOFError, OSError) as e:
+            raise ResolverCrashed(str(e)) from e
+
+    def retire(self) -> None:
+        if self.process:
+            self.process.join(timeout=1)
+            if self.process.is_alive():
+                self.process.kill()
+            self.conn.close()
+        self.process = None
+
+    def warm(self) -> None:
+        if self.process is None:
+            self.spawn()
+        if not self.ready:
+            if self.receive() != "ready":
+                raise ResolverCrashed("resolver worker failed to start")
+            self.ready = True
+
+    def run(self) -> None:
+        while True:
+            _, _, target, future = self.pool.jobs.get()
+            if future is None:
+                break
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                self.warm()
+                self.conn.send(target)
+                ok, result, retire = self.receive()
+            except (ResolverCrashed, OSError) as e:
+                self.restarts += 1
+                self.retire()
+                future.set_exception(e if isinstance(e, ResolverCrashed) else ResolverCrashed(str(e)))
+                self.spawn()
+                continue
+            if retire:
+                self.restarts += 1
+                self.retire()
+                self.spawn()
+            if ok:
+                future.set_result(result)
+            else:
+                future.set_exception(Exception(result))
+        self.stop()
+
+    def stop(self) -> None:
+        if self.process and self.process.is_alive():
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+        self.retire()
+
+
+class ResolverPool:
+    """
+    Pool of long-lived worker processes that resolve stream URLs with warm extractors.
+
+    Each worker imports yt-dlp and builds its `YoutubeDL` once, at start-up, so that
+    neither lands on the path of a resolve, and extraction runs outside the UI
+    process instead of competing for its GIL. Jobs are queued by scheduler priority,
+    so an interactive resolve is taken by the next free worker ahead of queued
+    prefetches, and up to `workers` resolutions run in parallel. A worker that
+    crashes is replaced, failing only the job it was running, and a worker is
+    recycled after `max_jobs` jobs or once its memory grows past `max_rss` MiB.
+    """
+    def __init__(self, workers: int = RESOLVER_WORKERS, extractor_factory: Callable = YoutubeDLExtractor,
+                 max_jobs: int = 200, max_rss: float = 512):
+        self.workers_count = workers
+        self.extractor_factory = extractor_factory
+        self.max_jobs = max_jobs
+        self.max_rss = max_rss
+        # Forking a process that runs Textual and libvlc threads is unsafe
+        self.context = multiprocessing.get_context("spawn")
+        # (priority, sequence, target, future), FIFO within a priority
+        self.jobs: queue.PriorityQueue = queue.PriorityQueue()
+        self.sequence = itertools.count()
+        self.workers: list[ResolverWorker] = []
+        self.started = False
+
+    def start(self) -> None:
+        """Spawn the workers so their extractors are warm before the first resolve"""
+        if self.started:
+            return
+        self.started = True
+        for index in range(self.workers_count):
+            worker = ResolverWorker(self, index)
+            worker.spawn()
+            worker.thread.start()
+            self.workers.append(worker)
+
+    def submit(self, target: str, level: Optional[Priority] = None) -> Future:
+        """Queue a resolve job for a search query or video URL, at the current request priority by default"""
+        self.start()
+        future = Future()
+        level = current_priority.get() if level is None else level
+        self.jobs.put((level, next(self.sequence), target, future))
+        return future
+
+    def resolve(self, target: str, timeout: Optional[float] = 60) -> dict:
+        """
+        Resolve a search query or video URL in a worker, blocking until it is done.
+
+        Returns:
+        - dict: `id`, `url`, `title` and `duration` of the best audio stream.
+        """
+        return self.submit(target).result(timeout)
+
+    def restarts(self) -> int:
+        """Number of workers replaced after a crash or recycled"""
+        return sum(worker.restarts for worker in self.workers)
+
+    def close(self) -> None:
+        """Stop all workers, failing queued jobs"""
+        while True:
+            try:
+                job = self.jobs.get_nowait()
+            except queue.Empty:
+                break
+            future = job[3]
+            if future and future.set_running_or_notify_cancel():
+                future.set_exception(ResolverCrashed("resolver pool closed"))
+        for _ in self.workers:
+            self.jobs.put((sys.maxsize, next(self.sequence), None, None))
+        for worker in self.workers:
+            worker.thread.join(timeout=2)
+        self.workers = []
+        self.started = False
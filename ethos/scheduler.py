@@ -0,0 +1,302 @@
+import time
+import heapq
+import random
+import asyncio
+import threading
+import itertools
+import contextvars
+from enum import IntEnum
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class Priority(IntEnum):
+    """Order in which queued requests are let through, lowest first"""
+    INTERACTIVE = 0
+    PREFETCH = 1
+    BACKGROUND = 2
+
+
+current_priority: contextvars.ContextVar[Priority] = contextvars.ContextVar("current_priority", default=Priority.INTERACTIVE)
+
+
+@contextmanager
+def priority(level: Priority):
+    """
+    Run the requests made inside the block, including those of tasks and threads
+    started from it, at the given priority.
+    """
+    token = current_priority.set(level)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+class RateLimited(Exception):
+    """Raised by a scheduled call when the remote host throttled it"""
+    def __init__(self, retry_after: Optional[float] = None, response=None):
+        super().__init__(f"Rate limited, retry after {retry_after}s" if retry_after else "Rate limited")
+        self.retry_after = retry_after
+        self.response = response
+
+
+class TokenBucket:
+    """Allows `rate` requests per second on average with bursts of up to `capacity`"""
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, now: float) -> float:
+        """
+        Take a token if one is available.
+
+        Returns:
+        - float: 0 if a token was taken, otherwise the seconds until one is available.
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class Ticket:
+    """A request waiting for its turn"""
+    def __init__(self, host: str, level: Priority):
+        self.host = host
+        self.priority = level
+        self.granted = False
+        self.event: Optional[threading.Event] = None
+        self.future: Optional[asyncio.Future] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def grant(self) -> None:
+        self.granted = True
+        if self.event:
+            self.event.set()
+        elif self.future:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self) -> None:
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class RequestScheduler:
+    """
+    Central gate for outbound requests.
+
+    Every request waits for a free slot (at most `max_concurrency` run at once) and
+    a token from the bucket of its host. Waiting requests are let through by
+    priority, so interactive searches overtake prefetch and sync work. When a host
+    answers 429, the host is paused for its `Retry-After` (or an exponential
+    backoff with jitter) and the request is retried up to `max_retries` times.
+
+    The core is thread-safe, so the same scheduler serves coroutines (`run`) and
+    worker threads running yt-dlp or spotipy (`call`).
+    """
+
+    DEFAULT_RATES = {
+        "api.spotify.com": (5.0, 10),
+        "accounts.spotify.com": (1.0, 3),
+        "www.youtube.com": (2.0, 4),
+    }
+
+    def __init__(self, rates: Optional[dict] = None, default_rate: tuple = (10.0, 10), max_concurrency: int = 8,
+                 max_retries: int = 3, base_delay: float = 0.5, max_delay: float = 60.0):
+        self.rates = dict(self.DEFAULT_RATES if rates is None else rates)
+        self.default_rate = default_rate
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lock = threading.Lock()
+        self.waiting: list[tuple[int, int, Ticket]] = []
+        self.sequence = itertools.count()
+        self.buckets: dict[str, TokenBucket] = {}
+        self.blocked_until: dict[str, float] = {}
+        self.in_flight = 0
+        self.completed = 0
+        self.retries = 0
+        self.throttled_total = 0
+        self.timer: Optional[threading.Timer] = None
+        self.timer_due = 0.0
+
+    def bucket(self, host: str) -> TokenBucket:
+        if host not in self.buckets:
+            rate, capacity = self.rates.get(host, self.default_rate)
+            self.buckets[host] = TokenBucket(rate, capacity)
+        return self.buckets[host]
+
+    def _enqueue(self, ticket: Ticket) -> None:
+        with self.lock:
+            heapq.heappush(self.waiting, (ticket.priority, next(self.sequence), ticket))
+            self._grant()
+
+    def _grant(self) -> None:
+        """Let through as many waiting requests as slots and buckets allow. Call with the lock held."""
+        now = time.monotonic()
+        wake = None
+        remaining = []
+        while self.waiting and self.in_flight < self.max_concurrency:
+            entry = heapq.heappop(self.waiting)
+            ticket = entry[2]
+            blocked = self.blocked_until.get(ticket.host, 0) - now
+            wait = blocked if blocked > 0 else self.bucket(ticket.host).take(now)
+            if wait > 0:
+                remaining.append(entry)
+                wake = wait if wake is None else min(wake, wait)
+                continue
+            self.in_flight += 1
+            ticket.grant()
+        for entry in remaining:
+            heapq.heappush(self.waiting, entry)
+        if wake is not None:
+            self._wake_in(wake)
+
+    def _wake_in(self, delay: float) -> None:
+        due = time.monotonic() + delay
+        if self.timer and self.timer.is_alive() and self.timer_due <= due:
+            return
+        if self.timer:
+            self.timer.cancel()
+        self.timer = threading.Timer(delay, self._on_timer)
+        self.timer.daemon = True
+        self.timer_due = due
+        self.timer.start()
+
+    def _on_timer(self) -> None:
+        with self.lock:
+            self.timer = None
+            self._grant()
+
+    def _release(self) -> None:
+        with self.lock:
+            self.in_flight -= 1
+            self.completed += 1
+            self._grant()
+
+    def _cancel(self, ticket: Ticket) -> None:
+        """Withdraw a ticket whose waiter gave up, releasing its slot if it was granted meanwhile"""
+        with self.lock:
+            for index, entry in enumerate(self.waiting):
+                if entry[2] is ticket:
+                    self.waiting.pop(index)
+                    heapq.heapify(self.waiting)
+                    return
+        if ticket.granted:
+            self._release()
+
+    def throttle(self, host: str, retry_after: Optional[float], attempt: int) -> float:
+        """
+        Pause a host after it answered 429.
+
+        Returns:
+        - float: The pause in seconds; `Retry-After` if given, otherwise an exponential
+                 backoff with jitter.
+        """
+        if retry_after is None:
+            retry_after = min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.5)
+        retry_after = min(retry_after, self.max_delay)
+        with self.lock:
+            self.throttled_total += 1
+            self.blocked_until[host] = max(self.blocked_until.get(host, 0), time.monotonic() + retry_after)
+        return retry_after
+
+    @staticmethod
+    def retry_after(response) -> Optional[float]:
+        """Read the `Retry-After` header of a response, in seconds"""
+        headers = getattr(response, "headers", None) or {}
+        try:
+            return float(headers.get("Retry-After"))
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def is_throttled(result) -> bool:
+        return getattr(result, "status_code", None) == 429
+
+    async def run(self, host: str, request: Callable[[], Awaitable[T]], level: Optional[Priority] = None) -> T:
+        """
+        Run a coroutine request once the scheduler lets it through, retrying when throttled.
+
+        Args:
+        - host (str): The host the request goes to, used for its rate limit.
+        - request (Callable): Creates the request coroutine; called again on every retry.
+        - level (Priority): Defaults to the priority of the current context.
+
+        Returns:
+        - The result of the last attempt. A 429 response is returned as is once the
+          retries are used up.
+        """
+        level = current_priority.get() if level is None else level
+        for attempt in range(self.max_retries + 1):
+            ticket = Ticket(host, level)
+            ticket.loop = asyncio.get_running_loop()
+            ticket.future = ticket.loop.create_future()
+            self._enqueue(ticket)
+            try:
+                await ticket.future
+            except asyncio.CancelledError:
+                self._cancel(ticket)
+                raise
+            try:
+                result = await request()
+            except RateLimited as e:
+                if attempt == self.max_retries:
+                    raise
+                self.throttle(host, e.retry_after, attempt)
+            else:
+                if not self.is_throttled(result) or attempt == self.max_retries:
+                    return result
+                self.throttle(host, self.retry_after(result), attempt)
+            finally:
+                self._release()
+            with self.lock:
+                self.retries += 1
+
+    def call(self, host: str, request: Callable[[], T], level: Optional[Priority] = None) -> T:
+        """Blocking counterpart of `run` for requests made from worker threads"""
+        level = current_priority.get() if level is None else level
+        for attempt in range(self.max_retries + 1):
+            ticket = Ticket(host, level)
+            ticket.event = threading.Event()
+            self._enqueue(ticket)
+            ticket.event.wait()
+            try:
+                result = request()
+            except RateLimited as e:
+                if attempt == self.max_retries:
+                    raise
+                self.throttle(host, e.retry_after, attempt)
+            else:
+                if not self.is_throttled(result) or attempt == self.max_retries:
+                    return result
+                self.throttle(host, self.retry_after(result), attempt)
+            finally:
+                self._release()
+            with self.lock:
+                self.retries += 1
+
+    def metrics(self) -> dict:
+        """Queued, in-flight and throttled request counters"""
+        with self.lock:
+            now = time.monotonic()
+            queued = {}
+            for _, _, ticket in self.waiting:
+                queued[ticket.priority.name.lower()] = queued.get(ticket.priority.name.lower(), 0) + 1
+            return {
+                "queued": len(self.waiting),
+                "queued_by_priority": queued,
+                "in_flight": self.in_flight,
+                "throttled_hosts": sorted(host for host, until in self.blocked_until.items() if until > now),
+                "throttled_total": self.throttled_total,
+                "retries": self.retries,
+                "completed": self.completed,
+            }
@@ -1,15 +1,28 @@
 import os
 import json
+import threading
 from pathlib import Path
+from typing import Iterator, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from spotipy import Spotify
 from spotipy.oauth2 import SpotifyOAuth
+from spotipy.exceptions import SpotifyException
+from ethos.userstore import UserStore
+from ethos.scheduler import Priority, RateLimited, RequestScheduler
+from ethos.utils import Search, UserFiles
+
+TRACKS_PAGE_SIZE = 100
+PLAYLISTS_PAGE_SIZE = 50
+PAGE_CONCURRENCY = 4
+SYNC_WORKERS = 4
+TRACK_FIELDS = "total,items(track(id,name,duration_ms,external_ids(isrc),artists(name)))"
 
 class SpotifyImporter:
     """
     Class for interacting with Spotify's API to fetch and manage playlist data locally.
 
-    This class authenticates a user, fetches playlists, saves their tracks as JSON files,
-    and provides methods to refresh playlist data.
+    This class authenticates a user, fetches playlists, saves their tracks in the user's
+    playlist store, and provides methods to refresh playlist data.
     """
     def __init__(self, client_id: str, client_secret: str, redirect_uri: str):
         self.client_id = client_id
@@ -21,74 +34,157 @@ class SpotifyImporter:
     def _authenticate(self) -> Spotify:
         scope = "user-library-read playlist-read-private"
         auth_manager = SpotifyOAuth(client_id=self.client_id, client_secret=self.client_secret, redirect_uri=self.redirect_uri, scope=scope)
-        return Spotify(auth_manager=auth_manager)
+        # 429s are retried by the request scheduler instead of inside spotipy. Left in the
+        # status_forcelist, urllib3 turns them into a RetryError whose SpotifyException has
+        # no headers, so the scheduler would never see the Retry-After.
+        return Spotify(auth_manager=auth_manager, retries=0, status_retries=0, status_forcelist=(500, 502, 503, 504))
+
+    def _call(self, request, *args, **kwargs):
+        """Run a spotipy request through the request scheduler at background priority"""
+        def send():
+            try:
+                return request(*args, **kwargs)
+            except SpotifyException as e:
+                if e.http_status == 429:
+                    raise RateLimited(RequestScheduler.retry_after(e)) from e
+                raise
+
+        return Search.get_scheduler().call("api.spotify.com", send, Priority.BACKGROUND)
+
+    def _paginate(self, request, page_size: int, *args, **kwargs) -> Iterator[list]:
+        """
+        Yield every page of a paginated spotipy request, in order.
+
+        The first page tells the `total`; all remaining offsets are then requested
+        concurrently, at most PAGE_CONCURRENCY at a time, and each page is yielded as
+        soon as it and the pages before it have arrived.
+        """
+        first = self._call(request, *args, limit=page_size, offset=0, **kwargs)
+        yield first['items']
+        offsets = range(page_size, first['total'], page_size)
+        if not offsets:
+            return
+        with ThreadPoolExecutor(max_workers=PAGE_CONCURRENCY, thread_name_prefix="ethos-import") as pool:
+            pages = [pool.submit(self._call, request, *args, limit=page_size, offset=offset, **kwargs) for offset in offsets]
+            try:
+                for page in pages:
+                    yield page.result()['items']
+            finally:
+                for page in pages:
+                    page.cancel()
+
+    @staticmethod
+    def _song_info(item: dict) -> Optional[dict]:
+        """Create the stored entry of a playlist item, None for removed or unavailable tracks"""
+        track = item.get('track')
+        if not track or not track.get('name'):
+            return None
+        return {
+            'id': track['id'],
+            'name': track['name'],
+            'artist': track['artists'][0]['name'] if track.get('artists') else "",
+            'isrc': (track.get('external_ids') or {}).get('isrc'),
+            'duration_ms': track.get('duration_ms'),
+        }
+
+    def fetch_playlist_songs(self, playlist_id: str) -> Iterator[dict]:
+        """Yield the entries of every track of a playlist, page by page as they arrive"""
+        for page in self._paginate(self.spotify.playlist_tracks, TRACKS_PAGE_SIZE, playlist_id, fields=TRACK_FIELDS):
+            for item in page:
+                song = self._song_info(item)
+                if song:
+                    yield song
+
+    @property
+    def store(self) -> UserStore:
+        """The playlists are stored alongside the user's own, in the user store"""
+        return UserFiles.get_store()
 
     def fetch_playlists(self):
-        # Retrieve the playlists for the authenticated Spotify user
-        playlists = self.spotify.current_user_playlists()
-        return playlists['items']
+        # Retrieve all playlists of the authenticated Spotify user
+        return [playlist for page in self._paginate(self.spotify.current_user_playlists, PLAYLISTS_PAGE_SIZE) for playlist in page]
 
     def save_playlist_to_json(self, playlist_id: str, playlist_name: str):
-        # Fetch all tracks from the playlist
-        results = self.spotify.playlist_tracks(playlist_id)
-        tracks = results['items']
-
-        songs = []  # Create a list of songs with their name and artist's name
-        for item in tracks:
-            track = item['track']
-            song_info = {
-                'name': track['name'],
-                'artist': track['artists'][0]['name']
-            }
-            songs.append(song_info)
-
+        # Stage the tracks as the pages arrive, each page in its own short transaction
+        self.store.write(playlist_name, self.fetch_playlist_songs(playlist_id))
+
+    @property
+    def snapshots_file(self) -> Path:
+        return self.config_dir / "snapshots.json"
+
+    def load_snapshots(self) -> dict:
+        """Load the snapshot id each playlist had when it was last synced, keyed by playlist id"""
+        try:
+            with open(self.snapshots_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_snapshots(self, snapshots: dict) -> None:
         self.config_dir.mkdir(exist_ok=True)
-        playlist_file = self.config_dir / f"{playlist_name}.json"
-        with open(playlist_file, 'w') as f:
-            json.dump(songs, f, indent=4)
+        temporary = self.snapshots_file.with_name(self.snapshots_file.name + ".tmp")
+        with open(temporary, 'w') as f:
+            json.dump(snapshots, f, indent=4)
+        os.replace(temporary, self.snapshots_file)
 
-    def refresh_all_playlists(self):
-        # Refreshes all playlists by fetching the latest data and saving it to JSON files.
-        playlists = self.fetch_playlists()
-        for playlist in playlists:
-            self.refresh_playlist(playlist['id'], playlist['name'])
+    def refresh_all_playlists(self) -> dict:
+        """
+        Refreshes the playlists that changed since the last sync.
+
+        A playlist whose `snapshot_id` matches the one recorded at its last sync, and
+        whose file still exists, is skipped, so a refresh with no changes only lists the
+        playlists. Changed playlists are refreshed concurrently by SYNC_WORKERS workers.
 
-    def refresh_playlist(self, playlist_id: str, playlist_name: str):
+        Returns:
+            dict: Names of the "refreshed", "unchanged" and "failed" playlists.
         """
-        Refreshes a specific playlist by updating the JSON file with new data.
-        If the file already exists, it adds any new songs not already saved.
+        snapshots = self.load_snapshots()
+        result = {"refreshed": [], "unchanged": [], "failed": []}
+        changed = []
+        for playlist in self.fetch_playlists():
+            stored = snapshots.get(playlist['id'], {})
+            if (stored.get('snapshot_id') == playlist.get('snapshot_id') and stored.get('name') == playlist['name']
+                    and self.store.exists(playlist['name'])):
+                result["unchanged"].append(playlist['name'])
+            else:
+                changed.append(playlist)
+
+        lock = threading.Lock()
+        with ThreadPoolExecutor(max_workers=SYNC_WORKERS, thread_name_prefix="ethos-sync") as pool:
+            refreshes = {pool.submit(self.refresh_playlist, playlist['id'], playlist['name']): playlist for playlist in changed}
+            for refresh in as_completed(refreshes):
+                playlist = refreshes[refresh]
+                try:
+                    refresh.result()
+                except Exception as e:
+                    print(f"Error refreshing playlist {playlist['name']}: {e}")
+                    result["failed"].append(playlist['name'])
+                    continue
+                with lock:
+                    snapshots[playlist['id']] = {'snapshot_id': playlist.get('snapshot_id'), 'name': playlist['name']}
+                    self.save_snapshots(snapshots)
+                result["refreshed"].append(playlist['name'])
+        return result
+
+    def refresh_playlist(self, playlist_id: str, playlist_name: str) -> dict:
+        """
+        Refreshes a specific playlist so it mirrors the one on Spotify.
+        If it is already stored, only the tracks added, removed or moved since, keyed
+        on their Spotify id, are written; see `UserStore.save`.
 
         Args:
             playlist_id (str): The unique ID of the playlist.
-            playlist_name (str): The name of the playlist for the JSON file.
+            playlist_name (str): The name of the playlist in the user store.
+
+        Returns:
+            dict: The "remove", "add" and "update" changes that were written.
         """
-        results = self.spotify.playlist_tracks(playlist_id)
-        tracks = results['items']
-
-        # Create a list of the latest songs
-        new_songs = []
-        for item in tracks:
-            track = item['track']
-            song_info = {
-                'name': track['name'],
-                'artist': track['artists'][0]['name']
-            }
-            new_songs.append(song_info)
-
-        # Where the playlist JSON file will be stored
-        playlist_file = self.config_dir / f"{playlist_name}.json"
-        if playlist_file.exists(): # If the file exists, load the current songs and only append new ones
-            with open(playlist_file, 'r') as f: 
-                existing_songs = json.load(f)
-            existing_song_names = {song['name'] for song in existing_songs}
-            for song in new_songs:
-                if song['name'] not in existing_song_names:
-                    existing_songs.append(song)
-            with open(playlist_file, 'w') as f: # Save the updated playlist data 
-                json.dump(existing_songs, f, indent=4)
-        else:
-            with open(playlist_file, 'w') as f: # If the file exists, load the current songs and only append new ones
-                json.dump(new_songs, f, indent=4)
+        # The tracks are staged as the pages arrive, each page in its own short transaction
+        store = self.store
+        if store.exists(playlist_name):
+            return store.save(playlist_name, self.fetch_playlist_songs(playlist_id))
+        store.write(playlist_name, self.fetch_playlist_songs(playlist_id))
+        return {"remove": [], "add": [], "update": []}
 
        # print(f"Playlist '{playlist_name}' has been refreshed.")
 
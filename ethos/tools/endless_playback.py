@@ -1,24 +1,32 @@
-from ethos.player import MusicPlayer, TrackInfo
-from ethos.utils import get_audio_url, fetch_tracks_list
-from ethos.tools import helper
+import threading
+from ethos.player import MusicPlayer
 
 class EndlessPlayback():
     """Class to enable endless playback of audio tracks"""
 
-    def __init__(self, player: MusicPlayer, queue: list[str], current_track: str):
-        self.queue = []
+    def __init__(self, player: MusicPlayer, queue: list[str], current_track: str = None):
         self.player = player
         self.queue = queue
-        self.player.status = player.status
+        self.current_track = current_track
+        self.finished = threading.Event()
 
     
     def start_endless_playback(self):
-        while True:
-            if not self.queue:
-                break
-            self.player.play(self.queue[-1])
-            self.queue.pop()
+        """Start playing the queue, advancing as soon as the player reports the end of a track"""
+        self.player.on("end_reached", self.on_track_end)
+        self.player.on("error", self.on_track_end)
+        self.play_next()
 
+    def on_track_end(self, event):
+        # libvlc must not be called from its own event thread, so advance from a new one
+        threading.Thread(target=self.play_next, daemon=True).start()
 
-
-    
\ No newline at end of file
+    def play_next(self):
+        """Play the next track from the queue, or finish once it is empty"""
+        if not self.queue:
+            self.player.off("end_reached", self.on_track_end)
+            self.player.off("error", self.on_track_end)
+            self.finished.set()
+            return
+        self.current_track = self.queue.pop()
+        self.player.play(self.current_track)
@@ -44,9 +44,9 @@ class Format:
         
         command_type, value = parts
     
-        if command_type == '/play' or command_type == '/queue-add' or command_type == '/queue-remove' or command_type == "/vp":
+        if command_type == '/play' or command_type == '/queue-add' or command_type == '/queue-remove' or command_type == "/vp" or command_type == "/gapless" or command_type == "/download-playlist" or command_type == "/stats":
             return value
-        elif command_type == '/volume' or command_type == '/qp':
+        elif command_type == '/volume' or command_type == '/qp' or command_type == '/crossfade':
             try:
                 return int(value)
             except ValueError:
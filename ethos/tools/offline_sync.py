@@ -0,0 +1,177 @@
+import time
+import asyncio
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+import httpx
+from ethos.audio_cache import AudioCache, CHUNK_SIZE
+from ethos.scheduler import Priority, priority
+
+
+@dataclass
+class SyncedTrack:
+    """Outcome of syncing one track"""
+    track: str
+    status: str = "pending"  # downloaded, cached, duplicate or failed
+    video_id: Optional[str] = None
+    bytes: int = 0
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def throughput(self) -> float:
+        """Download speed in bytes per second"""
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+
+@dataclass
+class SyncReport:
+    """Per-track results and aggregate throughput of a sync run"""
+    tracks: list[SyncedTrack] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    def count(self, status: str) -> int:
+        return sum(1 for track in self.tracks if track.status == status)
+
+    @property
+    def bytes(self) -> int:
+        return sum(track.bytes for track in self.tracks)
+
+    @property
+    def throughput(self) -> float:
+        """Bytes downloaded per second of wall-clock time"""
+        return self.bytes / self.elapsed if self.elapsed else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.count('downloaded')} downloaded, {self.count('cached')} already cached, "
+            f"{self.count('duplicate')} duplicates, {self.count('failed')} failed; "
+            f"{self.bytes / 2**20:.1f} MiB in {self.elapsed:.1f}s ({self.throughput / 2**20:.2f} MiB/s)"
+        )
+
+
+class OfflineSync:
+    """
+    Downloads tracks into the audio cache so they play without the network.
+
+    Tracks flow through a pipeline: `resolvers` workers resolve queries to video ids
+    and stream URLs, and `downloaders` workers download and verify the audio. The
+    stages overlap, so downloads start as soon as the first tracks are resolved.
+
+    The audio cache doubles as the sync state: tracks that are already cached,
+    including those shared with playlists synced earlier, are skipped, so an
+    interrupted sync resumes where it stopped when run again.
+    """
+    def __init__(self, cache: AudioCache, resolve: Callable[[str], tuple], lookup: Callable[[str], Optional[str]],
+                 resolvers: int = 2, downloaders: int = 3, progress: Optional[Callable[[SyncedTrack], None]] = None,
+                 busy: Callable[[], frozenset] = frozenset):
+        """
+        Args:
+        - cache (AudioCache): The cache tracks are downloaded into.
+        - resolve (Callable): Resolves a query to (video id, stream URL); called in a thread.
+        - lookup (Callable): Returns the cached video id of a query without the network, or None.
+        - resolvers (int): Number of queries resolved at a time.
+        - downloaders (int): Number of tracks downloaded at a time.
+        - progress (Callable): Called with each track once it is done.
+        - busy (Callable): Returns the video ids another component is downloading right now.
+        """
+        self.cache = cache
+        self.resolve = resolve
+        self.lookup = lookup
+        self.resolvers = resolvers
+        self.downloaders = downloaders
+        self.progress = progress
+        self.busy = busy
+        self.claimed: set[str] = set()
+
+    async def run(self, queries: list[str]) -> SyncReport:
+        """Sync the tracks of the given queries, returning the report once all are done"""
+        start = time.monotonic()
+        report = SyncReport([SyncedTrack(query) for query in dict.fromkeys(queries)])
+        pending: asyncio.Queue = asyncio.Queue()
+        resolved: asyncio.Queue = asyncio.Queue(maxsize=self.downloaders * 2)
+        for track in report.tracks:
+            pending.put_nowait(track)
+
+        async with httpx.AsyncClient(follow_redirects=True, timeout=httpx.Timeout(30.0, connect=10.0)) as client:
+            with priority(Priority.BACKGROUND):
+                resolvers = [asyncio.create_task(self.resolve_worker(pending, resolved)) for _ in range(self.resolvers)]
+                downloaders = [asyncio.create_task(self.download_worker(client, resolved)) for _ in range(self.downloaders)]
+            try:
+                await asyncio.gather(*resolvers)
+                for _ in downloaders:
+                    await resolved.put(None)
+                await asyncio.gather(*downloaders)
+            finally:
+                for task in resolvers + downloaders:
+                    task.cancel()
+
+        report.elapsed = time.monotonic() - start
+        return report
+
+    def done(self, track: SyncedTrack, status: str, error: Optional[str] = None) -> None:
+        track.status = status
+        track.error = error
+        if self.progress:
+            self.progress(track)
+
+    def claim(self, track: SyncedTrack) -> bool:
+        """Mark a video as taken by this sync, or report the track as already cached or a duplicate"""
+        if self.cache.is_complete(track.video_id):
+            self.done(track, "cached")
+            return False
+        if track.video_id in self.claimed or track.video_id in self.busy():
+            self.done(track, "duplicate")
+            return False
+        self.claimed.add(track.video_id)
+        return True
+
+    async def resolve_worker(self, pending: asyncio.Queue, resolved: asyncio.Queue) -> None:
+        while not pending.empty():
+            track = pending.get_nowait()
+            track.video_id = self.lookup(track.track)
+            if track.video_id and self.cache.is_complete(track.video_id):
+                self.done(track, "cached")
+                continue
+            try:
+                track.video_id, url = await asyncio.to_thread(self.resolve, track.track)
+            except Exception as e:
+                self.done(track, "failed", f"resolve: {e}")
+                continue
+            if not track.video_id:
+                self.done(track, "failed", "resolve: no video id")
+                continue
+            if self.claim(track):
+                await resolved.put((track, url))
+
+    async def download_worker(self, client: httpx.AsyncClient, resolved: asyncio.Queue) -> None:
+        while True:
+            job = await resolved.get()
+            if job is None:
+                return
+            track, url = job
+            try:
+                await self.download(client, track, url)
+                self.done(track, "downloaded")
+            except Exception as e:
+                self.cache.discard(track.video_id)
+                self.done(track, "failed", f"download: {e}")
+            finally:
+                self.claimed.discard(track.video_id)
+
+    async def download(self, client: httpx.AsyncClient, track: SyncedTrack, url: str) -> None:
+        """Download a track into the cache and verify it arrived complete"""
+        start = time.monotonic()
+        async with client.stream("GET", url) as response:
+            response.raise_for_status()
+            expected = response.headers.get("Content-Length")
+            path = self.cache.begin(track.video_id, response.headers.get("Content-Type"))
+            with open(path, "wb") as file:
+                async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                    file.write(chunk)
+                    track.bytes += len(chunk)
+        track.seconds = time.monotonic() - start
+
+        size = path.stat().st_size
+        if size == 0 or (expected is not None and size != int(expected)):
+            raise IOError(f"verify: got {size} bytes, expected {expected}")
+        self.cache.finish(track.video_id, self.busy() | frozenset(self.claimed))
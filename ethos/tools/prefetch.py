@@ -0,0 +1,82 @@
+import asyncio
+from typing import Callable, Optional
+from ethos.scheduler import Priority, priority
+
+
+class Prefetcher:
+    """
+    Resolves the stream URLs of upcoming queue entries in the background.
+
+    Only the first `depth` entries of the queue are prefetched, at most
+    `concurrency` at a time, at prefetch priority so they never hold up a track the
+    user asked for. Entries that leave that window, because they were removed or
+    the queue was reordered, are cancelled.
+    """
+
+    def __init__(self, resolve: Callable[[str], str], depth: int = 3, concurrency: int = 2):
+        self.resolve = resolve
+        self.depth = depth
+        self.concurrency = concurrency
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.tasks: dict[str, asyncio.Task] = {}
+
+    def update(self, tracks: list[str]) -> None:
+        """
+        Prefetch the first `depth` tracks of the queue and drop everything else.
+
+        Args:
+        - tracks (list[str]): The queue in play order.
+        """
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+        wanted = tracks[:self.depth]
+        for track in list(self.tasks):
+            if track not in wanted:
+                self.invalidate(track)
+        for track in wanted:
+            if track not in self.tasks:
+                self.tasks[track] = asyncio.create_task(self._fetch(track))
+
+    async def _fetch(self, track: str) -> str:
+        async with self.semaphore:
+            with priority(Priority.PREFETCH):
+                return await asyncio.to_thread(self.resolve, track)
+
+    async def get(self, track: str) -> Optional[str]:
+        """
+        Return the prefetched URL of a track, waiting for an in-flight prefetch to finish.
+
+        Returns:
+        - str: The resolved URL, or None if the track is not being prefetched or its
+               prefetch failed.
+        """
+        task = self.tasks.get(track)
+        if task is None:
+            return None
+        return await self.result(task)
+
+    def take(self, track: str) -> Optional[asyncio.Task]:
+        """Hand over the prefetch of a track leaving the queue, so it is not cancelled with it"""
+        return self.tasks.pop(track, None)
+
+    @staticmethod
+    async def result(task: asyncio.Task) -> Optional[str]:
+        """Wait for a prefetch without cancelling it if the waiter is cancelled"""
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if task.cancelled():
+                return None
+            raise
+        except Exception:
+            return None
+
+    def invalidate(self, track: str) -> None:
+        """Forget the prefetch of a track, cancelling it if it is still waiting to run"""
+        task = self.tasks.pop(track, None)
+        if task:
+            task.cancel()
+
+    def clear(self) -> None:
+        for track in list(self.tasks):
+            self.invalidate(track)
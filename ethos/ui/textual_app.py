@@ -6,7 +6,17 @@ from ethos.ui.rich_layout import RichLayout
 from ethos.player import MusicPlayer, TrackInfo
 from ethos.tools import helper
 from ethos.utils import Search, UserFiles
+from ethos.tools.prefetch import Prefetcher
+from typing import Optional
 import random
+import asyncio
+
+TYPE_AHEAD_DELAY = 0.3
+TYPE_AHEAD_MIN_CHARS = 3
+TYPE_AHEAD_COMMANDS = {
+    "/play ": "Type track no. to be played :-",
+    "/queue-add ": "Type track no. to be added to queue :-",
+}
 
 class TextualApp(App):
     """Textual Application Class for ethos UI"""
@@ -39,6 +49,11 @@ class TextualApp(App):
     layout_widget = ""
     current_playlist = reactive("")
     add_playlist = reactive(False)
+    armed_track = ""
+    local_tracks = {}
+    play_in_progress = False
+    play_generation = 0
+    type_ahead_results = None
 
 
     def compose(self) -> ComposeResult:
@@ -60,10 +75,73 @@ class TextualApp(App):
                 self.layout_widget.update_dashboard(self.recents, "Recents :-")
             else:
                 self.layout_widget.update_dashboard("You have not played any tracks yet!", "")
-            self.set_interval(1, self.update_)
         except:
             pass
 
+        self.prefetcher = Prefetcher(self.resolve_track)
+        Search.get_resolver_pool().start()
+        # Open the play log (and user store) here, libvlc callbacks use it from their own thread
+        UserFiles.get_play_log()
+        self.subscribe_to_player()
+        if self.player.library_path:
+            self.player.watch_library()
+
+    async def on_unmount(self) -> None:
+        """Stop background work and close pooled connections when the app exits"""
+        self.player.unwatch_library()
+        await Search.close_http_client()
+        Search.close_resolver_pool()
+        Search.close_audio_proxy()
+        UserFiles.close_play_log()
+
+    def subscribe_to_player(self) -> None:
+        """Hook the player's libvlc events into the app's event loop"""
+        loop = asyncio.get_running_loop()
+        self.last_progress_second = -1
+
+        def on_time_changed(event):
+            second = event.u.new_time // 1000
+            if second != self.last_progress_second:
+                self.last_progress_second = second
+                UserFiles.get_play_log().progress(second)
+                loop.call_soon_threadsafe(self.update_)
+
+        self.player.on("time_changed", on_time_changed)
+        self.player.on("end_reached", lambda event: loop.call_soon_threadsafe(self.on_end_reached))
+        self.player.on("error", lambda event: loop.call_soon_threadsafe(self.on_playback_error))
+        self.player.on("buffering", lambda event: loop.call_soon_threadsafe(self.on_buffering, event.u.new_cache))
+        self.player.on("track_changed", lambda event: loop.call_soon_threadsafe(self.on_track_changed))
+
+    def on_input_changed(self, event: Input.Changed) -> None:
+        """Search as the user types a /play or /queue-add query"""
+        for command, title in TYPE_AHEAD_COMMANDS.items():
+            if event.value.startswith(command):
+                query = event.value[len(command):].strip()
+                if len(query) >= TYPE_AHEAD_MIN_CHARS:
+                    self.type_ahead(command, query, title)
+                    return
+        self.workers.cancel_group(self, "type-ahead")
+
+    @work(exclusive=True, group="type-ahead")
+    async def type_ahead(self, command: str, query: str, title: str) -> None:
+        """
+        Show the results for a partially typed query.
+
+        Each keystroke replaces the previous worker, so only a query the user paused on
+        for `TYPE_AHEAD_DELAY` is searched, and superseded searches are cancelled before
+        they render.
+        """
+        await asyncio.sleep(TYPE_AHEAD_DELAY)
+        results = await self.search_tracks(query, title)
+        self.type_ahead_results = (command, query, results)
+
+    async def search_or_type_ahead(self, command: str, query: str, title: str, target: str) -> list[str]:
+        """Reuse the type-ahead results for a submitted query if they are ready, otherwise search now"""
+        self.workers.cancel_group(self, "type-ahead")
+        if self.type_ahead_results and self.type_ahead_results[:2] == (command, query.strip()):
+            return self.type_ahead_results[2]
+        return await self.search_tracks(query, title, target)
+
     @work
     async def on_input_submitted(self, event: Input.Submitted):
         """Handle input submission"""
@@ -76,11 +154,9 @@ class TextualApp(App):
                 try:
                     search_track = self.helper.parse_command(event.value)
                     self.layout_widget.update_log("Searching for tracks")
-                    self.tracks_list = await Search.fetch_tracks_list(search_track)
-                    if self.tracks_list:
-                        self.layout_widget.update_dashboard(self.tracks_list, "Type track no. to be played :-")
-                        self.update_input()
-                        self.select_from_queue = False
+                    self.update_input()
+                    self.select_from_queue = False
+                    self.tracks_list = await self.search_or_type_ahead("/play ", search_track, TYPE_AHEAD_COMMANDS["/play "], "tracks_list")
                 except ValueError:
                     self.layout_widget.update_dashboard("Invalid command. Make sure to enter a valid command. You can see the list of commands using /help", "")
                     pass
@@ -109,11 +185,9 @@ class TextualApp(App):
             if event.value.startswith("/queue-add"):
                 try:
                     self.search_track = self.helper.parse_command(event.value)
-                    self.queue_options = await Search.fetch_tracks_list(self.search_track)
-                    if self.queue_options:
-                        self.layout_widget.update_dashboard(self.queue_options, "Type track no. to be added to queue :-")
-                        self.update_input()
-                        self.select_from_queue = True
+                    self.update_input()
+                    self.select_from_queue = True
+                    self.queue_options = await self.search_or_type_ahead("/queue-add ", self.search_track, TYPE_AHEAD_COMMANDS["/queue-add "], "queue_options")
                 except ValueError:
                     self.layout_widget.update_dashboard("Please enter a valid track name. You can view the list of commands using /help", "")
                     pass
@@ -123,6 +197,9 @@ class TextualApp(App):
                     self.should_play_queue = True
                     self.track_to_be_added_to_queue = self.queue_options[int(event.value)-1]
                     self.queue[self.search_track] = helper.Format.clean_hashtag(self.track_to_be_added_to_queue)
+                    self.queue_changed()
+                    if self.player.gapless and len(self.queue) == 1:
+                        self.arm_next_from_queue()
                     self.update_input()
                     self.search_track=""
                 except:
@@ -137,6 +214,24 @@ class TextualApp(App):
                 except:
                     pass
 
+            if event.value.startswith("/queue-remove"):
+                try:
+                    ind = int(helper.Format.parse_command(event.value))
+                    key = list(self.queue.keys())[ind-1]
+                    track = self.queue.pop(key)
+                    self.prefetcher.invalidate(track)
+                    if track == self.armed_track:
+                        self.armed_track = ""
+                        self.player.disarm_next()
+                        if self.player.gapless:
+                            self.arm_next_from_queue()
+                    self.queue_changed()
+                    data = "\n".join(f"{i+1}. {track}" for i, track in enumerate(self.queue.values()))
+                    self.layout_widget.update_dashboard(data, "Current Queue :-")
+                    self.update_input()
+                except (ValueError, IndexError):
+                    self.layout_widget.update_dashboard("Please enter the no. of track you want to remove", "")
+
             if event.value.startswith("/pause"):
                 self.action_pause()
 
@@ -151,7 +246,8 @@ class TextualApp(App):
                     queue = list(self.queue.values())
                     track = queue[ind-1]
                     del self.queue[key]
-                    self.handle_play(track)
+                    self.handle_play(track, self.prefetcher.take(track))
+                    self.queue_changed()
                     self.layout_widget.update_log("Playing track from current queue")
                     self.update_input()
                 except ValueError:
@@ -212,6 +308,41 @@ class TextualApp(App):
                 self.show_tracks_from_playlist(playlist_name)
 
     
+            if event.value.startswith("/gapless"):
+                try:
+                    self.player.gapless = self.helper.parse_command(event.value) == "on"
+                    if self.player.gapless:
+                        self.arm_next_from_queue()
+                    else:
+                        self.player.disarm_next()
+                    self.layout_widget.update_log(f"Gapless playback {'on' if self.player.gapless else 'off'}")
+                    self.update_input()
+                except ValueError:
+                    self.layout_widget.update_dashboard("Usage: /gapless on|off", "")
+
+            if event.value.startswith("/crossfade"):
+                try:
+                    self.player.set_crossfade(self.helper.parse_command(event.value))
+                    self.layout_widget.update_log(f"Crossfade set to {self.player.crossfade}s")
+                    self.update_input()
+                except ValueError:
+                    self.layout_widget.update_dashboard("Please enter the crossfade in seconds.", "")
+
+            if event.value.startswith("/download-playlist"):
+                try:
+                    self.download_playlist(self.helper.parse_command(event.value))
+                    self.update_input()
+                except ValueError:
+                    self.layout_widget.update_dashboard("Usage: /download-playlist <playlist name>", "")
+
+            if event.value == "/cache-stats":
+                self.show_cache_stats()
+                self.update_input()
+
+            if event.value == "/stats" or event.value.startswith("/stats "):
+                self.show_stats(self.helper.parse_command(event.value) if " " in event.value.strip() else "month")
+                self.update_input()
+
             if event.value == "/help":
                 try:
                     self.layout_widget.show_commands()
@@ -219,6 +350,51 @@ class TextualApp(App):
                     pass
             
 
+    async def search_tracks(self, query: str, title: str, target: Optional[str] = None) -> list[str]:
+        """
+        Search the local library first and Spotify second.
+
+        Local matches are shown right away; Spotify results are appended as a second
+        section once they arrive. Local entries are numbered first and play from disk.
+
+        Args:
+        - query (str): The track to search for.
+        - title (str): Title of the dashboard the results are shown in.
+        - target (str): The list a typed track no. selects from ("tracks_list" or
+                        "queue_options"). It is set to the local matches as soon as they
+                        are shown, so a selection made before Spotify answers picks from them.
+
+        Returns:
+        - list: Numbered "<Song name> by <Artist Name>" entries, local matches first.
+        """
+        local = []
+        for track in self.player.search_library(query):
+            entry = f"{len(local)+1}. {track.title} by {track.artist or 'Unknown Artist'}"
+            self.local_tracks[helper.Format.clean_hashtag(entry)] = track.path
+            local.append(entry)
+        if target:
+            setattr(self, target, local)
+        if local:
+            self.layout_widget.update_dashboard(["Local library :-", *local], title)
+
+        remote = [
+            f"{idx}. {helper.Format.clean_hashtag(track)}"
+            for idx, track in enumerate(await Search.fetch_tracks_list(query), start=len(local)+1)
+        ]
+        if remote:
+            sections = ["Local library :-", *local, "", "Spotify :-", *remote] if local else remote
+            self.layout_widget.update_dashboard(sections, title)
+        elif not local:
+            self.layout_widget.update_dashboard("No tracks found.", title)
+        return local + remote
+
+    def resolve_track(self, track_name: str) -> str:
+        """Return the local file for a track found in the library or the audio cache, or resolve its stream"""
+        track_name = helper.Format.clean_hashtag(track_name)
+        if track_name in self.local_tracks:
+            return self.local_tracks[track_name]
+        return Search.get_audio_source(Search.stream_query(track_name))
+
     def action_pause(self):
         """Pause the player"""
         self.player.pause()
@@ -244,22 +420,157 @@ class TextualApp(App):
         self.player.set_volume(current_volume-5)
         self.layout_widget.update_volume(self.player.get_volume())
 
-    def handle_play(self, track_name: str):
-        """Function to handle the track playback"""
+    @work(exclusive=True, group="play")
+    async def handle_play(self, track_name: str, prefetched: Optional[asyncio.Task] = None):
+        """
+        Play a track through a staged pipeline: resolve, open, buffer and start.
+
+        Blocking steps run in a thread so the UI stays responsive, and every stage is
+        reported in the log. Starting another track cancels this one between stages.
+
+        Args:
+        - track_name (str): The track to play.
+        - prefetched (asyncio.Task): The queue prefetch of the track, if it had one.
+        """
+        self.play_generation += 1
+        generation = self.play_generation
+        self.play_in_progress = True
+        started = False
         try:
-            url = Search.get_audio_url(track_name+" official music video")
+            self.layout_widget.update_log(f"Resolving {helper.Format.clean_hashtag(track_name)}")
+            url = await Prefetcher.result(prefetched) if prefetched else None
+            if not url:
+                url = await asyncio.to_thread(self.resolve_track, track_name)
+
+            self.layout_widget.update_log("Opening stream")
+            self.armed_track = ""
+            if not self.player.arm_next(url):
+                self.layout_widget.update_log("Could not open track")
+                return
+
+            await self.wait_for_buffer()
+
             self.track_url = url
             self.player.set_volume(50)
             self.player.play(url)
+            started = True
+            self.layout_widget.update_log("Playing")
             UserFiles.add_track_to_recents(helper.Format.clean_hashtag(track_name))
+            self.log_play(helper.Format.clean_hashtag(track_name))
             self.layout_widget.update_track(track_name)
-            self.current_track_duration = TrackInfo.get_audio_duration(url)
-            self.layout_widget.update_total_track_time(TrackInfo.get_audio_duration(url))
+            self.load_track_metadata(url)
             color_ind = random.randint(0,9)
             self.layout_widget.update_color(color_ind)
+            if self.player.gapless:
+                self.arm_next_from_queue()
+        except asyncio.CancelledError:
+            raise
+        except:
+            self.layout_widget.update_log("Could not play track")
+        finally:
+            # A play superseded by a newer one leaves the standby and the flag to that play,
+            # which arms its own track; its cancellation may only be handled after it did
+            if generation == self.play_generation:
+                if not started:
+                    # Do not leave the track armed for the player to switch to on end_reached
+                    self.player.disarm_next()
+                self.play_in_progress = False
+
+    async def wait_for_buffer(self, timeout: float = 10.0) -> None:
+        """Wait until the armed track has buffered, reporting progress, or the timeout expires"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while not self.player.is_next_buffered() and loop.time() < deadline:
+            self.layout_widget.update_log(f"Buffering {int(self.player.standby_cache)}%")
+            await asyncio.sleep(0.05)
+
+    @work(exclusive=True, group="arm")
+    async def arm_next_from_queue(self) -> None:
+        """Resolve the head of the queue and buffer it on the player's standby slot"""
+        if not self.queue or self.play_in_progress:
+            return
+        track = list(self.queue.values())[0]
+        try:
+            url = await self.prefetcher.get(track) or await asyncio.to_thread(self.resolve_track, track)
+            if track in self.queue.values() and not self.play_in_progress and self.player.arm_next(url):
+                self.armed_track = track
         except:
             pass
+
+    def queue_changed(self) -> None:
+        """Prefetch the stream URLs of the upcoming queue entries"""
+        self.prefetcher.update(list(self.queue.values()))
+
+    def on_track_changed(self) -> None:
+        """Update the UI after the player switched to the armed track"""
+        track = self.armed_track
+        self.armed_track = ""
+        if track not in self.queue.values():
+            return
+        key = list(self.queue.keys())[list(self.queue.values()).index(track)]
+        del self.queue[key]
+        self.prefetcher.take(track)
+        self.queue_changed()
+
+        self.track_url = self.player.current_track
+        UserFiles.add_track_to_recents(track)
+        UserFiles.get_play_log().finished()
+        self.log_play(track)
+        self.layout_widget.update_track(track)
+        self.load_track_metadata(self.track_url)
+        self.layout_widget.update_color(random.randint(0,9))
+        entries = self.queue.values()
+        data = "\n".join(f"{i+1}. {track}" for i, track in enumerate(entries))
+        self.layout_widget.update_dashboard(data, "Current Queue :-")
+        self.layout_widget.update_log("Currently playing from queue")
+        self.arm_next_from_queue()
     
+    @work(exclusive=True, group="metadata")
+    async def load_track_metadata(self, url: str) -> None:
+        """Parse the track in the background and update the total track time once known"""
+        metadata = await TrackInfo.get_metadata(url)
+        if url != self.track_url:
+            return
+        self.current_track_duration = helper.Format.seconds_to_min_sec(metadata.duration)
+        self.layout_widget.update_total_track_time(self.current_track_duration)
+
+    @work(exclusive=True, group="sync")
+    async def download_playlist(self, playlist: str) -> None:
+        """Download every track of a playlist into the audio cache, reporting progress in the log"""
+        tracks = UserFiles.fetch_tracks_from_playlist(playlist)
+        if not tracks:
+            self.layout_widget.update_dashboard(f"Playlist {playlist} is empty or does not exist.", "")
+            return
+        finished = []
+
+        def progress(track):
+            finished.append(track)
+            detail = f"{track.bytes / 2**20:.1f} MiB at {track.throughput / 2**20:.2f} MiB/s" if track.status == "downloaded" else track.error or track.status
+            self.layout_widget.update_log(f"[{len(finished)}/{len(tracks)}] {track.track}: {detail}")
+
+        self.layout_widget.update_log(f"Downloading {len(tracks)} tracks of {playlist}")
+        report = await Search.sync_tracks(tracks, progress)
+        self.layout_widget.update_log(f"{playlist}: {report.summary()}")
+
+    def show_cache_stats(self) -> None:
+        """Show the hit rates of the search and stream caches and the request scheduler metrics"""
+        search = Search.get_search_cache().stats()
+        stream = Search.get_stream_cache().stats()
+        requests = Search.get_scheduler().metrics()
+        audio = Search.get_audio_proxy().cache.stats()
+        data = "\n".join([
+            f"Search results: {search['hit_rate']:.0%} hit rate "
+            f"({search['memory_hits']} memory, {search['disk_hits']} disk, {search['stale_hits']} stale, {search['misses']} misses)",
+            f"  {search['entries']} cached searches, {search['memory_entries']} in memory",
+            f"Streams: {stream['hit_rate']:.0%} hit rate "
+            f"({stream['hits']} hits, {stream['expired']} expired, {stream['misses']} misses)",
+            f"  {stream['entries']} cached streams",
+            f"Audio: {audio['entries']} tracks, {audio['bytes'] // 2**20} of {audio['max_bytes'] // 2**20} MiB ({audio['policy'].upper()})",
+            f"Requests: {requests['queued']} queued, {requests['in_flight']} in flight, "
+            f"{requests['throttled_total']} throttled, {requests['retries']} retried",
+        ])
+        self.layout_widget.update_dashboard(data, "Cache stats :-")
+
     def show_playlists(self) -> None:
         try:
             playlists = UserFiles.fetch_playlists()
@@ -269,21 +580,34 @@ class TextualApp(App):
             pass
 
     def show_tracks_from_playlist(self, playlist: str) -> None:
+        """Show a playlist with the durations already in the metadata store, then hydrate the rest"""
         try:
-            playlist = UserFiles.fetch_tracks_from_playlist(playlist)
-            data = "\n".join(f"{i+1}. {track}" for i, track in enumerate(playlist))
-            self.layout_widget.update_dashboard(data, "Playlist Contents :")
-        except:
-            pass
-
-
-    def show_tracks_from_playlist(self, playlist: str) -> None:
-        try:
-            playlist = UserFiles.fetch_tracks_from_playlist(playlist)
-            data = "\n".join(f"{i+1}. {track}" for i, track in enumerate(playlist))
-            self.layout_widget.update_dashboard(data, "Playlist Contents :")
-        except:
-            pass
+            entries = UserFiles.fetch_playlist_entries(playlist)
+            store = Search.get_metadata_store()
+            stored = store.get_tracks([entry.get("id") for entry in entries])
+            metadata = [
+                stored.get(entry.get("id")) or store.find_track(entry["name"], entry["artist"])
+                for entry in entries
+            ]
+            self.render_playlist(entries, metadata)
+            if None in metadata:
+                self.hydrate_playlist(entries)
+        except Exception as e:
+            self.layout_widget.update_dashboard(f"Could not load playlist: {e}", "")
+
+    @work(exclusive=True, group="hydrate")
+    async def hydrate_playlist(self, entries: list[dict]) -> None:
+        """Fetch the missing metadata of a playlist in batches and show it again"""
+        self.render_playlist(entries, await Search.hydrate_playlist(entries))
+
+    def render_playlist(self, entries: list[dict], metadata: list[Optional[dict]]) -> None:
+        lines = []
+        for i, (entry, track) in enumerate(zip(entries, metadata)):
+            duration = ""
+            if track and track["duration_ms"]:
+                duration = f"  [{helper.Format.seconds_to_min_sec(track['duration_ms'] // 1000)}]"
+            lines.append(f"{i+1}. {entry['name']} by {entry['artist']}{duration}")
+        self.layout_widget.update_dashboard("\n".join(lines), "Playlist Contents :")
 
 
     def add_to_playlist(self, track, playlist: str) -> None:
@@ -301,28 +625,57 @@ class TextualApp(App):
         input_widget.value = ""
     
     def update_(self) -> None:
-        """Function to update track progress and check for queue"""
+        """Function to update track progress"""
         
         try:   
             self.layout_widget.update_music_progress(TrackInfo.get_current_time(self.player), int(TrackInfo.get_progress(self.player)))
         except:
             pass
 
-        if TrackInfo.get_progress(self.player) == 100.0:
-            if self.queue:
-                try:
-                    keys = list(self.queue.keys())
-                    tracks = list(self.queue.values())
-                    key = keys[0]
-                    track = tracks[0]
-                    del self.queue[key]
-                    self.handle_play(track)
-                    entries = self.queue.values()
-                    data = "\n".join(f"{i+1}. {track}" for i, track in enumerate(entries))
-                    self.layout_widget.update_dashboard(data, "Current Queue :-")
-                    self.layout_widget.update_log("Currently playing from queue")
-                except:
-                    pass
+    def log_play(self, track: str) -> None:
+        """Start logging a play of a track, finishing the previous one as skipped"""
+        UserFiles.get_play_log().started(track, "local" if track in self.local_tracks else "stream")
 
-  
-    
+    def on_end_reached(self) -> None:
+        """Log the finished track as played through and continue with the queue"""
+        UserFiles.get_play_log().finished()
+        self.play_next_from_queue()
+
+    def show_stats(self, period: str) -> None:
+        """Show the listening totals and most played tracks of a period"""
+        UserFiles.get_play_log().flush()
+        try:
+            self.layout_widget.update_dashboard("\n".join(UserFiles.listening_stats(period)), f"Listening stats ({period}) :-")
+        except ValueError as e:
+            self.layout_widget.update_dashboard(f"Usage: /stats [today|week|month|year|all]. {e}", "")
+
+    def play_next_from_queue(self) -> None:
+        """Play the next track from the queue once the current track ends"""
+        self.update_()
+        if self.queue:
+            try:
+                keys = list(self.queue.keys())
+                tracks = list(self.queue.values())
+                key = keys[0]
+                track = tracks[0]
+                del self.queue[key]
+                self.handle_play(track, self.prefetcher.take(track))
+                self.queue_changed()
+                entries = self.queue.values()
+                data = "\n".join(f"{i+1}. {track}" for i, track in enumerate(entries))
+                self.layout_widget.update_dashboard(data, "Current Queue :-")
+                self.layout_widget.update_log("Currently playing from queue")
+            except:
+                pass
+
+    def on_playback_error(self) -> None:
+        """Skip to the next queued track when the current one fails to play"""
+        self.layout_widget.update_log("Could not play track")
+        self.play_next_from_queue()
+
+    def on_buffering(self, cache: float) -> None:
+        """Show buffering progress while the stream fills up"""
+        if cache < 100:
+            self.layout_widget.update_log(f"Buffering {int(cache)}%")
+        else:
+            self.layout_widget.update_log("Playing")
@@ -52,7 +52,13 @@ _/ __ \   __\  |  \ /  _ \/  ___/
         "/volume <number>": "to set volume to a certain %",
         "/queue-add <track name>": "to add a track to current queue",
         "/show-queue": "to show current queue",
+        "/queue-remove <track number>": "to remove the track at the given position from queue",
         "/recents": "to show recents",
-        "/qp <track number>": "to play the track at the given position in queue"
+        "/qp <track number>": "to play the track at the given position in queue",
+        "/gapless <on|off>": "to buffer the next queued track for gapless playback",
+        "/crossfade <seconds>": "to crossfade between tracks in gapless mode",
+        "/cache-stats": "to show cache hit rates and request metrics",
+        "/download-playlist <playlist name>": "to download a playlist for offline playback",
+        "/stats [today|week|month|year|all]": "to show the most played tracks of a period"
     }
 
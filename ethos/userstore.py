@@ -0,0 +1,496 @@
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from itertools import islice
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Optional, Union
+from ethos.playlists import PlaylistStore
+
+RECENTS_LIMIT = 10
+STAGE_BATCH = 100
+HISTORY_RETENTION_DAYS = 365
+STATS_PERIODS = ("today", "week", "month", "year", "all")
+
+
+class UserStore:
+    """
+    Transactional store of the user's playlists, recent tracks and play history.
+
+    Every play is appended to the `plays` log and added to per day, month, year and
+    all-time `rollups` in the same transaction, so listening stats are read from a
+    handful of precomputed rows however long the history grows. `compact_history`
+    drops raw plays and daily rollups older than HISTORY_RETENTION_DAYS.
+
+    Everything lives in one SQLite database in WAL mode, so the TUI and the command
+    line can read and write it at the same time. Playlist entries are ordered by a
+    fractional `position` indexed per playlist: adding a track at either end or
+    removing one is a single indexed statement, independent of the playlist size.
+
+    On first use the playlists and recents of the older JSON and text files found in
+    `legacy_dir` are migrated into the database; the files themselves are left as they are.
+    """
+    def __init__(self, db_path: Optional[Path] = None, legacy_dir: Optional[Path] = None):
+        self.db_path = db_path or Path.home() / ".ethos" / "userfiles" / "user.db"
+        self.legacy_dir = legacy_dir or self.db_path.parent
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.RLock()
+        # Transactions are opened explicitly, see `transaction`
+        self.conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("PRAGMA foreign_keys=ON")
+        with self.transaction():
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS playlists (
+                    id INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL UNIQUE,
+                    created REAL NOT NULL
+                )""")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    id INTEGER PRIMARY KEY,
+                    playlist_id INTEGER NOT NULL REFERENCES playlists (id) ON DELETE CASCADE,
+                    position REAL NOT NULL,
+                    track_id TEXT,
+                    name TEXT NOT NULL,
+                    artist TEXT NOT NULL,
+                    isrc TEXT,
+                    duration_ms INTEGER,
+                    added REAL NOT NULL
+                )""")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS entries_position ON entries (playlist_id, position)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS entries_track ON entries (playlist_id, track_id)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS entries_name ON entries (playlist_id, name, artist)")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS staged (
+                    playlist TEXT NOT NULL,
+                    position REAL NOT NULL,
+                    track_id TEXT,
+                    name TEXT NOT NULL,
+                    artist TEXT NOT NULL,
+                    isrc TEXT,
+                    duration_ms INTEGER,
+                    added REAL NOT NULL
+                )""")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS staged_position ON staged (playlist, position)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS recents (track TEXT PRIMARY KEY, played REAL NOT NULL)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS recents_played ON recents (played)")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS plays (
+                    id INTEGER PRIMARY KEY,
+                    track TEXT NOT NULL,
+                    track_id TEXT,
+                    source TEXT NOT NULL,
+                    started_at REAL NOT NULL,
+                    listened REAL NOT NULL,
+                    skipped INTEGER NOT NULL
+                )""")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS plays_started_at ON plays (started_at)")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS rollups (
+                    granularity TEXT NOT NULL,
+                    bucket TEXT NOT NULL,
+                    track TEXT NOT NULL,
+                    plays INTEGER NOT NULL,
+                    listened REAL NOT NULL,
+                    skips INTEGER NOT NULL,
+                    PRIMARY KEY (granularity, bucket, track)
+                )""")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS rollups_top ON rollups (granularity, bucket, plays DESC)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self.migrate()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Run the statements of the block in one write transaction.
+
+        The write lock is taken up front (BEGIN IMMEDIATE), so another process writing
+        at the same time makes this one wait instead of failing halfway through.
+        """
+        with self.lock:
+            if self.conn.in_transaction:  # nested, part of the enclosing transaction
+                yield self.conn
+                return
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def migrate(self) -> bool:
+        """
+        Import the legacy `playlists/*.json` files and `recents.txt` once.
+
+        Returns:
+        - bool: True if this call performed the migration.
+        """
+        with self.transaction():
+            if self.conn.execute("SELECT 1 FROM meta WHERE key = 'migrated'").fetchone():
+                return False
+            legacy = PlaylistStore(self.legacy_dir / "playlists")
+            for name in legacy.names():
+                try:
+                    entries = legacy.load(name)
+                except (OSError, ValueError) as e:
+                    print(f"Error migrating playlist {name}: {e}")
+                    continue
+                if not self.exists(name):
+                    self._replace(self._playlist_id(name, create=True), entries)
+
+            recents_file = self.legacy_dir / "recents.txt"
+            if recents_file.exists():
+                now = time.time()
+                with open(recents_file, 'r') as f:
+                    tracks = [line.strip() for line in f if line.strip()]
+                # the file lists the most recent track first
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO recents VALUES (?, ?)",
+                    [(track, now - index) for index, track in enumerate(tracks[:RECENTS_LIMIT])],
+                )
+            self.conn.execute("INSERT INTO meta VALUES ('migrated', ?)", (str(time.time()),))
+            return True
+
+    @staticmethod
+    def _known(entry: dict) -> dict:
+        """Leave out the unknown (None) fields of an entry, so stored and incoming entries compare equal"""
+        return {key: value for key, value in entry.items() if value is not None}
+
+    @staticmethod
+    def _entry(row: sqlite3.Row) -> dict:
+        """Turn an `entries` row into a playlist entry, leaving out unknown fields"""
+        return UserStore._known({"id": row["track_id"], "name": row["name"], "artist": row["artist"],
+                                 "isrc": row["isrc"], "duration_ms": row["duration_ms"]})
+
+    def _row(self, playlist: Union[int, str], position: float, entry: dict) -> tuple:
+        """The column values of an `entries` row, or of a `staged` one given the playlist name"""
+        return (playlist, position, entry.get("id"), entry.get("name", ""), entry.get("artist", ""),
+                entry.get("isrc"), entry.get("duration_ms"), time.time())
+
+    def _insert(self, rows: Iterable[tuple]) -> None:
+        self.conn.executemany(
+            "INSERT INTO entries (playlist_id, position, track_id, name, artist, isrc, duration_ms, added) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+
+    def _playlist_id(self, name: str, create: bool = False) -> Optional[int]:
+        row = self.conn.execute("SELECT id FROM playlists WHERE name = ?", (name,)).fetchone()
+        if row:
+            return row["id"]
+        if not create:
+            return None
+        return self.conn.execute("INSERT INTO playlists (name, created) VALUES (?, ?)", (name, time.time())).lastrowid
+
+    def names(self) -> list[str]:
+        """Names of all playlists"""
+        with self.lock:
+            return [row["name"] for row in self.conn.execute("SELECT name FROM playlists ORDER BY name")]
+
+    def exists(self, name: str) -> bool:
+        with self.lock:
+            return self._playlist_id(name) is not None
+
+    def create(self, name: str) -> None:
+        with self.transaction():
+            self._playlist_id(name, create=True)
+
+    def delete(self, name: str) -> None:
+        with self.transaction():
+            self.conn.execute("DELETE FROM playlists WHERE name = ?", (name,))
+
+    def load(self, name: str) -> list[dict]:
+        """Return the entries of a playlist in order, an empty list if it does not exist"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT e.* FROM entries e JOIN playlists p ON p.id = e.playlist_id WHERE p.name = ? ORDER BY e.position",
+                (name,),
+            ).fetchall()
+        return [self._entry(row) for row in rows]
+
+    def add(self, name: str, entry: dict, first: bool = True) -> None:
+        """Add an entry at the start (or end) of a playlist, creating the playlist if needed"""
+        with self.transaction():
+            playlist_id = self._playlist_id(name, create=True)
+            edge = "MIN(position) - 1" if first else "MAX(position) + 1"
+            position = self.conn.execute(
+                f"SELECT COALESCE({edge}, 0) FROM entries WHERE playlist_id = ?", (playlist_id,)
+            ).fetchone()[0]
+            self._insert([self._row(playlist_id, position, entry)])
+
+    def remove(self, name: str, entry: dict) -> bool:
+        """
+        Remove the first occurrence of a track from a playlist, matched on its Spotify id
+        or, failing that, on name and artist.
+
+        Returns:
+        - bool: False if the playlist did not contain the track.
+        """
+        with self.transaction():
+            playlist_id = self._playlist_id(name)
+            if playlist_id is None:
+                return False
+            matches = [("name = ? AND artist = ?", (entry.get("name", ""), entry.get("artist", "")))]
+            if entry.get("id"):
+                matches.insert(0, ("track_id = ?", (entry["id"],)))
+            row = None
+            for match, params in matches:
+                row = self.conn.execute(
+                    f"SELECT id FROM entries WHERE playlist_id = ? AND {match} ORDER BY position LIMIT 1",
+                    (playlist_id, *params),
+                ).fetchone()
+                if row:
+                    break
+            if row:
+                self.conn.execute("DELETE FROM entries WHERE id = ?", (row["id"],))
+            return row is not None
+
+    def _replace(self, playlist_id: int, entries: Iterable[dict]) -> None:
+        self.conn.execute("DELETE FROM entries WHERE playlist_id = ?", (playlist_id,))
+        self._insert(self._row(playlist_id, float(index), entry) for index, entry in enumerate(entries))
+
+    def stage(self, name: str, entries: Iterable[dict]) -> None:
+        """
+        Store the next version of a playlist in the `staged` table as its entries are produced.
+
+        Every STAGE_BATCH entries are written in their own short transaction, and the
+        batch is read from `entries` before the transaction opens, so a slow producer
+        (a playlist streamed from Spotify) never holds the write lock.
+        """
+        with self.transaction():
+            self.conn.execute("DELETE FROM staged WHERE playlist = ?", (name,))
+        entries = iter(entries)
+        index = 0
+        while True:
+            batch = list(islice(entries, STAGE_BATCH))
+            if not batch:
+                return
+            with self.transaction():
+                self.conn.executemany(
+                    "INSERT INTO staged VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [self._row(name, float(index + offset), entry) for offset, entry in enumerate(batch)],
+                )
+            index += len(batch)
+
+    def _unstage(self, name: str) -> list[dict]:
+        """Take the staged entries of a playlist out of the `staged` table. Call inside a transaction."""
+        rows = self.conn.execute("SELECT * FROM staged WHERE playlist = ? ORDER BY position", (name,)).fetchall()
+        self.conn.execute("DELETE FROM staged WHERE playlist = ?", (name,))
+        return [self._entry(row) for row in rows]
+
+    def write(self, name: str, entries: Iterable[dict]) -> None:
+        """
+        Replace the entries of a playlist. The entries are staged as they are produced and
+        swapped in at the end, so an interrupted write leaves the playlist as it was.
+        """
+        self.stage(name, entries)
+        with self.transaction():
+            playlist_id = self._playlist_id(name, create=True)
+            self.conn.execute("DELETE FROM entries WHERE playlist_id = ?", (playlist_id,))
+            self.conn.execute(
+                "INSERT INTO entries (playlist_id, position, track_id, name, artist, isrc, duration_ms, added) "
+                "SELECT ?, position, track_id, name, artist, isrc, duration_ms, added FROM staged WHERE playlist = ?",
+                (playlist_id, name),
+            )
+            self.conn.execute("DELETE FROM staged WHERE playlist = ?", (name,))
+
+    def save(self, name: str, entries: Iterable[dict]) -> dict:
+        """
+        Save a new version of a playlist, touching only the rows that changed.
+
+        The entries are staged as they are produced (see `stage`); the difference is then
+        computed with `PlaylistStore.diff`, keyed on Spotify id, in one short transaction:
+        removed and moved rows are deleted, changed rows updated and new or moved entries
+        inserted between the positions of their kept neighbours.
+
+        Returns:
+        - dict: The "remove", "add" and "update" changes that were applied.
+        """
+        self.stage(name, entries)
+        with self.transaction():
+            # read back from the staged rows, unknown fields are left out as in stored ones
+            entries = self._unstage(name)
+            playlist_id = self._playlist_id(name)
+            if playlist_id is None:
+                self._replace(self._playlist_id(name, create=True), entries)
+                return PlaylistStore.diff([], entries)
+
+            rows = self.conn.execute(
+                "SELECT * FROM entries WHERE playlist_id = ? ORDER BY position", (playlist_id,)
+            ).fetchall()
+            current = [self._entry(row) for row in rows]
+            delta = PlaylistStore.diff(current, entries)
+            if PlaylistStore.is_empty(delta):
+                return delta
+
+            by_key = dict(zip(PlaylistStore.keys(current), rows))
+            removed = set(delta["remove"])
+            self.conn.executemany("DELETE FROM entries WHERE id = ?", [(by_key[key]["id"],) for key in removed])
+            self.conn.executemany(
+                "UPDATE entries SET track_id = ?, name = ?, artist = ?, isrc = ?, duration_ms = ? WHERE id = ?",
+                [(*self._row(playlist_id, 0, entry)[2:7], by_key[key]["id"]) for key, entry in delta["update"]],
+            )
+
+            kept = [row["position"] for key, row in by_key.items() if key not in removed]
+            positions = self.positions(kept, [index for index, _, _ in delta["add"]])
+            if positions is None:  # no room left between neighbours: renumber the playlist
+                self._replace(playlist_id, entries)
+                return delta
+            self._insert(
+                self._row(playlist_id, position, entry) for position, (_, _, entry) in zip(positions, delta["add"])
+            )
+            return delta
+
+    @staticmethod
+    def positions(kept: list[float], indexes: list[int]) -> Optional[list[float]]:
+        """
+        Positions for entries inserted at the given final indexes (ascending) among the
+        kept entries, spreading each run of insertions evenly between its neighbours.
+
+        Returns:
+        - list: One position per index, or None if two neighbours are too close to fit them.
+        """
+        result = []
+        i = 0
+        while i < len(indexes):
+            # a run of consecutive inserted indexes
+            j = i
+            while j + 1 < len(indexes) and indexes[j + 1] == indexes[j] + 1:
+                j += 1
+            before = indexes[i] - i  # kept entries ahead of the run
+            count = j - i + 1
+            low = kept[before - 1] if before > 0 else None
+            high = kept[before] if before < len(kept) else None
+            if low is None and high is None:
+                run = [float(k) for k in range(count)]
+            elif low is None:
+                run = [high - count + k for k in range(count)]
+            elif high is None:
+                run = [low + 1 + k for k in range(count)]
+            else:
+                step = (high - low) / (count + 1)
+                run = [low + step * (k + 1) for k in range(count)]
+                if step < 1e-9 or len(set(run)) < count or run[0] <= low or run[-1] >= high:
+                    return None
+            result.extend(run)
+            i = j + 1
+        return result
+
+    def add_recent(self, track: str) -> None:
+        """Move a track to the top of the recents, keeping the last RECENTS_LIMIT"""
+        with self.transaction():
+            self.conn.execute("INSERT OR REPLACE INTO recents VALUES (?, ?)", (track, time.time()))
+            self.conn.execute(
+                "DELETE FROM recents WHERE played < (SELECT played FROM recents ORDER BY played DESC LIMIT 1 OFFSET ?)",
+                (RECENTS_LIMIT - 1,),
+            )
+
+    def recents(self) -> list[str]:
+        """The recent tracks, most recent first"""
+        with self.lock:
+            return [row["track"] for row in self.conn.execute("SELECT track FROM recents ORDER BY played DESC")]
+
+    @staticmethod
+    def buckets(timestamp: float) -> list[tuple[str, str]]:
+        """The (granularity, bucket) rollups a play started at `timestamp` counts towards, in local time"""
+        moment = time.localtime(timestamp)
+        return [
+            ("day", time.strftime("%Y-%m-%d", moment)),
+            ("month", time.strftime("%Y-%m", moment)),
+            ("year", time.strftime("%Y", moment)),
+            ("all", ""),
+        ]
+
+    def record_plays(self, plays: list[dict]) -> None:
+        """
+        Append a batch of plays to the log and add them to the rollups, in one transaction.
+
+        Each play is a dict with "track", "source" ("local" or "stream"), "started_at",
+        "listened" (seconds), "skipped" and optionally the spotify "track_id".
+        """
+        totals = {}
+        for play in plays:
+            for granularity, bucket in self.buckets(play["started_at"]):
+                total = totals.setdefault((granularity, bucket, play["track"]), [0, 0.0, 0])
+                total[0] += 1
+                total[1] += play["listened"]
+                total[2] += bool(play["skipped"])
+        with self.transaction():
+            self.conn.executemany(
+                "INSERT INTO plays (track, track_id, source, started_at, listened, skipped) VALUES (?, ?, ?, ?, ?, ?)",
+                [(play["track"], play.get("track_id"), play["source"], play["started_at"], play["listened"],
+                  int(bool(play["skipped"]))) for play in plays],
+            )
+            self.conn.executemany(
+                "INSERT INTO rollups VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (granularity, bucket, track) DO UPDATE SET "
+                "plays = plays + excluded.plays, listened = listened + excluded.listened, skips = skips + excluded.skips",
+                [(*key, *total) for key, total in totals.items()],
+            )
+
+    def _period(self, period: str, now: Optional[float]) -> tuple[str, list[str]]:
+        """The rollup granularity and buckets covering a stats period"""
+        if period not in STATS_PERIODS:
+            raise ValueError(f"Unknown period {period!r}, expected one of {', '.join(STATS_PERIODS)}")
+        now = time.time() if now is None else now
+        if period == "week":
+            return "day", [self.buckets(now - day * 86400)[0][1] for day in range(7)]
+        granularity = {"today": "day", "month": "month", "year": "year", "all": "all"}[period]
+        return granularity, [dict(self.buckets(now))[granularity]]
+
+    def top_tracks(self, period: str = "month", limit: int = 10, now: Optional[float] = None) -> list[dict]:
+        """
+        The most played tracks of a period, from the rollups.
+
+        Args:
+        - period (str): One of STATS_PERIODS.
+        - limit (int): Number of tracks to return.
+
+        Returns:
+        - list: Dicts with "track", "plays", "listened" (seconds) and "skips", most played first.
+        """
+        granularity, buckets = self._period(period, now)
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT track, SUM(plays) AS plays, SUM(listened) AS listened, SUM(skips) AS skips FROM rollups "
+                f"WHERE granularity = ? AND bucket IN ({', '.join('?' * len(buckets))}) "
+                f"GROUP BY track ORDER BY plays DESC, listened DESC, track LIMIT ?",
+                (granularity, *buckets, limit),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def listening_totals(self, period: str = "month", now: Optional[float] = None) -> dict:
+        """Total "plays", "listened" seconds, "skips" and distinct "tracks" of a period"""
+        granularity, buckets = self._period(period, now)
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT COALESCE(SUM(plays), 0) AS plays, COALESCE(SUM(listened), 0) AS listened, "
+                f"COALESCE(SUM(skips), 0) AS skips, COUNT(DISTINCT track) AS tracks FROM rollups "
+                f"WHERE granularity = ? AND bucket IN ({', '.join('?' * len(buckets))})",
+                (granularity, *buckets),
+            ).fetchone()
+        return dict(row)
+
+    def compact_history(self, keep_days: int = HISTORY_RETENTION_DAYS, now: Optional[float] = None) -> int:
+        """
+        Drop the raw plays and daily rollups older than `keep_days`; monthly, yearly and
+        all-time rollups are kept, so stats beyond the retention stay available.
+
+        Returns:
+        - int: Number of plays removed.
+        """
+        cutoff = (time.time() if now is None else now) - keep_days * 86400
+        with self.transaction():
+            removed = self.conn.execute("DELETE FROM plays WHERE started_at < ?", (cutoff,)).rowcount
+            self.conn.execute(
+                "DELETE FROM rollups WHERE granularity = 'day' AND bucket < ?", (self.buckets(cutoff)[0][1],)
+            )
+        return removed
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
@@ -1,19 +1,287 @@
-from yt_dlp import YoutubeDL
 import os
+import json
 import base64
-from dotenv import load_dotenv, find_dotenv
+import asyncio
 from time import time
-import httpx
 from pathlib import Path
+from typing import Callable, Optional
+from urllib.parse import urlparse
+import httpx
+from dotenv import load_dotenv, find_dotenv
 from ethos.tools.helper import Format
-import json
+from ethos.tools.offline_sync import OfflineSync, SyncReport, SyncedTrack
+from ethos.config import get_search_cache_ttl, get_resolver_workers, get_audio_cache_settings
+from ethos.cache import StreamCache, SearchCache
+from ethos.metadata import MetadataStore
+from ethos.userstore import UserStore, STATS_PERIODS
+from ethos.history import PlayLog
+from ethos.scheduler import RequestScheduler, RateLimited, Priority, priority
+from ethos.resolver import ResolverPool, YoutubeDLExtractor
+from ethos.audio_cache import AudioCache, AudioProxy
 
 load_dotenv(dotenv_path=find_dotenv(filename=".env"))
 
+SPOTIFY_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID") or "e904c35efb014b76bd8999a211e9b1e1"
+SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET") or "af18ccf7adae4ea7b37ca635c4225928"
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+HTTP_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60)
+HTTP_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+
+# Maximum number of ids Spotify accepts per multi-id request, by endpoint
+SPOTIFY_BATCH_LIMITS = {"tracks": 50, "artists": 50}
+HYDRATE_CONCURRENCY = 4
+
+
+class SpotifyToken:
+    """
+    Manages the Spotify client-credentials token.
+
+    The token is cached in memory and persisted to `~/.ethos/spotify_token.json` so
+    it survives restarts. Once a token is obtained, a background task refreshes it
+    `refresh_margin` seconds before it expires, so searches never wait on
+    accounts.spotify.com.
+    """
+    def __init__(self, token_file: Optional[Path] = None, refresh_margin: float = 300):
+        self.token_file = token_file or Path.home() / ".ethos" / "spotify_token.json"
+        self.refresh_margin = refresh_margin
+        self.access_token: Optional[str] = None
+        self.expires_at = 0.0
+        self.loaded = False
+        self.lock: Optional[asyncio.Lock] = None
+        self.refresh_task: Optional[asyncio.Task] = None
+
+    def is_valid(self) -> bool:
+        return bool(self.access_token) and self.expires_at - self.refresh_margin > time()
+
+    async def get(self) -> str:
+        """Return a valid access token, requesting a new one only if the cached one is about to expire"""
+        if not self.loaded:
+            self.load()
+            if self.is_valid():
+                self.schedule_refresh()
+        if self.is_valid():
+            return self.access_token
+
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            if not self.is_valid():
+                await self.refresh()
+        return self.access_token
+
+    async def renew(self, rejected: str) -> str:
+        """Replace a token the API rejected, unless a concurrent request already did"""
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            if self.access_token == rejected or not self.is_valid():
+                await self.refresh()
+        return self.access_token
+
+    def invalidate(self) -> None:
+        """Drop the cached token so the next request fetches a new one"""
+        self.access_token = None
+        self.expires_at = 0.0
+        self.close()
+
+    async def refresh(self) -> str:
+        """Request a new access token, persist it and schedule its refresh"""
+        response_data = await Search.request_spotify_token()
+        self.access_token = response_data["access_token"]
+        self.expires_at = time() + response_data.get("expires_in", 3600)
+        self.save()
+        self.schedule_refresh()
+        return self.access_token
+
+    def schedule_refresh(self) -> None:
+        """Refresh the token in the background shortly before it expires"""
+        current = asyncio.current_task()
+        if self.refresh_task and self.refresh_task is not current:
+            self.refresh_task.cancel()
+        self.refresh_task = asyncio.create_task(self._refresh_later(self.expires_at - self.refresh_margin - time()))
+
+    async def _refresh_later(self, delay: float) -> None:
+        await asyncio.sleep(max(delay, 0))
+        try:
+            await self.refresh()
+        except Exception as e:
+            print(f"Error refreshing spotify token: {e}")
+
+    def load(self) -> None:
+        """Load the persisted token, if any"""
+        self.loaded = True
+        try:
+            with open(self.token_file, "r") as file:
+                data = json.load(file)
+            self.access_token = data["access_token"]
+            self.expires_at = float(data["expires_at"])
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def save(self) -> None:
+        """Persist the token, readable only by the current user"""
+        try:
+            self.token_file.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(self.token_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as file:
+                json.dump({"access_token": self.access_token, "expires_at": self.expires_at}, file)
+        except OSError as e:
+            print(f"Error saving spotify token: {e}")
+
+    def close(self) -> None:
+        """Stop the background refresh"""
+        if self.refresh_task:
+            self.refresh_task.cancel()
+            self.refresh_task = None
+
+
 class Search:
     """Utility class for searching track metadata and url from external APIs"""
 
 
+    stream_cache: Optional[StreamCache] = None
+    search_cache: Optional[SearchCache] = None
+    metadata_store: Optional[MetadataStore] = None
+    scheduler: Optional[RequestScheduler] = None
+    resolver_pool: Optional[ResolverPool] = None
+    audio_proxy: Optional[AudioProxy] = None
+    revalidations: dict[str, asyncio.Task] = {}
+    spotify_token = SpotifyToken()
+    http_client: Optional[httpx.AsyncClient] = None
+    http_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @staticmethod
+    def get_http_client() -> httpx.AsyncClient:
+        """
+        Returns the application-wide HTTP client, creating it on first use.
+
+        The client keeps connections alive between requests and speaks HTTP/2 when
+        the `h2` package is installed. Connections belong to the event loop they were
+        opened on, so a new client is created if the running loop changes.
+        """
+        loop = asyncio.get_running_loop()
+        if Search.http_client is None or Search.http_client.is_closed or Search.http_client_loop is not loop:
+            Search.http_client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                limits=HTTP_LIMITS,
+                timeout=HTTP_TIMEOUT,
+            )
+            Search.http_client_loop = loop
+        return Search.http_client
+
+    @staticmethod
+    async def close_http_client() -> None:
+        """Closes the shared HTTP client and its pooled connections"""
+        Search.spotify_token.close()
+        if Search.http_client is not None:
+            await Search.http_client.aclose()
+            Search.http_client = None
+            Search.http_client_loop = None
+
+    @staticmethod
+    def get_stream_cache() -> StreamCache:
+        """Returns the resolved-stream cache, opening it on first use"""
+        if Search.stream_cache is None:
+            Search.stream_cache = StreamCache()
+        return Search.stream_cache
+
+    @staticmethod
+    def get_audio_proxy() -> AudioProxy:
+        """Returns the local caching proxy for streamed audio, opening its cache on first use"""
+        if Search.audio_proxy is None:
+            max_bytes, policy = get_audio_cache_settings()
+            Search.audio_proxy = AudioProxy(AudioCache(max_bytes=max_bytes, policy=policy))
+        return Search.audio_proxy
+
+    @staticmethod
+    def close_audio_proxy() -> None:
+        """Stops the local caching proxy"""
+        if Search.audio_proxy is not None:
+            Search.audio_proxy.stop()
+            Search.audio_proxy.cache.close()
+            Search.audio_proxy = None
+
+    @staticmethod
+    def get_resolver_pool() -> ResolverPool:
+        """Returns the pool of yt-dlp worker processes, creating it on first use"""
+        if Search.resolver_pool is None:
+            Search.resolver_pool = ResolverPool(workers=get_resolver_workers())
+        return Search.resolver_pool
+
+    @staticmethod
+    def close_resolver_pool() -> None:
+        """Stops the yt-dlp worker processes"""
+        if Search.resolver_pool is not None:
+            Search.resolver_pool.close()
+            Search.resolver_pool = None
+
+    @staticmethod
+    def get_scheduler() -> RequestScheduler:
+        """Returns the scheduler all outbound Spotify and YouTube requests go through"""
+        if Search.scheduler is None:
+            Search.scheduler = RequestScheduler()
+        return Search.scheduler
+
+    @staticmethod
+    def get_metadata_store() -> MetadataStore:
+        """Returns the local track and artist metadata store, opening it on first use"""
+        if Search.metadata_store is None:
+            Search.metadata_store = MetadataStore()
+        return Search.metadata_store
+
+    @staticmethod
+    def get_search_cache() -> SearchCache:
+        """Returns the search results cache, opening it on first use"""
+        if Search.search_cache is None:
+            Search.search_cache = SearchCache(ttl=get_search_cache_ttl())
+        return Search.search_cache
+
+    @staticmethod
+    def extract_audio_info(target: str) -> dict:
+        """
+        Runs YoutubeDL on a search query or video URL and returns the info of the top result.
+
+        The extraction runs in a warm worker of the resolver pool, or in this process
+        when the pool is disabled with `RESOLVER_WORKERS=0`.
+
+        :param target: A search query or a YouTube video URL.
+        :type target: str
+
+        :return: The `id`, `url`, `title` and `duration` of the best audio stream.
+        :rtype: dict
+        """
+        pool = Search.get_resolver_pool()
+        if pool.workers_count:
+            return pool.resolve(target)
+        return YoutubeDLExtractor().extract(target)
+
+    @staticmethod
+    def schedule_extraction(target: str) -> dict:
+        """
+        Runs `extract_audio_info` through the request scheduler, retrying when YouTube throttles it.
+
+        :param target: A search query or a YouTube video URL.
+        :type target: str
+
+        :return: The yt-dlp info dict of the best audio stream.
+        :rtype: dict
+        """
+        def extract():
+            try:
+                return Search.extract_audio_info(target)
+            except Exception as e:
+                if "HTTP Error 429" in str(e):
+                    raise RateLimited() from e
+                raise
+
+        return Search.get_scheduler().call("www.youtube.com", extract)
+
     @staticmethod
     def get_audio_url(query):
         """
@@ -23,6 +291,10 @@ class Search:
         result is fetched. It does not download the file, only extracts the URL for
         the audio stream.
 
+        Resolved streams are cached on disk by query. A cached stream URL is reused
+        until the expiry embedded in it, after which only the stream URL is resolved
+        again from the cached video id, skipping the search.
+
         :param query: A string representing the search query used to find the audio
             content on YouTube. It can include keywords or phrases to search for.
         :type query: str
@@ -31,29 +303,101 @@ class Search:
             search query.
         :rtype: str
         """
-        ydl_opts = {
-            'format': 'bestaudio/best',
-            'noplaylist': True,
-            'quiet': True,
-            'default_search': 'ytsearch1',
-        }
+        return Search.resolve_stream(query)[1]
+
+    @staticmethod
+    def resolve_stream(query: str) -> tuple[Optional[str], str]:
+        """
+        Resolves a search query to its YouTube video id and stream URL, through the stream cache.
+
+        :return: (video id, stream URL). The video id is None if yt-dlp did not report one.
+        :rtype: tuple
+        """
+        return Search._resolve_stream(query, Search.get_stream_cache().get(query))
+
+    @staticmethod
+    def _resolve_stream(query: str, cached: Optional[tuple]) -> tuple[Optional[str], str]:
+        cache = Search.get_stream_cache()
+        if cached and cached[1]:
+            return cached
+
+        if cached:
+            result = Search.schedule_extraction(f"https://www.youtube.com/watch?v={cached[0]}")
+        else:
+            result = Search.schedule_extraction(query)
+        if result.get('id'):
+            cache.put(query, result['id'], result['url'])
+        return result.get('id'), result['url']
+
+    @staticmethod
+    def stream_query(track_name: str) -> str:
+        """Returns the YouTube search query used to stream a "<Song name> by <Artist Name>" track"""
+        return track_name + " official music video"
+
+    @staticmethod
+    async def sync_tracks(track_names: list[str], progress: Optional[Callable[[SyncedTrack], None]] = None) -> SyncReport:
+        """
+        Downloads tracks into the audio cache for offline playback.
 
-        with YoutubeDL(ydl_opts) as ydl:
-            result = ydl.extract_info(query, download=False)
-            if 'entries' in result:
-                result = result['entries'][0]
-            return result['url']
+        Tracks already cached, e.g. by another playlist, are skipped, so running it
+        again after an interruption only fetches what is missing.
 
+        Args: track_names(list of "<Song name> by <Artist Name>"), progress(called with each finished track)
+
+        return: SyncReport with per-track and aggregate throughput
+        """
+        proxy = Search.get_audio_proxy()
 
+        def lookup(track_name):
+            cached = Search.get_stream_cache().get(Search.stream_query(track_name))
+            return cached[0] if cached else None
+
+        sync = OfflineSync(
+            proxy.cache,
+            resolve=lambda track_name: Search.resolve_stream(Search.stream_query(track_name)),
+            lookup=lookup,
+            progress=progress,
+            busy=proxy.active_keys,
+        )
+        return await sync.run(track_names)
 
     @staticmethod
-    async def get_spotify_token(client_id="e904c35efb014b76bd8999a211e9b1e1", client_secret="af18ccf7adae4ea7b37ca635c4225928"):
+    def get_audio_source(query: str) -> str:
+        """
+        Returns what the player should open for a search query, through the audio cache.
+
+        A track whose audio is fully cached plays from disk without resolving its
+        stream again. Otherwise the stream is played through the local caching proxy,
+        which stores it for the next replay.
+
+        :param query: The search query used to find the track on YouTube.
+        :type query: str
+
+        :return: A file path or a 127.0.0.1 URL.
+        :rtype: str
         """
-        Fetches authorization token from spotify
+        proxy = Search.get_audio_proxy()
+        cached = Search.get_stream_cache().get(query)
+        if cached:
+            path = proxy.cache.lookup(cached[0])
+            if path:
+                return str(path)
+
+        video_id, url = Search._resolve_stream(query, cached)
+        if not video_id:
+            return url
+        return proxy.source(video_id, url)
+
+
+
+    @staticmethod
+    async def request_spotify_token(client_id=SPOTIFY_CLIENT_ID, client_secret=SPOTIFY_CLIENT_SECRET) -> dict:
+        """
+        Requests a new client-credentials token from spotify
         
         Args: client_id(str), client_secret(str)
         
-        return: spotify authorization token
+        return: token response with `access_token` and `expires_in` (seconds)
         """
 
         url = "https://accounts.spotify.com/api/token"
@@ -62,44 +406,128 @@ class Search:
         }
         data = {"grant_type": "client_credentials"}
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, headers=headers, data=data)
-            response_data = response.json()
+        client = Search.get_http_client()
+        response = await Search.get_scheduler().run(
+            "accounts.spotify.com", lambda: client.post(url, headers=headers, data=data)
+        )
+        response_data = response.json()
 
         if response.status_code != 200:
             raise Exception(f"Failed to get token: {response_data}")
         
-        return response_data["access_token"]
+        return response_data
+
+
+    @staticmethod
+    async def get_spotify_token() -> str:
+        """
+        Returns the cached spotify authorization token, requesting a new one only when needed
+
+        return: spotify authorization token
+        """
+        return await Search.spotify_token.get()
 
 
     @staticmethod
-    async def search_tracks_from_spotify(track_name, token):
+    async def spotify_get(url: str, token: Optional[str] = None, params: Optional[dict] = None) -> httpx.Response:
+        """
+        Sends an authorized GET request to the Spotify API.
+
+        Uses the cached token unless one is given, and on a 401 refreshes the token
+        and retries once. Requests go through the request scheduler, which rate limits
+        them and retries them when Spotify answers 429.
+
+        Args: url(str), token(str), params(dict)
+
+        return: httpx.Response
+        """
+        token = token or await Search.get_spotify_token()
+        client = Search.get_http_client()
+        scheduler = Search.get_scheduler()
+        host = urlparse(url).hostname
+        response = await scheduler.run(host, lambda: client.get(url, headers={"Authorization": f"Bearer {token}"}, params=params))
+        if response.status_code == 401:
+            token = await Search.spotify_token.renew(token)
+            response = await scheduler.run(host, lambda: client.get(url, headers={"Authorization": f"Bearer {token}"}, params=params))
+        return response
+
+
+    @staticmethod
+    async def search_tracks_from_spotify(track_name, token=None):
         """
         Searches for a track in spotify and returns first 10 entries of search results
+
+        Results are served from the search cache when possible. Stale results are
+        returned right away and refreshed in the background.
         
         Args: track_name(str), token(str)
         
+        return: tracks(list)
+        """
+        cache = Search.get_search_cache()
+        cached = cache.get("track", track_name)
+        if cached:
+            tracks, stale = cached
+            if stale:
+                Search.revalidate("track", track_name, Search.request_tracks_from_spotify(track_name, token))
+            return tracks
+
+        tracks = await Search.request_tracks_from_spotify(track_name, token)
+        cache.put("track", track_name, tracks)
+        return tracks
+
+
+    @staticmethod
+    def revalidate(kind: str, query: str, request) -> None:
+        """
+        Refreshes a stale search cache entry in the background.
+
+        Args: kind(str), query(str), request(coroutine returning the fresh results)
+        """
+        key = SearchCache.key(kind, query)
+        if key in Search.revalidations:
+            request.close()
+            return
+
+        async def refresh():
+            try:
+                with priority(Priority.BACKGROUND):
+                    results = await request
+                Search.get_search_cache().put(kind, query, results)
+            except Exception as e:
+                print(f"Error refreshing search results: {e}")
+            finally:
+                Search.revalidations.pop(key, None)
+
+        Search.revalidations[key] = asyncio.create_task(refresh())
+
+
+    @staticmethod
+    async def request_tracks_from_spotify(track_name, token=None):
+        """
+        Requests the first 10 search results for a track from spotify, bypassing the cache
+
+        Args: track_name(str), token(str)
+
         return: tracks(list)
         """
 
         url = "https://api.spotify.com/v1/search"
-        headers = {
-            "Authorization": f"Bearer {token}"
-        }
         params = {
             "q": track_name,
             "type": "track",
             "limit": 10  
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=headers, params=params)
-            response_data = response.json()
+        response = await Search.spotify_get(url, token, params)
+        response_data = response.json()
 
         if response.status_code != 200:
             raise Exception(f"Failed to fetch tracks: {response_data}")
         
-        return response_data["tracks"]["items"]
+        tracks = response_data["tracks"]["items"]
+        Search.get_metadata_store().put_tracks(tracks)
+        return tracks
 
 
     @staticmethod
@@ -116,8 +544,7 @@ class Search:
         try:
             
             start_time = time()
-            token = await Search.get_spotify_token()
-            tracks = await Search.search_tracks_from_spotify(track_name, token)
+            tracks = await Search.search_tracks_from_spotify(track_name)
             if tracks:
                 print(f"\nTracks found for '{track_name}':")
                 for idx, track in enumerate(tracks, start=1):
@@ -137,13 +564,11 @@ class Search:
         
 
     @staticmethod
-    async def search_artist_id_from_spotify(artist_name, token):
+    async def search_artist_id_from_spotify(artist_name, token=None):
         """Search for an artist on Spotify and return their ID."""
         url = f"https://api.spotify.com/v1/search?q={artist_name}&type=artist&limit=1"
-        headers = {"Authorization": f"Bearer {token}"}
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=headers)
+        response = await Search.spotify_get(url, token)
         if response.status_code == 200:
             data = response.json()
             if data["artists"]["items"]:
@@ -155,122 +580,248 @@ class Search:
 
         
     @staticmethod
-    async def search_song_id_from_spotify(song_name, token):
+    async def search_song_id_from_spotify(song_name, token=None):
         """Search for a song on Spotify."""
         url = f"https://api.spotify.com/v1/search?q={song_name}&type=track&limit=1"
-        headers = {"Authorization": f"Bearer {token}"}
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=headers)
-            if response.status_code == 200:
-                data = response.json()
-                if data["tracks"]["items"]:
-                    return data["tracks"]["items"][0]["id"]
-                else:
-                    raise Exception("No song found!")
+        response = await Search.spotify_get(url, token)
+        if response.status_code == 200:
+            data = response.json()
+            if data["tracks"]["items"]:
+                return data["tracks"]["items"][0]["id"]
             else:
-                raise Exception(f"Failed to search song: {response.json()}")
+                raise Exception("No song found!")
+        else:
+            raise Exception(f"Failed to search song: {response.json()}")
 
 
     @staticmethod
-    async def fetch_top_tracks(artist_id, token, market="US"):
+    async def fetch_top_tracks(artist_id, token=None, market="US"):
         """Fetch top tracks of an artist."""
         url = f"https://api.spotify.com/v1/artists/{artist_id}/top-tracks?market={market}"
-        headers = {"Authorization": f"Bearer {token}"}
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=headers)
-            if response.status_code == 200:
-                data = response.json()
-                tracks = []
-                for track in data["tracks"]:
-                    tracks.append({
-                        "name": track["name"],
-                        "artist": track["artists"][0]["name"]
-                    })
-                print(tracks)
-                return tracks
-            else:
-                raise Exception(f"Failed to fetch top tracks: {response.json()}")
+        response = await Search.spotify_get(url, token)
+        if response.status_code == 200:
+            data = response.json()
+            tracks = []
+            for track in data["tracks"]:
+                tracks.append({
+                    "name": track["name"],
+                    "artist": track["artists"][0]["name"]
+                })
+            print(tracks)
+            return tracks
+        else:
+            raise Exception(f"Failed to fetch top tracks: {response.json()}")
             
 
     @staticmethod
-    async def get_track_image(song_id, token):
-        """Fetch the track's album image URL using the Spotify API."""
-        url = f"https://api.spotify.com/v1/tracks/{song_id}"
-        headers = {
-            "Authorization": f"Bearer {token}"
-        }
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=headers)
-            response_data = response.json()
-            
-            if response.status_code == 200:
-                album_images = response_data["album"]["images"]
-                if album_images:
-                    # Return the highest resolution image (usually the first one)
-                    return album_images[0]["url"]
-                else:
-                    return "No album images found."
-            else:
-                raise Exception(f"Failed to get track data: {response_data}")
+    async def get_track_image(song_id, token=None):
+        """Fetch the track's album image URL, from the metadata store if it was hydrated before."""
+        track = (await Search.hydrate_tracks([song_id], token)).get(song_id)
+        if track is None:
+            raise Exception(f"Failed to get track data for {song_id}")
+        # The highest resolution image (usually the first one) is stored
+        return track["image"] or "No album images found."
+
+
+    @staticmethod
+    async def fetch_several(kind: str, ids: list[str], token=None, concurrency: int = HYDRATE_CONCURRENCY) -> list[dict]:
+        """
+        Fetches many spotify objects with the multi-id endpoint of `kind` ("tracks" or "artists").
+
+        Ids are grouped into the largest batches the endpoint accepts, and at most
+        `concurrency` batches are requested at a time.
+
+        Args: kind(str), ids(list), token(str), concurrency(int)
+
+        return: list of the spotify objects that were found
+        """
+        size = SPOTIFY_BATCH_LIMITS[kind]
+        batches = [ids[start:start + size] for start in range(0, len(ids), size)]
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(batch):
+            async with semaphore:
+                response = await Search.spotify_get(f"https://api.spotify.com/v1/{kind}", token, {"ids": ",".join(batch)})
+            if response.status_code != 200:
+                raise Exception(f"Failed to fetch {kind}: {response.json()}")
+            return [item for item in response.json()[kind] if item]
+
+        results = await asyncio.gather(*(fetch(batch) for batch in batches))
+        return [item for batch in results for item in batch]
+
+
+    @staticmethod
+    async def hydrate_tracks(ids: list[str], token=None, refresh: bool = False) -> dict[str, dict]:
+        """
+        Makes sure the metadata of the given tracks is in the metadata store.
+
+        Only tracks that are not stored yet are requested, unless `refresh` is set.
+
+        Args: ids(list), token(str), refresh(bool)
+
+        return: stored metadata keyed by track id
+        """
+        store = Search.get_metadata_store()
+        missing = list(dict.fromkeys(ids)) if refresh else store.missing("tracks", ids)
+        if missing:
+            store.put_tracks(await Search.fetch_several("tracks", missing, token))
+        return store.get_tracks(ids)
+
+
+    @staticmethod
+    async def hydrate_artists(ids: list[str], token=None, refresh: bool = False) -> dict[str, dict]:
+        """
+        Makes sure the metadata of the given artists is in the metadata store.
+
+        Args: ids(list), token(str), refresh(bool)
+
+        return: stored metadata keyed by artist id
+        """
+        store = Search.get_metadata_store()
+        missing = list(dict.fromkeys(ids)) if refresh else store.missing("artists", ids)
+        if missing:
+            store.put_artists(await Search.fetch_several("artists", missing, token))
+        return store.get_artists(ids)
+
+
+    @staticmethod
+    async def hydrate_playlist(entries: list[dict], token=None, concurrency: int = HYDRATE_CONCURRENCY) -> list[Optional[dict]]:
+        """
+        Looks up the metadata of every entry of a playlist.
+
+        Entries with a spotify id are hydrated in batches. Entries saved with only a
+        name and artist are searched for once, at most `concurrency` at a time, and
+        the first result is stored.
+
+        Args: entries(list of {"name", "artist", optional "id"}), token(str), concurrency(int)
+
+        return: metadata of each entry, None where none was found
+        """
+        store = Search.get_metadata_store()
+        by_id = await Search.hydrate_tracks([entry["id"] for entry in entries if entry.get("id")], token)
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def lookup(entry):
+            if entry.get("id"):
+                return by_id.get(entry["id"])
+            track = store.find_track(entry["name"], entry["artist"])
+            if track:
+                return track
+            async with semaphore:
+                try:
+                    results = await Search.search_tracks_from_spotify(f"{entry['name']} {entry['artist']}", token)
+                except Exception as e:
+                    print(f"Error: {e}")
+                    return None
+            if results:
+                store.put_tracks(results[:1])
+                return store.get_tracks([results[0]["id"]]).get(results[0]["id"])
+            return None
+
+        return await asyncio.gather(*(lookup(entry) for entry in entries))
     
 
 class UserFiles:
     """Utility class for performing operations related to userfiles like recents and playlists"""
 
+    store: Optional[UserStore] = None
+    play_log: Optional[PlayLog] = None
+
+    @staticmethod
+    def get_store() -> UserStore:
+        """Returns the store of the user's playlists and recents, opening (and migrating) it on first use"""
+        if UserFiles.store is None:
+            UserFiles.store = UserStore()
+        return UserFiles.store
+
+    @staticmethod
+    def get_play_log() -> PlayLog:
+        """Returns the buffered log of play events, creating it on first use"""
+        if UserFiles.play_log is None:
+            UserFiles.play_log = PlayLog(UserFiles.get_store())
+        return UserFiles.play_log
+
+    @staticmethod
+    def close_play_log() -> None:
+        """Writes the pending play events and compacts the play history"""
+        if UserFiles.play_log is not None:
+            UserFiles.play_log.close()
+            UserFiles.play_log.store.compact_history()
+            UserFiles.play_log = None
+
+
     @staticmethod
     def fetch_recents() -> list[str]:
         """Fetches the recent tracks and returns it in a list"""
-
-        recents_file = Path.home() / ".ethos" / "userfiles" / "recents.txt"
-        recents = []
         try:
-            if os.path.exists(recents_file):
-                with open(recents_file, 'r') as file:
-                    for line in file:
-                        recents.append(line.strip())
+            return UserFiles.get_store().recents()
         except:
             return
-        return recents
 
 
     @staticmethod
     def add_track_to_recents(track: str):
-        """Writes a track to the recents file, keeping only the last 10 entries."""
-        recents_dir = Path.home() / ".ethos" / "userfiles"
-        recents_file = recents_dir / "recents.txt"
-        
-        recents_dir.mkdir(parents=True, exist_ok=True)
+        """Records a play of a track, keeping only the last 10 entries in the recents."""
+        try:
+            UserFiles.get_store().add_recent(track.strip())
+        except Exception as e:
+            return f"Error writing to recents: {e}"
 
-        lines = []
-        if recents_file.exists():
-            try:
-                with open(recents_file, "r") as file:
-                    lines = file.readlines()
-            except Exception as e:
-                return f"Error reading recents file: {e}"
 
-        track = track.strip()
-        removed_track = track+"\n"
-        if track+"\n" in lines:
-            lines.remove(removed_track)
-        lines.insert(0, track + "\n")
+    @staticmethod
+    def listening_stats(period: str = "month", limit: int = 10) -> list[str]:
+        """
+        Function to summarise the listening history of a period from the play history rollups.
 
-        lines = lines[:10]
+        Args:
+        - period (str): One of "today", "week", "month", "year" or "all"
+        - limit (int): Number of top tracks to list
 
-        try:
-            with open(recents_file, "w") as file:
-                file.writelines(lines)
-        except Exception as e:
-            return f"Error writing to recents file: {e}"
+        Returns:
+        - list: Lines with the totals followed by the most played tracks
+        """
+        if period not in STATS_PERIODS:
+            raise ValueError(f"Period must be one of {', '.join(STATS_PERIODS)}")
+        store = UserFiles.get_store()
+        totals = store.listening_totals(period)
+        if not totals["plays"]:
+            return ["No plays recorded yet."]
+
+        def hours(seconds: float) -> str:
+            minutes = int(seconds) // 60
+            return f"{minutes // 60}h {minutes % 60:02}m"
+
+        lines = [
+            f"{totals['plays']} plays of {totals['tracks']} tracks, {hours(totals['listened'])} listened, {totals['skips']} skipped",
+            "",
+        ]
+        for i, track in enumerate(store.top_tracks(period, limit)):
+            lines.append(f"{i+1}. {track['track']}  {track['plays']} plays, {hours(track['listened'])}")
+        return lines
+
+
+    @staticmethod
+    def fetch_playlist_entries(playlist_name: str) -> list[dict]:
+        """
+        Function to fetch the raw entries of a playlist.
+
+        Args:
+        - playlist_name (str): name of a playlist
+
+        Returns:
+        - list: Entries with "name", "artist" and, when known, the spotify "id",
+                "isrc" and "duration_ms"
+        """
+        return UserFiles.get_store().load(playlist_name)
 
 
     @staticmethod
     def fetch_tracks_from_playlist(playlist_name: str) -> list[str]:
             """
-            Function to fetch all songs from a playlist.json file.
+            Function to fetch all songs from a playlist.
 
             Args:
             - playlist_name (str): name of a playlist
@@ -278,22 +829,31 @@ class UserFiles:
             Returns:
             - list: List of all songs in a particular playlist
             """
-            playlist_file = Path.home() / ".ethos" / "userfiles" / "playlists" / f"{playlist_name}.json"
             tracks = []
             try:
-                if os.path.exists(playlist_file):
-                    with open(playlist_file, 'r') as playlist:
-                        tracks_json = json.load(playlist)
-                        for track in tracks_json:
-                            name = track["name"]
-                            artist = track["artist"]
-                            tracks.append(f"{name} by {artist}")
+                for track in UserFiles.fetch_playlist_entries(playlist_name):
+                    name = track["name"]
+                    artist = track["artist"]
+                    tracks.append(f"{name} by {artist}")
             except:
                 pass
                 return 
             return tracks
 
 
+    @staticmethod
+    def playlist_entry(track_name: str) -> dict:
+        """Create the playlist entry of a "<song> by <artist>" track, with its spotify id when known"""
+        track, artist = Format.extract_song_and_artist(track_name)
+        entry = {"name": track, "artist": artist}
+        metadata = Search.get_metadata_store().find_track(track, artist)
+        if metadata:
+            entry["id"] = metadata["id"]
+            if metadata["duration_ms"]:
+                entry["duration_ms"] = metadata["duration_ms"]
+        return entry
+
+
     @staticmethod
     def add_track_to_playlist(playlist_name: str, track_name: str) -> None:
         """
@@ -302,41 +862,37 @@ class UserFiles:
         Args:
         - playlist_name (str): name of a playlist
         """
-        playlist_dir = Path.home() / ".ethos" / "userfiles" / "playlists"
-        playlist_file = playlist_dir / f"{playlist_name}.json"
-
-        playlist_dir.mkdir(parents=True, exist_ok=True)
-        tracks = []
-        track, artist = Format.extract_song_and_artist(track_name)
-        tracks.append({"name": track, "artist": artist})
         try:
-            if os.path.exists(playlist_file):
-                with open(playlist_file, 'r') as playlist:
-                    tracks_json = json.load(playlist)
-                    for track in tracks_json:
-                        tracks.append(track)
-
-            with open(playlist_file, 'w') as file:
-                json.dump(tracks, file, indent=4)
+            UserFiles.get_store().add(playlist_name, UserFiles.playlist_entry(track_name))
         except:
             pass
 
 
+    @staticmethod
+    def remove_track_from_playlist(playlist_name: str, track_name: str) -> bool:
+        """
+        Function to remove the first occurrence of a track from a playlist
+
+        Args:
+        - playlist_name (str): name of a playlist
+        - track_name (str): track as "<song> by <artist>"
+
+        Returns:
+        - bool: False if the playlist did not contain the track
+        """
+        try:
+            return UserFiles.get_store().remove(playlist_name, UserFiles.playlist_entry(track_name))
+        except:
+            return False
+
+
     @staticmethod
     def fetch_playlists() -> list[str]:
         """
-        Function to fetch all playlists from playlist path
+        Function to fetch the names of all playlists
         """
         try:
-            playlists = []
-            playlist_dir = Path.home() / ".ethos" / "userfiles" / "playlists"
-            files = os.listdir(playlist_dir)
-            for f in files:
-                playlist = os.path.basename(playlist_dir / f).split('.')[0]
-                if playlist:
-                    playlists.append(playlist)
-
-            return playlists
+            return UserFiles.get_store().names()
         except:
             pass
             return
\ No newline at end of file
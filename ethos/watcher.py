@@ -0,0 +1,208 @@
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+from pathlib import Path
+from typing import Optional
+from ethos.library import LibraryIndex
+
+
+class Inotify:
+    """
+    Minimal ctypes wrapper around Linux inotify for watching directories.
+
+    Raises OSError when inotify is not available on the platform.
+    """
+
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_ISDIR = 0x40000000
+
+    WATCH_MASK = (IN_CLOSE_WRITE | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+                  | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+    EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self):
+        if not sys.platform.startswith("linux"):
+            raise OSError(errno.ENOSYS, "inotify is only available on Linux")
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, path: str) -> int:
+        """Watch a directory and return its watch descriptor"""
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), self.WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+        return wd
+
+    def read_events(self, timeout: float) -> list[tuple[int, int, str]]:
+        """
+        Wait up to `timeout` seconds for events.
+
+        Returns:
+        - list: (watch descriptor, mask, name) of every event read.
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            buffer = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset + self.EVENT_HEADER.size <= len(buffer):
+            wd, mask, _cookie, length = self.EVENT_HEADER.unpack_from(buffer, offset)
+            offset += self.EVENT_HEADER.size
+            name = os.fsdecode(buffer[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class LibraryWatcher:
+    """
+    Keeps the library index in sync with the music folder while ethos is running.
+
+    Uses inotify where available and falls back to a periodic mtime-diff rescan
+    otherwise. File system events only mark directories dirty; bursts of events
+    (e.g. copying an album) are coalesced and applied in a single `LibraryIndex.refresh`.
+    """
+    def __init__(self, index: LibraryIndex, root: Path, interval: float = 60.0,
+                 debounce: float = 1.0, max_delay: float = 10.0, use_inotify: bool = True):
+        self.index = index
+        self.root = str(Path(root).resolve())
+        self.interval = interval
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.use_inotify = use_inotify
+        self.watches: dict[int, str] = {}
+        self.inotify: Optional[Inotify] = None
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start watching in a background thread"""
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self.run, name="ethos-library-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop watching and wait for the background thread to finish"""
+        self._stopped.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def run(self) -> None:
+        """Catch up with changes made while ethos was not running, then watch for new ones"""
+        if self.use_inotify:
+            try:
+                self.inotify = Inotify()
+                self._watch_tree(self.root)
+            except OSError as e:
+                print(f"inotify unavailable, polling the library instead: {e}")
+                self._close_inotify()
+
+        try:
+            self.index.scan(self.root, stop=self._stopped)
+        except Exception as e:
+            print(f"Error scanning library: {e}")
+
+        if self.inotify:
+            self._run_inotify()
+        else:
+            self._run_polling()
+
+    def _run_polling(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self.index.scan(self.root, stop=self._stopped)
+            except Exception as e:
+                print(f"Error scanning library: {e}")
+
+    def _run_inotify(self) -> None:
+        dirty = set()
+        first_event = last_event = 0.0
+        fallback = False
+        try:
+            while not self._stopped.is_set():
+                events = self.inotify.read_events(self.debounce if dirty else 0.5)
+                now = time.monotonic()
+                for wd, mask, name in events:
+                    directory = self.watches.get(wd)
+                    if mask & Inotify.IN_Q_OVERFLOW:
+                        dirty.add(self.root)
+                    if directory is None:
+                        continue
+                    if mask & Inotify.IN_IGNORED:
+                        del self.watches[wd]
+                        continue
+                    dirty.add(directory)
+                    if mask & Inotify.IN_ISDIR and mask & (Inotify.IN_CREATE | Inotify.IN_MOVED_TO):
+                        try:
+                            self._watch_tree(os.path.join(directory, name))
+                        except OSError as e:
+                            print(f"Out of inotify watches, polling the library instead: {e}")
+                            fallback = True
+                            break
+                if fallback:
+                    break
+                if events:
+                    first_event = first_event or now
+                    last_event = now
+
+                if dirty and (now - last_event >= self.debounce or now - first_event >= self.max_delay):
+                    self._apply(dirty)
+                    dirty = set()
+                    first_event = 0.0
+        finally:
+            self._close_inotify()
+
+        if fallback:
+            self._apply(dirty | {self.root})
+            self._run_polling()
+
+    def _apply(self, dirty: set) -> None:
+        """Write the changes of all dirty directories to the index in one batch"""
+        try:
+            self.index.refresh(dirty)
+        except Exception as e:
+            print(f"Error updating library index: {e}")
+
+    def _watch_tree(self, root: str) -> None:
+        """Add watches for a directory and all of its subdirectories"""
+        for directory, _, _ in os.walk(root):
+            try:
+                self.watches[self.inotify.add_watch(directory)] = directory
+            except OSError as e:
+                if e.errno == errno.ENOSPC:
+                    raise
+                continue
+
+    def _close_inotify(self) -> None:
+        if self.inotify:
+            self.inotify.close()
+            self.inotify = None
+        self.watches.clear()
@@ -1,33 +1,92 @@
 import pytest
 import vlc
+import time
 from pathlib import Path
-from ethos.player import MusicPlayer
+from ethos.player import MusicPlayer, TrackInfo
 
 # --- Dummy VLC Classes for Testing --- #
 
+class DummyEventUnion:
+    def __init__(self, **fields):
+        self.new_time = fields.get("new_time", 0)
+        self.new_cache = fields.get("new_cache", 0)
+
+class DummyEvent:
+    def __init__(self, event_type, **fields):
+        self.type = event_type
+        self.u = DummyEventUnion(**fields)
+
+class DummyEventManager:
+    def __init__(self):
+        self.callbacks = {}
+
+    def event_attach(self, event_type, callback, *args):
+        self.callbacks.setdefault(event_type, []).append((callback, args))
+
+    def event_detach(self, event_type):
+        self.callbacks.pop(event_type, None)
+
+    def fire(self, event_type, **fields):
+        for callback, args in list(self.callbacks.get(event_type, [])):
+            callback(DummyEvent(event_type, **fields), *args)
+
 class DummyMedia:
     def __init__(self, path):
         self.path = path
         self.duration = 10000  
+        self.meta = {vlc.Meta.Title: "Dummy Track", vlc.Meta.Artist: "Dummy Artist"}
+        self.parses = True
+        self.events = DummyEventManager()
 
     def get_duration(self):
         return self.duration
 
+    def event_manager(self):
+        return self.events
+
+    def parse_with_options(self, parse_flag, timeout):
+        if self.parses:
+            self.events.fire(vlc.EventType.MediaParsedChanged)
+
+    def add_option(self, option):
+        pass
+
+    def tracks_get(self):
+        return []
+
+    def get_meta(self, meta):
+        return self.meta.get(meta)
+
+class UnparsableMedia(DummyMedia):
+    def __init__(self, path):
+        super().__init__(path)
+        self.parses = False
+
 class DummyPlayer:
     def __init__(self):
         self.volume = 50
         self.time = 0
         self.media = None
+        self.paused = False
+        self.started_at = None
+        self.events = DummyEventManager()
+
+    def event_manager(self):
+        return self.events
 
     def set_media(self, media):
         self.media = media
 
     def play(self):
-        
-        pass
+        self.started_at = time.perf_counter()
 
     def pause(self):
-        pass
+        self.paused = True
+
+    def set_pause(self, pause):
+        self.paused = bool(pause)
+        if not pause:
+            self.started_at = time.perf_counter()
 
     def stop(self):
         self.media = None
@@ -44,6 +103,9 @@ class DummyPlayer:
     def get_time(self):
         return self.time
 
+    def get_length(self):
+        return self.media.get_duration() if self.media else -1
+
     def set_time(self, new_time):
         self.time = new_time
 
@@ -65,5 +127,6 @@ def music_player(monkeypatch):
     Fixture that patches vlc.Instance to use DummyVLCInstance.
     """
     monkeypatch.setattr(vlc, "Instance", lambda: DummyVLCInstance())
+    TrackInfo.durations.clear()
     return MusicPlayer()
 
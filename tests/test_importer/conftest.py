@@ -0,0 +1,79 @@
+import time
+import threading
+import pytest
+from ethos.scheduler import RequestScheduler
+from ethos.spotify_importer import SpotifyImporter
+from ethos.userstore import UserStore
+from ethos.utils import Search, UserFiles
+
+def make_track(index, playlist="p"):
+    return {
+        "id": f"{playlist}-t{index}",
+        "name": f"Song {index}",
+        "artists": [{"name": f"Artist {index % 7}"}],
+        "duration_ms": 180_000 + index,
+        "external_ids": {"isrc": f"ISRC{index:08d}"},
+    }
+
+class FakeSpotify:
+    """Answers spotipy calls from in-memory playlists, recording calls and concurrency"""
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.playlists = {}
+        self.calls = []
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+
+    def add_playlist(self, playlist_id, name, size):
+        self.playlists[playlist_id] = {
+            "id": playlist_id,
+            "name": name,
+            "items": [{"track": make_track(i, playlist_id)} for i in range(size)],
+            "snapshot_id": f"{playlist_id}-v1",
+        }
+
+    def change(self, playlist_id, size):
+        """Append tracks to a playlist, giving it a new snapshot id"""
+        playlist = self.playlists[playlist_id]
+        start = len(playlist["items"])
+        playlist["items"].extend({"track": make_track(i, playlist_id)} for i in range(start, start + size))
+        version = int(playlist["snapshot_id"].rsplit("-v", 1)[1]) + 1
+        playlist["snapshot_id"] = f"{playlist_id}-v{version}"
+
+    def _page(self, items, limit, offset):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(self.delay)
+        with self.lock:
+            self.running -= 1
+        return {"items": items[offset:offset + limit], "total": len(items)}
+
+    def playlist_tracks(self, playlist_id, fields=None, limit=100, offset=0):
+        self.calls.append(("playlist_tracks", playlist_id, offset))
+        return self._page(self.playlists[playlist_id]["items"], limit, offset)
+
+    def current_user_playlists(self, limit=50, offset=0):
+        self.calls.append(("current_user_playlists", offset))
+        summaries = [
+            {
+                "id": playlist["id"],
+                "name": playlist["name"],
+                "snapshot_id": playlist["snapshot_id"],
+                "tracks": {"total": len(playlist["items"])},
+            }
+            for playlist in self.playlists.values()
+        ]
+        return self._page(summaries, limit, offset)
+
+@pytest.fixture
+def spotify(tmp_path, monkeypatch):
+    """A SpotifyImporter talking to a FakeSpotify, storing playlists under tmp_path"""
+    fake = FakeSpotify()
+    monkeypatch.setattr(SpotifyImporter, "_authenticate", lambda self: fake)
+    monkeypatch.setattr(Search, "scheduler", RequestScheduler(rates={}, default_rate=(10000.0, 10000), max_concurrency=16))
+    monkeypatch.setattr(UserFiles, "store", UserStore(tmp_path / "user.db"))
+    importer = SpotifyImporter("id", "secret", "http://localhost:3000")
+    importer.config_dir = tmp_path
+    return importer, fake
@@ -0,0 +1,71 @@
+import random
+from ethos.playlists import PlaylistStore
+from ethos.userstore import UserStore
+from .conftest import make_track
+
+def entry(index, name=None):
+    return {"id": f"t{index}", "name": name or f"Song {index}", "artist": "Artist"}
+
+def changes(delta):
+    return len(delta["remove"]) + len(delta["add"]) + len(delta["update"])
+
+def test_diff_round_trips_random_edits(tmp_path):
+    rng = random.Random(7)
+    store = UserStore(tmp_path / "user.db")
+    old = [entry(i) for i in range(300)]
+    store.write("P", old)
+    for _ in range(50):
+        new = [track for track in old if rng.random() > 0.05]
+        for i in range(rng.randint(0, 10)):
+            new.insert(rng.randint(0, len(new)), entry(1000 + rng.randint(0, 500)))
+        if len(new) > 2:
+            new.insert(rng.randint(0, len(new) - 1), new.pop(rng.randint(0, len(new) - 1)))
+        store.save("P", new)
+        assert store.load("P") == new
+        old = new
+    store.close()
+
+def test_move_is_a_single_change():
+    old = [entry(i) for i in range(100)]
+    new = old[1:] + old[:1]
+    delta = PlaylistStore.diff(old, new)
+    assert delta["remove"] == ["t0"]
+    assert delta["add"] == [[99, "t0", old[0]]]
+
+def test_same_title_songs_are_kept():
+    old = [entry(0, "Intro")]
+    new = [entry(0, "Intro"), entry(1, "Intro"), entry(1, "Intro")]
+    assert PlaylistStore.keys(new) == ["t0", "t1", "t1#2"]
+    assert PlaylistStore.diff(old, new)["add"] == [[1, "t1", new[1]], [2, "t1#2", new[2]]]
+
+def test_unchanged_playlist_has_an_empty_diff():
+    songs = [entry(i) for i in range(1000)]
+    assert PlaylistStore.is_empty(PlaylistStore.diff(songs, [dict(song) for song in songs]))
+
+def test_refresh_mirrors_spotify(spotify):
+    importer, fake = spotify
+    fake.add_playlist("p", "P", 200)
+    importer.save_playlist_to_json("p", "P")
+    first = importer.store.load("P")[0]
+    assert first["isrc"] == "ISRC00000000" and first["duration_ms"] == 180_000
+
+    items = fake.playlists["p"]["items"]
+    items.insert(0, items.pop(150))
+    del items[10]
+    items.append({"track": make_track(0, "other") | {"name": "Song 1"}})
+    delta = importer.refresh_playlist("p", "P")
+
+    assert changes(delta) == 4
+    songs = importer.store.load("P")
+    assert [song["id"] for song in songs] == [item["track"]["id"] for item in items]
+
+def test_unchanged_refresh_writes_nothing(spotify):
+    importer, fake = spotify
+    fake.add_playlist("p", "P", 50)
+    for item in fake.playlists["p"]["items"][:10]:
+        item["track"]["external_ids"] = {}
+        item["track"]["duration_ms"] = None
+    fake.playlists["p"]["items"][20]["track"]["id"] = None  # a local file in the Spotify playlist
+    importer.save_playlist_to_json("p", "P")
+
+    assert changes(importer.refresh_playlist("p", "P")) == 0
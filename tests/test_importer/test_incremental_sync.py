@@ -0,0 +1,56 @@
+import json
+
+def track_calls(fake):
+    return [call for call in fake.calls if call[0] == "playlist_tracks"]
+
+def test_unchanged_playlists_are_skipped(spotify):
+    importer, fake = spotify
+    for i in range(200):
+        fake.add_playlist(f"p{i}", f"Playlist {i}", 150)
+
+    first = importer.refresh_all_playlists()
+    assert len(first["refreshed"]) == 200
+    assert len(track_calls(fake)) == 400
+
+    fake.calls.clear()
+    second = importer.refresh_all_playlists()
+    assert len(second["unchanged"]) == 200
+    assert second["refreshed"] == []
+    assert fake.calls == [("current_user_playlists", offset) for offset in (0, 50, 100, 150)]
+
+def test_only_changed_playlists_are_refreshed(spotify):
+    importer, fake = spotify
+    for i in range(5):
+        fake.add_playlist(f"p{i}", f"Playlist {i}", 10)
+    importer.refresh_all_playlists()
+
+    fake.change("p3", 5)
+    fake.calls.clear()
+    result = importer.refresh_all_playlists()
+
+    assert result["refreshed"] == ["Playlist 3"]
+    assert {call[1] for call in track_calls(fake)} == {"p3"}
+    songs = importer.store.load("Playlist 3")
+    assert len(songs) == 15
+    snapshots = json.loads(importer.snapshots_file.read_text())
+    assert snapshots["p3"]["snapshot_id"] == "p3-v2"
+
+def test_deleted_file_is_synced_again(spotify):
+    importer, fake = spotify
+    fake.add_playlist("p0", "Playlist 0", 10)
+    importer.refresh_all_playlists()
+    importer.store.delete("Playlist 0")
+    assert importer.refresh_all_playlists()["refreshed"] == ["Playlist 0"]
+
+def test_failed_refresh_is_retried_next_time(spotify, monkeypatch):
+    importer, fake = spotify
+    fake.add_playlist("p0", "Playlist 0", 10)
+    original = fake.playlist_tracks
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(fake, "playlist_tracks", broken)
+    assert importer.refresh_all_playlists()["failed"] == ["Playlist 0"]
+    monkeypatch.setattr(fake, "playlist_tracks", original)
+    assert importer.refresh_all_playlists()["refreshed"] == ["Playlist 0"]
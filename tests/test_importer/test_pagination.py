@@ -0,0 +1,80 @@
+import time
+import pytest
+
+def test_large_playlist_is_not_truncated(spotify):
+    importer, fake = spotify
+    fake.add_playlist("big", "Big", 2000)
+    importer.save_playlist_to_json("big", "Big")
+
+    songs = importer.store.load("Big")
+    assert len(songs) == 2000
+    assert [song["id"] for song in songs] == [f"big-t{i}" for i in range(2000)]
+    assert sorted(offset for _, _, offset in fake.calls) == list(range(0, 2000, 100))
+
+def test_pages_are_fetched_concurrently_under_a_cap(spotify):
+    importer, fake = spotify
+    fake.delay = 0.05
+    fake.add_playlist("big", "Big", 1000)
+
+    start = time.monotonic()
+    songs = list(importer.fetch_playlist_songs("big"))
+    elapsed = time.monotonic() - start
+
+    assert len(songs) == 1000
+    assert fake.peak == 4
+    assert elapsed < 10 * fake.delay
+
+def test_all_playlists_are_listed(spotify):
+    importer, fake = spotify
+    for i in range(120):
+        fake.add_playlist(f"p{i}", f"Playlist {i}", 1)
+    playlists = importer.fetch_playlists()
+    assert [playlist["id"] for playlist in playlists] == [f"p{i}" for i in range(120)]
+    assert len(fake.calls) == 3
+
+def test_removed_tracks_are_skipped(spotify):
+    importer, fake = spotify
+    fake.add_playlist("p", "P", 3)
+    fake.playlists["p"]["items"][1] = {"track": None}
+    importer.save_playlist_to_json("p", "P")
+    songs = importer.store.load("P")
+    assert [song["id"] for song in songs] == ["p-t0", "p-t2"]
+
+def test_pages_are_fetched_outside_the_write_transaction(spotify, monkeypatch):
+    importer, fake = spotify
+    fake.add_playlist("p", "P", 300)
+    fetch = fake.playlist_tracks
+    during = []
+
+    def playlist_tracks(*args, **kwargs):
+        during.append(importer.store.conn.in_transaction)
+        return fetch(*args, **kwargs)
+
+    monkeypatch.setattr(fake, "playlist_tracks", playlist_tracks)
+    importer.save_playlist_to_json("p", "P")
+    importer.refresh_playlist("p", "P")
+    assert len(during) == 6 and not any(during)
+
+def test_interrupted_import_keeps_the_stored_playlist(spotify, monkeypatch):
+    importer, fake = spotify
+    fake.add_playlist("big", "Big", 100)
+    importer.save_playlist_to_json("big", "Big")
+    fake.change("big", 1900)
+    fetch = fake.playlist_tracks
+
+    def playlist_tracks(playlist_id, fields=None, limit=100, offset=0):
+        if offset == 1900:
+            raise ConnectionError("connection lost")
+        return fetch(playlist_id, fields=fields, limit=limit, offset=offset)
+
+    monkeypatch.setattr(fake, "playlist_tracks", playlist_tracks)
+    with pytest.raises(ConnectionError):
+        importer.save_playlist_to_json("big", "Big")
+
+    # the pages that arrived were written as they came, but are only swapped in once complete
+    assert importer.store.conn.execute("SELECT COUNT(*) FROM staged").fetchone()[0] == 1900
+    assert len(importer.store.load("Big")) == 100
+    monkeypatch.setattr(fake, "playlist_tracks", fetch)
+    importer.save_playlist_to_json("big", "Big")
+    assert len(importer.store.load("Big")) == 2000
+    assert importer.store.conn.execute("SELECT COUNT(*) FROM staged").fetchone()[0] == 0
@@ -0,0 +1,60 @@
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from ethos import spotify_importer
+from ethos.scheduler import RequestScheduler
+from ethos.spotify_importer import SpotifyImporter
+from ethos.utils import Search
+
+class FakeOAuth:
+    def __init__(self, **kwargs):
+        pass
+
+    def get_access_token(self, as_dict=False):
+        return "token"
+
+@pytest.fixture
+def throttling_api():
+    """A Web API that answers the first request with 429 and a Retry-After of one second"""
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            requests.append(time.monotonic())
+            if len(requests) == 1:
+                self.send_response(429)
+                self.send_header("Retry-After", "1")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body = json.dumps({"items": [], "total": 0}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1/", requests
+    server.shutdown()
+    server.server_close()
+
+def test_retry_after_reaches_the_scheduler(throttling_api, monkeypatch):
+    prefix, requests = throttling_api
+    scheduler = RequestScheduler(rates={}, default_rate=(10000.0, 10000), base_delay=0.01)
+    monkeypatch.setattr(spotify_importer, "SpotifyOAuth", FakeOAuth)
+    monkeypatch.setattr(Search, "scheduler", scheduler)
+    importer = SpotifyImporter("id", "secret", "http://localhost:3000")
+    importer.spotify.prefix = prefix
+
+    assert importer._call(importer.spotify.current_user_playlists, limit=50, offset=0)["total"] == 0
+    assert len(requests) == 2
+    assert requests[1] - requests[0] >= 1.0
+    assert scheduler.metrics()["throttled_total"] == 1
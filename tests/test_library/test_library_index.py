@@ -0,0 +1,149 @@
+import os
+import pytest
+from pathlib import Path
+from ethos import library
+from ethos.library import LibraryIndex
+
+@pytest.fixture
+def probed(monkeypatch):
+    """Replace libvlc probing with tags derived from the file path and record probed files"""
+    probed = []
+
+    def fake_probe(path):
+        probed.append(path)
+        album = Path(path).parent.name
+        return {"duration": 180, "title": Path(path).stem, "artist": "Artist " + album, "album": album}
+
+    monkeypatch.setattr(library, "probe_file", fake_probe)
+    return probed
+
+@pytest.fixture
+def music_folder(tmp_path):
+    for album in ("one", "two"):
+        (tmp_path / "music" / album).mkdir(parents=True)
+        for track in ("a.mp3", "b.flac", "cover.jpg"):
+            (tmp_path / "music" / album / track).write_bytes(b"audio")
+    return tmp_path / "music"
+
+@pytest.fixture
+def index(tmp_path):
+    index = LibraryIndex(db_path=tmp_path / "library.db")
+    yield index
+    index.close()
+
+def test_scan_and_query(index, music_folder, probed):
+    assert index.scan(music_folder) == 4
+    assert len(probed) == 4
+
+    tracks = index.query(prefix=str(music_folder))
+    assert [Path(track.path).name for track in tracks] == ["a.mp3", "b.flac", "a.mp3", "b.flac"]
+    assert {track.path for track in index.query(album="ONE")} == {
+        str((music_folder / "one" / "a.mp3").resolve()),
+        str((music_folder / "one" / "b.flac").resolve()),
+    }
+    assert len(index.query(artist="artist two")) == 2
+    assert index.query(prefix=str(music_folder / "one"), limit=1)[0].title == "a"
+
+def test_rescan_only_touches_changed_directories(index, music_folder, probed):
+    index.scan(music_folder)
+    probed.clear()
+    assert index.scan(music_folder) == 0
+    assert probed == []
+
+    (music_folder / "two" / "c.mp3").write_bytes(b"audio")
+    os.remove(music_folder / "one" / "a.mp3")
+    assert index.scan(music_folder) == 2
+    assert [Path(path).name for path in probed] == ["c.mp3"]
+    assert index.get(str((music_folder / "one" / "a.mp3").resolve())) is None
+
+def test_removed_directory_is_dropped(index, music_folder, probed):
+    index.scan(music_folder)
+    for track in (music_folder / "two").iterdir():
+        track.unlink()
+    (music_folder / "two").rmdir()
+
+    assert index.scan(music_folder) == 2
+    assert index.query(album="two") == []
+
+def tag_from_name(path):
+    """Module-level probe so it can be sent to worker processes"""
+    return {"duration": 60, "title": Path(path).stem.upper(), "artist": None, "album": None}
+
+def test_parallel_scan_with_progress(tmp_path, monkeypatch):
+    monkeypatch.setattr(library, "BATCH_SIZE", 10)
+    folder = tmp_path / "music"
+    folder.mkdir()
+    for i in range(40):
+        (folder / f"track{i:02}.mp3").write_bytes(b"audio")
+
+    index = LibraryIndex(db_path=tmp_path / "library.db", probe=tag_from_name)
+    reports = []
+    assert index.scan(folder, workers=2, progress=lambda done, total: reports.append((done, total))) == 40
+    assert reports == [(10, 40), (20, 40), (30, 40), (40, 40)]
+    assert index.query(prefix=str(folder), limit=1)[0].title == "TRACK00"
+    index.close()
+
+def test_interrupted_scan_resumes(index, music_folder, monkeypatch):
+    monkeypatch.setattr(library, "BATCH_SIZE", 1)
+    probed = []
+
+    def probe(path):
+        probed.append(path)
+        return {"duration": 1, "title": Path(path).stem, "artist": None, "album": None}
+
+    def interrupted_probe(path):
+        if len(probed) == 3:
+            raise KeyboardInterrupt
+        return probe(path)
+
+    monkeypatch.setattr(library, "probe_file", interrupted_probe)
+    with pytest.raises(KeyboardInterrupt):
+        index.scan(music_folder, workers=0)
+    finished = list(probed)
+
+    monkeypatch.setattr(library, "probe_file", probe)
+    probed.clear()
+    assert index.scan(music_folder, workers=0) == 1
+    assert not set(probed) & set(finished)
+    assert len(index.query(prefix=str(music_folder))) == 4
+
+def test_configured_extensions(index, music_folder, probed, monkeypatch):
+    from ethos.config import get_audio_extensions
+    monkeypatch.setenv("AUDIO_EXTENSIONS", "flac, .JPG")
+    index.extensions = get_audio_extensions()
+    assert index.extensions == (".flac", ".jpg")
+    index.scan(music_folder)
+    assert sorted(Path(track.path).name for track in index.query()) == ["b.flac", "b.flac", "cover.jpg", "cover.jpg"]
+
+def test_fuzzy_search(index, tmp_path, monkeypatch):
+    tags = {
+        "blinding.mp3": ("Blinding Lights", "The Weeknd"),
+        "after.mp3": ("After Hours", "The Weeknd"),
+        "hours_demo.flac": ("Demo", "Someone Else"),
+    }
+    monkeypatch.setattr(library, "probe_file", lambda path: {
+        "duration": 200, "title": tags[Path(path).name][0], "artist": tags[Path(path).name][1], "album": None,
+    })
+    folder = tmp_path / "music"
+    folder.mkdir()
+    for name in tags:
+        (folder / name).write_bytes(b"audio")
+    index.scan(folder, workers=0)
+
+    assert [track.title for track in index.search("aft hou")] == ["After Hours"]
+    assert {track.title for track in index.search("weeknd")} == {"Blinding Lights", "After Hours"}
+    assert [track.title for track in index.search("demo")] == ["Demo"]
+    assert index.search("hours", prefix=str(tmp_path / "elsewhere")) == []
+
+    # Re-probing a modified file replaces its search entry instead of duplicating it
+    (folder / "after.mp3").write_bytes(b"longer audio")
+    index.refresh([folder])
+    assert len(index.search("after")) == 1
+
+def test_stopped_scan_resumes(index, music_folder, probed, monkeypatch):
+    import threading
+    monkeypatch.setattr(library, "BATCH_SIZE", 1)
+    stop = threading.Event()
+    assert index.scan(music_folder, workers=0, progress=lambda done, total: stop.set(), stop=stop) == 1
+    assert index.scan(music_folder, workers=0) == 3
+    assert len(probed) == 4
@@ -0,0 +1,69 @@
+import time
+import pytest
+from pathlib import Path
+from ethos import library
+from ethos.library import LibraryIndex
+from ethos.watcher import LibraryWatcher, Inotify
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    monkeypatch.setattr(library, "probe_file", lambda path: {"duration": 1, "title": Path(path).stem, "artist": None, "album": None})
+    index = LibraryIndex(db_path=tmp_path / "library.db")
+    yield index
+    index.close()
+
+@pytest.fixture
+def music_folder(tmp_path):
+    folder = tmp_path / "music"
+    folder.mkdir()
+    (folder / "existing.mp3").write_bytes(b"audio")
+    return folder
+
+def inotify_available():
+    try:
+        Inotify().close()
+        return True
+    except OSError:
+        return False
+
+@pytest.mark.skipif(not inotify_available(), reason="inotify is not available")
+def test_watcher_coalesces_album_copy(index, music_folder, monkeypatch):
+    refreshes = []
+    refresh = index.refresh
+    monkeypatch.setattr(index, "refresh", lambda directories: refreshes.append(set(directories)) or refresh(directories))
+
+    watcher = LibraryWatcher(index, music_folder, debounce=0.3)
+    watcher.start()
+    try:
+        assert wait_for(lambda: len(index.query()) == 1 and watcher.watches)
+        album = music_folder / "album"
+        album.mkdir()
+        for i in range(50):
+            (album / f"{i:02}.mp3").write_bytes(b"audio")
+        (music_folder / "existing.mp3").rename(music_folder / "renamed.mp3")
+
+        assert wait_for(lambda: len(index.query()) == 51)
+        assert index.get(str(music_folder.resolve() / "renamed.mp3")) is not None
+        assert index.get(str(music_folder.resolve() / "existing.mp3")) is None
+        assert len(refreshes) <= 2
+    finally:
+        watcher.stop()
+
+def test_watcher_polling_fallback(index, music_folder):
+    watcher = LibraryWatcher(index, music_folder, interval=0.1, use_inotify=False)
+    watcher.start()
+    try:
+        assert wait_for(lambda: len(index.query()) == 1)
+        (music_folder / "existing.mp3").unlink()
+        (music_folder / "new.flac").write_bytes(b"audio")
+        assert wait_for(lambda: [Path(track.path).name for track in index.query()] == ["new.flac"])
+    finally:
+        watcher.stop()
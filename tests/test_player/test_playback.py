@@ -81,4 +81,154 @@ def test_track_info(music_player):
     music_player.player.set_time(5000)  
     
     from ethos.player import TrackInfo
-    assert TrackInfo.get_current_time(music_player) == "0:05"
\ No newline at end of file
+    assert TrackInfo.get_current_time(music_player) == "0:05"
+
+@pytest.mark.track_info
+def test_duration_cached_on_play(music_player):
+    """Test that play fills the duration cache and progress reads from it"""
+    from ethos.player import TrackInfo
+    music_player.play("dummy_track.mp3")
+    assert TrackInfo.durations.get("dummy_track.mp3") == 10
+
+    music_player.player.set_time(5000)
+    assert TrackInfo.get_progress(music_player) == 50.0
+    assert TrackInfo.get_audio_duration("dummy_track.mp3") == "0:10"
+
+@pytest.mark.track_info
+def test_duration_cache_lru_eviction():
+    """Test that the duration cache evicts the least recently used track"""
+    from ethos.player import DurationCache
+    cache = DurationCache(maxsize=2)
+    cache.set("a.mp3", 100)
+    cache.set("b.mp3", 200)
+    cache.get("a.mp3")
+    cache.set("c.mp3", 300)
+    assert "b.mp3" not in cache
+    assert cache.get("a.mp3") == 100
+    assert cache.get("c.mp3") == 300
+
+@pytest.mark.track_info
+async def test_get_metadata(monkeypatch):
+    """Test that metadata is read once libvlc reports the media parsed"""
+    import vlc
+    from ethos.player import TrackInfo
+    from tests.conftest import DummyMedia
+    monkeypatch.setattr(vlc, "Media", DummyMedia)
+    TrackInfo.durations.clear()
+
+    metadata = await TrackInfo.get_metadata("dummy_track.mp3")
+    assert metadata.duration == 10
+    assert metadata.tags == {"title": "Dummy Track", "artist": "Dummy Artist"}
+    assert TrackInfo.durations.get("dummy_track.mp3") == 10
+
+@pytest.mark.track_info
+async def test_get_metadata_timeout(monkeypatch):
+    """Test that a media which never parses times out instead of hanging"""
+    import vlc
+    from ethos.player import TrackInfo
+    from tests.conftest import UnparsableMedia
+    monkeypatch.setattr(vlc, "Media", UnparsableMedia)
+    TrackInfo.durations.clear()
+
+    metadata = await TrackInfo.get_metadata("stuck_stream", timeout=0.05)
+    assert metadata.duration == 0
+    assert TrackInfo.parse_media(UnparsableMedia("stuck_stream"), timeout=0.05) is False
+
+@pytest.mark.playback
+def test_end_reached_event(music_player):
+    """Test that libvlc events reach registered callbacks"""
+    import vlc
+    ended = []
+    music_player.on("end_reached", lambda event: ended.append(event))
+    music_player.play("dummy_track.mp3")
+
+    music_player.player.events.fire(vlc.EventType.MediaPlayerEndReached)
+    assert len(ended) == 1
+    assert music_player.is_playing is False
+
+@pytest.mark.playback
+def test_endless_playback_advances_on_end(music_player):
+    """Test that endless playback plays the next track as soon as one ends"""
+    import vlc
+    from ethos.tools.endless_playback import EndlessPlayback
+    endless = EndlessPlayback(music_player, ["second.mp3", "first.mp3"])
+    endless.start_endless_playback()
+    assert music_player.current_track == "first.mp3"
+
+    music_player.player.events.fire(vlc.EventType.MediaPlayerEndReached)
+    music_player.player.events.fire(vlc.EventType.MediaPlayerEndReached)
+    assert endless.finished.wait(1)
+    assert music_player.current_track == "second.mp3"
+
+@pytest.mark.playback
+def test_gapless_switch_gap(music_player):
+    """Test that an armed track starts right after the current one ends"""
+    import threading
+    import time
+    import vlc
+    switched = threading.Event()
+    music_player.on("track_changed", lambda event: switched.set())
+    music_player.play("first.mp3")
+    outgoing = music_player.player
+
+    assert music_player.arm_next("second.mp3")
+    assert music_player.standby.get_media().path == "second.mp3"
+
+    ended_at = time.perf_counter()
+    outgoing.events.fire(vlc.EventType.MediaPlayerEndReached)
+    assert switched.wait(1)
+
+    gap = music_player.player.started_at - ended_at
+    assert music_player.current_track == "second.mp3"
+    assert music_player.player is not outgoing
+    assert gap < 0.05
+
+@pytest.mark.playback
+def test_crossfade(music_player):
+    """Test that crossfading ramps the next track in before the current one ends"""
+    import threading
+    import vlc
+    switched = threading.Event()
+    music_player.on("track_changed", lambda event: switched.set())
+    music_player.set_volume(80)
+    music_player.set_crossfade(1)
+    music_player.play("first.mp3")
+    outgoing = music_player.player
+    music_player.arm_next("second.mp3")
+
+    # Dummy media lasts 10s, so the fade starts in the last second
+    outgoing.events.fire(vlc.EventType.MediaPlayerTimeChanged, new_time=8000)
+    assert music_player.current_track == "first.mp3"
+    outgoing.events.fire(vlc.EventType.MediaPlayerTimeChanged, new_time=9000)
+    assert switched.wait(2)
+
+    assert music_player.current_track == "second.mp3"
+    assert music_player.get_volume() == 80
+    assert outgoing.get_media() is None
+
+@pytest.mark.playback
+def test_crossfade_survives_disarm(music_player):
+    """Test that a crossfade cancelled by disarming the next track does not disable later fades"""
+    music_player.set_crossfade(1)
+    music_player.play("first.mp3")
+    music_player._fading = True
+    music_player._switch_to_next(1)
+    assert not music_player._fading
+
+@pytest.mark.playback
+def test_standby_buffering(music_player):
+    """Test that buffering of the armed track is tracked separately from the active player"""
+    import vlc
+    buffering = []
+    music_player.on("buffering", lambda event: buffering.append(event.u.new_cache))
+    music_player.play("first.mp3")
+    music_player.arm_next("second.mp3")
+    assert not music_player.is_next_buffered()
+
+    music_player.standby.events.fire(vlc.EventType.MediaPlayerBuffering, new_cache=100.0)
+    assert music_player.is_next_buffered()
+    assert buffering == []
+
+    music_player.play("second.mp3")
+    assert music_player.current_track == "second.mp3"
+    assert music_player.is_next_buffered()
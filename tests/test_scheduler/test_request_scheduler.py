@@ -0,0 +1,132 @@
+import time
+import asyncio
+import threading
+import pytest
+from ethos.scheduler import RequestScheduler, RateLimited, Priority, priority
+
+class Response:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+@pytest.fixture
+def scheduler():
+    return RequestScheduler(rates={}, default_rate=(1000.0, 1000), max_concurrency=2, base_delay=0.01)
+
+async def test_concurrency_cap(scheduler):
+    active = {"now": 0, "max": 0}
+
+    async def request():
+        active["now"] += 1
+        active["max"] = max(active["max"], active["now"])
+        await asyncio.sleep(0.01)
+        active["now"] -= 1
+        return Response(200)
+
+    await asyncio.gather(*(scheduler.run("example.com", request) for _ in range(10)))
+    assert active["max"] == 2
+    assert scheduler.metrics()["completed"] == 10
+
+async def test_token_bucket_limits_rate():
+    scheduler = RequestScheduler(rates={"example.com": (20.0, 1)})
+
+    async def request():
+        return Response(200)
+
+    start = time.monotonic()
+    await asyncio.gather(*(scheduler.run("example.com", request) for _ in range(5)))
+    assert time.monotonic() - start >= 4 / 20 * 0.9
+
+async def test_retry_after_is_honored(scheduler):
+    attempts = []
+
+    async def request():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            return Response(429, {"Retry-After": "0.2"})
+        return Response(200)
+
+    response = await scheduler.run("example.com", request)
+    assert response.status_code == 200
+    assert attempts[1] - attempts[0] >= 0.19
+    metrics = scheduler.metrics()
+    assert (metrics["throttled_total"], metrics["retries"]) == (1, 1)
+
+async def test_gives_up_after_max_retries(scheduler):
+    async def request():
+        return Response(429)
+
+    response = await scheduler.run("example.com", request)
+    assert response.status_code == 429
+    assert scheduler.metrics()["retries"] == scheduler.max_retries
+
+async def test_interactive_overtakes_background(scheduler):
+    scheduler.max_concurrency = 1
+    order = []
+    release = asyncio.Event()
+
+    async def blocker():
+        await release.wait()
+        return Response(200)
+
+    def request(name):
+        async def send():
+            order.append(name)
+            return Response(200)
+        return send
+
+    first = asyncio.create_task(scheduler.run("example.com", blocker))
+    await asyncio.sleep(0)
+    with priority(Priority.BACKGROUND):
+        background = [asyncio.create_task(scheduler.run("example.com", request(f"sync-{i}"))) for i in range(3)]
+    prefetch = asyncio.create_task(scheduler.run("example.com", request("prefetch"), Priority.PREFETCH))
+    play = asyncio.create_task(scheduler.run("example.com", request("play")))
+    await asyncio.sleep(0.01)
+
+    metrics = scheduler.metrics()
+    assert metrics["queued"] == 5
+    assert metrics["queued_by_priority"] == {"background": 3, "prefetch": 1, "interactive": 1}
+    assert metrics["in_flight"] == 1
+
+    release.set()
+    await asyncio.gather(first, prefetch, play, *background)
+    assert order == ["play", "prefetch", "sync-0", "sync-1", "sync-2"]
+
+async def test_cancelled_waiter_leaves_queue(scheduler):
+    scheduler.max_concurrency = 1
+    release = asyncio.Event()
+
+    async def blocker():
+        await release.wait()
+        return Response(200)
+
+    first = asyncio.create_task(scheduler.run("example.com", blocker))
+    waiting = asyncio.create_task(scheduler.run("example.com", blocker))
+    await asyncio.sleep(0.01)
+    waiting.cancel()
+    await asyncio.sleep(0)
+    assert scheduler.metrics()["queued"] == 0
+    release.set()
+    await first
+    assert scheduler.metrics()["in_flight"] == 0
+
+def test_threads_share_the_scheduler(scheduler):
+    attempts = []
+    lock = threading.Lock()
+
+    def request():
+        with lock:
+            attempts.append(threading.current_thread().name)
+            if len(attempts) == 1:
+                raise RateLimited(0.05)
+        return "ok"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(scheduler.call("youtube", request))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["ok"] * 4
+    assert len(attempts) == 5
+    assert scheduler.metrics()["in_flight"] == 0
@@ -0,0 +1,113 @@
+import os
+import re
+import threading
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from ethos.audio_cache import AudioCache
+from ethos.tools.offline_sync import OfflineSync
+
+TRACKS = {f"video{i}": os.urandom(200_000 + i) for i in range(6)}
+
+class Origin:
+    """Serves TRACKS at /<video id>, truncating the ones listed in `truncate`"""
+    def __init__(self):
+        self.requests = []
+        self.truncate = set()
+        origin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                video_id = self.path.strip("/")
+                origin.requests.append(video_id)
+                data = TRACKS[video_id]
+                self.send_response(200)
+                self.send_header("Content-Type", "audio/webm")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data[:100] if video_id in origin.truncate else data)
+                if video_id in origin.truncate:
+                    self.close_connection = True
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def origin():
+    origin = Origin()
+    yield origin
+    origin.close()
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = AudioCache(directory=tmp_path / "audio")
+    yield cache
+    cache.close()
+
+def make_sync(origin, cache, mapping, **kwargs):
+    """Resolve track names with `mapping` (track -> video id), remembering resolved ids"""
+    resolved = {}
+
+    def resolve(track):
+        if mapping[track] is None:
+            raise ValueError("no results")
+        resolved[track] = mapping[track]
+        return mapping[track], f"{origin.url}/{mapping[track]}"
+
+    return OfflineSync(cache, resolve, lookup=resolved.get, **kwargs)
+
+async def test_playlist_is_downloaded_and_verified(origin, cache):
+    mapping = {f"Track {i} by Artist": f"video{i}" for i in range(6)}
+    progress = []
+    report = await make_sync(origin, cache, mapping, progress=progress.append).run(list(mapping))
+
+    assert report.count("downloaded") == 6
+    assert len(progress) == 6
+    assert report.bytes == sum(len(data) for data in TRACKS.values())
+    assert report.throughput > 0
+    assert all(track.throughput > 0 for track in report.tracks)
+    for video_id, data in TRACKS.items():
+        assert cache.path(video_id).read_bytes() == data
+
+async def test_shared_tracks_are_downloaded_once(origin, cache):
+    first = {"Track 0 by Artist": "video0", "Track 1 by Artist": "video1"}
+    second = {"Track 1 by Artist": "video1", "Track 1 (Remastered) by Artist": "video1", "Track 2 by Artist": "video2"}
+
+    await make_sync(origin, cache, first).run(list(first))
+    report = await make_sync(origin, cache, second).run(list(second) + ["Track 2 by Artist"])
+
+    assert sorted(origin.requests) == ["video0", "video1", "video2"]
+    assert len(report.tracks) == 3
+    assert (report.count("cached"), report.count("downloaded")) == (2, 1)
+
+async def test_failures_are_reported_and_resumed(origin, cache):
+    mapping = {"Good by Artist": "video0", "Cut by Artist": "video1", "Missing by Artist": None}
+    origin.truncate.add("video1")
+    report = await make_sync(origin, cache, mapping).run(list(mapping))
+
+    statuses = {track.track: track.status for track in report.tracks}
+    assert statuses == {"Good by Artist": "downloaded", "Cut by Artist": "failed", "Missing by Artist": "failed"}
+    assert not cache.is_complete("video1")
+    assert not cache.path("video1").exists()
+
+    origin.truncate.clear()
+    report = await make_sync(origin, cache, mapping).run(list(mapping))
+    statuses = {track.track: track.status for track in report.tracks}
+    assert statuses == {"Good by Artist": "cached", "Cut by Artist": "downloaded", "Missing by Artist": "failed"}
+    assert cache.path("video1").read_bytes() == TRACKS["video1"]
+
+async def test_tracks_being_played_are_left_to_the_proxy(origin, cache):
+    mapping = {"Track 0 by Artist": "video0"}
+    report = await make_sync(origin, cache, mapping, busy=lambda: frozenset({"video0"})).run(list(mapping))
+    assert report.count("duplicate") == 1
+    assert origin.requests == []
@@ -0,0 +1,58 @@
+import time
+import asyncio
+import threading
+from ethos.tools.prefetch import Prefetcher
+
+class SlowResolver:
+    """Resolver that records concurrency and blocks until released"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+        self.resolved = []
+        self.release = threading.Event()
+
+    def __call__(self, track):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        self.release.wait(1)
+        with self.lock:
+            self.running -= 1
+            self.resolved.append(track)
+        return f"https://stream/{track}"
+
+async def test_prefetch_is_bounded():
+    resolver = SlowResolver()
+    prefetcher = Prefetcher(resolver, depth=3, concurrency=2)
+    prefetcher.update(["a", "b", "c", "d"])
+    assert set(prefetcher.tasks) == {"a", "b", "c"}
+
+    await asyncio.sleep(0.1)
+    resolver.release.set()
+    assert await prefetcher.get("c") == "https://stream/c"
+    assert resolver.peak == 2
+    assert "d" not in resolver.resolved
+
+async def test_reorder_and_removal_invalidate():
+    resolver = SlowResolver()
+    resolver.release.set()
+    prefetcher = Prefetcher(resolver, depth=2, concurrency=1)
+    prefetcher.update(["a", "b", "c"])
+    task_b = prefetcher.tasks["b"]
+
+    prefetcher.update(["c", "a"])
+    assert set(prefetcher.tasks) == {"c", "a"}
+    await asyncio.sleep(0)
+    assert task_b.cancelled()
+    assert await prefetcher.get("b") is None
+
+async def test_take_survives_queue_update():
+    resolver = SlowResolver()
+    resolver.release.set()
+    prefetcher = Prefetcher(resolver, depth=2)
+    prefetcher.update(["a", "b"])
+
+    task = prefetcher.take("a")
+    prefetcher.update(["b"])
+    assert await Prefetcher.result(task) == "https://stream/a"
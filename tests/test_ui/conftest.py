@@ -0,0 +1,16 @@
+from types import SimpleNamespace
+import pytest
+import vlc
+from ethos.userstore import UserStore
+from ethos.utils import Search, UserFiles
+from tests.conftest import DummyVLCInstance
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """The textual app on a dummy libvlc, with the library and the user store under tmp_path"""
+    monkeypatch.setattr(vlc, "Instance", lambda: DummyVLCInstance())
+    from ethos.ui.textual_app import TextualApp
+    monkeypatch.setattr(UserFiles, "store", UserStore(tmp_path / "user.db"))
+    monkeypatch.setattr(TextualApp.player, "library_path", None)
+    monkeypatch.setattr(Search, "get_resolver_pool", lambda: SimpleNamespace(start=lambda: None))
+    return TextualApp()
@@ -0,0 +1,35 @@
+import asyncio
+
+async def test_cancelled_play_leaves_the_next_one_armed(app, monkeypatch):
+    """Test that a play cancelled by a newer one does not disarm or release the newer play"""
+    buffering = asyncio.Event()
+    release = asyncio.Event()
+
+    async def wait_for_buffer(self, timeout=10.0):
+        if self.player.next_track == "/music/first.mp3":
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                # the cancellation is only handled once the newer play is buffering
+                await buffering.wait()
+                raise
+        buffering.set()
+        await release.wait()
+
+    monkeypatch.setattr(type(app), "wait_for_buffer", wait_for_buffer)
+    monkeypatch.setattr(type(app), "resolve_track", lambda self, track: f"/music/{track}.mp3")
+    monkeypatch.setattr(type(app), "load_track_metadata", lambda self, url: None)
+
+    async with app.run_test() as pilot:
+        app.handle_play("first")
+        await pilot.pause()
+        app.handle_play("second")
+        await buffering.wait()
+        await pilot.pause()
+        assert app.player.next_track == "/music/second.mp3"
+        assert app.play_in_progress
+
+        release.set()
+        await app.workers.wait_for_complete()
+        assert app.player.current_track == "/music/second.mp3"
+        assert not app.play_in_progress
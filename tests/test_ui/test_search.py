@@ -0,0 +1,31 @@
+import asyncio
+from types import SimpleNamespace
+from textual.widgets import Input
+from ethos.utils import Search
+
+async def test_selection_while_spotify_is_searching(app, monkeypatch):
+    """Test that a track number typed before the Spotify results arrive picks from the local results shown"""
+    remote = asyncio.Event()
+    played = []
+
+    async def fetch_tracks_list(query):
+        await remote.wait()
+        return ["Remote Song by Remote Artist"]
+
+    local = SimpleNamespace(title="Local Song", artist="Local Artist", path="/music/local.mp3")
+    monkeypatch.setattr(app.player, "search_library", lambda query: [local])
+    monkeypatch.setattr(Search, "fetch_tracks_list", fetch_tracks_list)
+    monkeypatch.setattr(type(app), "handle_play", lambda self, track, prefetched=None: played.append(track))
+    app.tracks_list = ["1. Stale Song by Old Search"]
+
+    async with app.run_test() as pilot:
+        field = app.query_one(Input)
+        app.on_input_submitted(Input.Submitted(field, "/play song"))
+        await pilot.pause()
+        app.on_input_submitted(Input.Submitted(field, "1"))
+        await pilot.pause()
+        assert played == ["1. Local Song by Local Artist"]
+
+        remote.set()
+        await app.workers.wait_for_complete()
+        assert app.tracks_list == ["1. Local Song by Local Artist", "2. Remote Song by Remote Artist"]
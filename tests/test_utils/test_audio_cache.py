@@ -0,0 +1,154 @@
+import os
+import re
+import time
+import threading
+import httpx
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from ethos.audio_cache import AudioCache, AudioProxy, Download
+
+AUDIO = os.urandom(3 * 1024 * 1024 + 123)
+
+class Origin:
+    """Local stand-in for googlevideo: serves AUDIO with range support, slowly"""
+    def __init__(self, delay=0.0):
+        self.requests = []
+        self.delay = delay
+        origin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                origin.requests.append(self.headers.get("Range"))
+                match = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range") or "")
+                start, end = 0, len(AUDIO) - 1
+                if match:
+                    start = int(match.group(1))
+                    end = int(match.group(2)) if match.group(2) else end
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{len(AUDIO)}")
+                else:
+                    self.send_response(200)
+                self.send_header("Content-Type", "audio/webm")
+                self.send_header("Content-Length", str(end - start + 1))
+                self.end_headers()
+                try:
+                    for offset in range(start, end + 1, 256 * 1024):
+                        self.wfile.write(AUDIO[offset:min(offset + 256 * 1024, end + 1)])
+                        time.sleep(origin.delay)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/videoplayback"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def origin():
+    origin = Origin()
+    yield origin
+    origin.close()
+
+@pytest.fixture
+def proxy(tmp_path):
+    proxy = AudioProxy(AudioCache(directory=tmp_path / "audio"))
+    yield proxy
+    proxy.stop()
+    proxy.cache.close()
+
+def wait_until_cached(proxy, key):
+    for _ in range(100):
+        if proxy.cache.is_complete(key):
+            return
+        time.sleep(0.05)
+    pytest.fail("track was not cached")
+
+def test_stream_is_cached_and_replayed_from_disk(origin, proxy):
+    url = proxy.source("abc123", origin.url)
+    assert url.startswith("http://127.0.0.1:")
+
+    response = httpx.get(url)
+    assert response.status_code == 200
+    assert response.content == AUDIO
+    wait_until_cached(proxy, "abc123")
+
+    path = proxy.source("abc123", origin.url)
+    assert path == str(proxy.cache.path("abc123"))
+    with open(path, "rb") as file:
+        assert file.read() == AUDIO
+    assert origin.requests == [None]
+
+def test_range_requests_while_downloading(origin, proxy):
+    origin.delay = 0.02
+    url = proxy.source("abc123", origin.url)
+
+    response = httpx.get(url, headers={"Range": "bytes=1000-1999"})
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == f"bytes 1000-1999/{len(AUDIO)}"
+    assert response.content == AUDIO[1000:2000]
+
+    response = httpx.get(url, headers={"Range": "bytes=-100"})
+    assert response.content == AUDIO[-100:]
+    wait_until_cached(proxy, "abc123")
+
+    response = httpx.get(url, headers={"Range": "bytes=2000000-"})
+    assert response.status_code == 206
+    assert response.content == AUDIO[2000000:]
+
+def test_far_seek_is_fetched_from_upstream(origin, proxy):
+    origin.delay = 0.2
+    url = proxy.source("abc123", origin.url)
+    response = httpx.get(url, headers={"Range": "bytes=3000000-3000099"})
+    assert response.content == AUDIO[3000000:3000100]
+    assert "bytes=3000000-3000099" in origin.requests
+
+def test_upstream_failure_is_not_cached(proxy):
+    url = proxy.source("abc123", "http://127.0.0.1:9/videoplayback")
+    assert httpx.get(url).status_code == 502
+    assert not proxy.cache.is_complete("abc123")
+
+def test_origin_that_never_answers_times_out(proxy, monkeypatch):
+    monkeypatch.setattr(Download, "wait_for_headers", lambda self, timeout: False)
+    url = proxy.source("abc123", "http://127.0.0.1:9/videoplayback")
+    assert httpx.get(url).status_code == 504
+
+def fill(cache, key, size):
+    path = cache.begin(key, "audio/webm")
+    path.write_bytes(b"\0" * size)
+    cache.finish(key)
+
+@pytest.mark.parametrize("policy, evicted", [("lru", "a"), ("lfu", "b")])
+def test_eviction_policies(tmp_path, policy, evicted):
+    cache = AudioCache(directory=tmp_path / "audio", max_bytes=250, policy=policy)
+    fill(cache, "a", 100)
+    time.sleep(0.01)
+    fill(cache, "b", 100)
+    cache.lookup("a")
+    cache.lookup("a")
+    time.sleep(0.01)
+    cache.lookup("b")
+    fill(cache, "c", 100)
+
+    assert not cache.is_complete(evicted)
+    assert not cache.path(evicted).exists()
+    assert cache.stats()["bytes"] == 200
+    cache.close()
+
+def test_incomplete_entries_are_discarded_on_start(tmp_path):
+    cache = AudioCache(directory=tmp_path / "audio")
+    cache.begin("partial", "audio/webm").write_bytes(b"\0" * 10)
+    cache.close()
+
+    cache = AudioCache(directory=tmp_path / "audio")
+    assert not cache.path("partial").exists()
+    assert cache.stats()["entries"] == 0
+    cache.close()
@@ -0,0 +1,69 @@
+import time
+import asyncio
+import httpx
+import pytest
+from ethos.utils import Search
+
+REQUESTS = 20
+
+@pytest.fixture
+async def stub_server():
+    """Local HTTP/1.1 keep-alive server that counts the connections it accepts"""
+    connections = []
+
+    async def handle(reader, writer):
+        connections.append(writer)
+        try:
+            while True:
+                request = await reader.readuntil(b"\r\n\r\n")
+                if not request:
+                    break
+                body = b'{"tracks": {"items": []}}'
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    yield f"http://127.0.0.1:{port}/v1/search", connections
+    await Search.close_http_client()
+    server.close()
+    await server.wait_closed()
+
+async def test_shared_client_reuses_connection(stub_server):
+    url, connections = stub_server
+    for _ in range(REQUESTS):
+        response = await Search.spotify_get(url, token="token")
+        assert response.status_code == 200
+    assert len(connections) == 1
+
+async def test_shared_client_is_faster_than_per_request_clients(stub_server):
+    url, connections = stub_server
+
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        async with httpx.AsyncClient() as client:
+            await client.get(url)
+    per_request = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        await Search.get_http_client().get(url)
+    shared = time.perf_counter() - start
+
+    assert len(connections) == REQUESTS + 1
+    assert shared < per_request
+
+async def test_client_is_recreated_after_close():
+    client = Search.get_http_client()
+    assert Search.get_http_client() is client
+    await Search.close_http_client()
+    assert client.is_closed
+    assert Search.get_http_client() is not client
+    await Search.close_http_client()
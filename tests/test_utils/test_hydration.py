@@ -0,0 +1,97 @@
+import asyncio
+import pytest
+from ethos.metadata import MetadataStore
+from ethos.utils import Search
+
+def spotify_track(track_id, name=None, artist="The Weeknd"):
+    return {
+        "id": track_id,
+        "name": name or f"Track {track_id}",
+        "artists": [{"id": "a1", "name": artist}],
+        "album": {"name": "After Hours", "images": [{"url": f"https://i.scdn.co/{track_id}.jpg"}]},
+        "duration_ms": 200_000,
+    }
+
+class FakeResponse:
+    def __init__(self, data, status_code=200):
+        self.data = data
+        self.status_code = status_code
+
+    def json(self):
+        return self.data
+
+@pytest.fixture
+def spotify(tmp_path, monkeypatch):
+    """Use a temporary metadata store and answer Spotify requests locally"""
+    calls = []
+    active = {"now": 0, "max": 0}
+
+    async def fake_get(url, token=None, params=None):
+        calls.append((url, params))
+        active["now"] += 1
+        active["max"] = max(active["max"], active["now"])
+        await asyncio.sleep(0.01)
+        active["now"] -= 1
+        if url.endswith("/v1/tracks"):
+            ids = params["ids"].split(",")
+            return FakeResponse({"tracks": [None if i == "bad" else spotify_track(i) for i in ids]})
+        if url.endswith("/v1/artists"):
+            ids = params["ids"].split(",")
+            return FakeResponse({"artists": [{"id": i, "name": i, "genres": ["pop"], "images": []} for i in ids]})
+        return FakeResponse({"tracks": {"items": [spotify_track("found", name=params["q"].split(" ")[0])]}})
+
+    store = MetadataStore(db_path=tmp_path / "metadata.db")
+    monkeypatch.setattr(Search, "metadata_store", store)
+    monkeypatch.setattr(Search, "spotify_get", fake_get)
+    monkeypatch.setattr(Search, "search_tracks_from_spotify", Search.request_tracks_from_spotify)
+    yield calls, active
+    store.close()
+
+async def test_tracks_are_batched(spotify):
+    calls, active = spotify
+    ids = [f"t{i}" for i in range(300)]
+    tracks = await Search.hydrate_tracks(ids + ["t0", "bad"])
+
+    assert len(calls) == 7
+    assert all(len(params["ids"].split(",")) <= 50 for _, params in calls)
+    assert active["max"] <= 4
+    assert len(tracks) == 300
+    assert tracks["t5"]["duration_ms"] == 200_000
+
+    await Search.hydrate_tracks(ids)
+    assert len(calls) == 7
+
+async def test_artists_are_batched(spotify):
+    calls, _ = spotify
+    artists = await Search.hydrate_artists([f"a{i}" for i in range(60)])
+    assert len(calls) == 2
+    assert artists["a59"]["genres"] == '["pop"]'
+
+async def test_track_image_uses_store(spotify):
+    calls, _ = spotify
+    assert await Search.get_track_image("t1") == "https://i.scdn.co/t1.jpg"
+    assert await Search.get_track_image("t1") == "https://i.scdn.co/t1.jpg"
+    assert len(calls) == 1
+
+async def test_playlist_entries_without_ids_are_searched_once(spotify):
+    calls, _ = spotify
+    entries = [
+        {"id": "t1", "name": "Track t1", "artist": "The Weeknd"},
+        {"name": "Hardest", "artist": "The Weeknd"},
+    ]
+    metadata = await Search.hydrate_playlist(entries)
+    assert [track["id"] for track in metadata] == ["t1", "found"]
+
+    calls.clear()
+    await Search.hydrate_playlist(entries)
+    assert calls == []
+
+def test_find_track_by_first_or_all_artists(tmp_path):
+    store = MetadataStore(db_path=tmp_path / "metadata.db")
+    track = spotify_track("t1", name="Save Your Tears")
+    track["artists"].append({"id": "a2", "name": "Ariana Grande"})
+    store.put_tracks([track])
+    assert store.find_track("save your tears", "The Weeknd")["id"] == "t1"
+    assert store.find_track("Save Your Tears", "The Weeknd, Ariana Grande")["id"] == "t1"
+    assert store.find_track("Save Your Tears", "Ariana Grande") is None
+    store.close()
@@ -0,0 +1,72 @@
+import time
+import pytest
+from ethos.history import PlayLog
+from ethos.userstore import UserStore
+from ethos.utils import UserFiles
+
+NOW = time.mktime((2026, 6, 15, 12, 0, 0, 0, 0, -1))
+DAY = 86400
+
+@pytest.fixture
+def store(tmp_path):
+    store = UserStore(tmp_path / "user.db")
+    yield store
+    store.close()
+
+def play(track, started_at, listened=180.0, skipped=False, source="stream"):
+    return {"track": track, "source": source, "started_at": started_at, "listened": listened, "skipped": skipped}
+
+def test_plays_are_written_in_batches(store, monkeypatch):
+    batches = []
+    record = store.record_plays
+    monkeypatch.setattr(store, "record_plays", lambda plays: (batches.append(len(plays)), record(plays)))
+    log = PlayLog(store, batch=4, interval=3600)
+
+    for i in range(10):
+        log.started(f"Track {i % 3}", "stream")
+        log.progress(30 + i)
+    log.close()
+
+    assert batches == [4, 4, 2]
+    rows = store.conn.execute("SELECT track, listened, skipped FROM plays ORDER BY id").fetchall()
+    assert [tuple(row) for row in rows][:2] == [("Track 0", 30.0, 1), ("Track 1", 31.0, 1)]
+    assert tuple(rows[-1]) == ("Track 0", 39.0, 0)
+
+def test_top_tracks_per_period(store):
+    store.record_plays(
+        [play("Old by A", NOW - 400 * DAY)] * 5
+        + [play("Last month by B", NOW - 31 * DAY)] * 3
+        + [play("This week by C", NOW - 3 * DAY)] * 2
+        + [play("Today by D", NOW, listened=60, skipped=True)]
+    )
+    top = lambda period: [(t["track"], t["plays"]) for t in store.top_tracks(period, now=NOW)]
+
+    assert top("today") == [("Today by D", 1)]
+    assert top("week") == [("This week by C", 2), ("Today by D", 1)]
+    assert top("month") == [("This week by C", 2), ("Today by D", 1)]
+    assert top("all") == [("Old by A", 5), ("Last month by B", 3), ("This week by C", 2), ("Today by D", 1)]
+    assert store.top_tracks("all", limit=1, now=NOW)[0]["listened"] == 900
+    assert store.listening_totals("today", now=NOW) == {"plays": 1, "listened": 60, "skips": 1, "tracks": 1}
+    with pytest.raises(ValueError):
+        store.top_tracks("decade")
+
+def test_top_tracks_read_only_the_rollups(store):
+    plan = store.conn.execute(
+        "EXPLAIN QUERY PLAN SELECT track FROM rollups WHERE granularity = ? AND bucket IN (?) ORDER BY plays DESC LIMIT 10",
+        ("month", "2026-06"),
+    ).fetchall()
+    assert any("rollups_top" in row["detail"] for row in plan)
+
+def test_compaction_keeps_long_term_rollups(store):
+    store.record_plays([play("Old by A", NOW - 400 * DAY), play("New by B", NOW - DAY)])
+    assert store.compact_history(keep_days=365, now=NOW) == 1
+    assert store.conn.execute("SELECT COUNT(*) FROM plays").fetchone()[0] == 1
+    assert {t["track"] for t in store.top_tracks("all", now=NOW)} == {"Old by A", "New by B"}
+    assert store.conn.execute("SELECT COUNT(*) FROM rollups WHERE granularity = 'day'").fetchone()[0] == 1
+
+def test_listening_stats(store, monkeypatch):
+    monkeypatch.setattr(UserFiles, "store", store)
+    assert UserFiles.listening_stats("week") == ["No plays recorded yet."]
+    store.record_plays([play("Song by A", time.time(), listened=3720)] * 2 + [play("Other by B", time.time())])
+    lines = UserFiles.listening_stats("week", limit=1)
+    assert lines == ["3 plays of 2 tracks, 2h 07m listened, 0 skipped", "", "1. Song by A  2 plays, 2h 04m"]
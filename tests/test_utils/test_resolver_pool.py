@@ -0,0 +1,79 @@
+import os
+import time
+import pytest
+from concurrent.futures import wait
+from ethos.resolver import ResolverPool, ResolverCrashed
+from ethos.scheduler import Priority, priority
+
+class SlowStartExtractor:
+    """Stands in for YoutubeDL: expensive to build, cheap to use"""
+    def __init__(self):
+        time.sleep(0.5)
+
+    def extract(self, target):
+        if target == "crash":
+            os._exit(1)
+        if target == "fail":
+            raise ValueError("no video")
+        if target.startswith("sleep"):
+            time.sleep(0.3)
+        return {"id": target, "url": f"https://rr1.googlevideo.com/{target}", "pid": os.getpid()}
+
+@pytest.fixture
+def pool():
+    pool = ResolverPool(workers=2, extractor_factory=SlowStartExtractor)
+    yield pool
+    pool.close()
+
+def test_workers_stay_warm(pool):
+    pool.start()
+    pool.resolve("warm up")
+    start = time.monotonic()
+    result = pool.resolve("after hours")
+    assert time.monotonic() - start < 0.5
+    assert result["id"] == "after hours"
+    assert result["pid"] != os.getpid()
+
+def test_resolutions_run_in_parallel(pool):
+    pool.start()
+    wait([pool.submit("warm up") for _ in range(2)])
+    start = time.monotonic()
+    results = [future.result(10) for future in [pool.submit(f"sleep {i}") for i in range(4)]]
+    assert time.monotonic() - start < 1.0
+    assert len({result["pid"] for result in results}) == 2
+
+def test_interactive_jobs_jump_the_queue():
+    pool = ResolverPool(workers=1, extractor_factory=SlowStartExtractor)
+    pool.resolve("warm up")
+    finished = []
+    running = pool.submit("sleep running")
+    with priority(Priority.BACKGROUND):
+        background = [pool.submit(f"sleep background {i}") for i in range(2)]
+    interactive = pool.submit("play")
+    for future in [running, interactive, *background]:
+        future.add_done_callback(lambda future: finished.append(future.result()["id"]))
+    wait(background, timeout=10)
+    assert finished == ["sleep running", "play", "sleep background 0", "sleep background 1"]
+    pool.close()
+
+def test_errors_are_raised_to_the_caller(pool):
+    with pytest.raises(Exception, match="no video"):
+        pool.resolve("fail")
+    assert pool.resolve("after hours")["id"] == "after hours"
+    assert pool.restarts() == 0
+
+def test_crashed_worker_is_replaced():
+    pool = ResolverPool(workers=1, extractor_factory=SlowStartExtractor)
+    first = pool.resolve("after hours")["pid"]
+    with pytest.raises(ResolverCrashed):
+        pool.resolve("crash")
+    assert pool.resolve("after hours")["pid"] != first
+    assert pool.restarts() == 1
+    pool.close()
+
+def test_worker_is_recycled_after_max_jobs():
+    pool = ResolverPool(workers=1, extractor_factory=SlowStartExtractor, max_jobs=2)
+    pids = [pool.resolve(f"track {i}")["pid"] for i in range(3)]
+    assert pids[0] == pids[1] != pids[2]
+    assert pool.restarts() == 1
+    pool.close()
@@ -0,0 +1,75 @@
+import time
+import asyncio
+import pytest
+from ethos.cache import SearchCache
+from ethos.utils import Search
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = SearchCache(db_path=tmp_path / "cache.db", ttl=60, max_stale=600, memory_entries=2)
+    yield cache
+    cache.close()
+
+@pytest.fixture
+def requests(tmp_path, monkeypatch):
+    """Use a temporary search cache and record every Spotify search"""
+    requests = []
+
+    async def fake_request(track_name, token=None):
+        requests.append(track_name)
+        await asyncio.sleep(0)
+        return [{"name": f"{track_name} #{len(requests)}", "artists": [{"name": "The Weeknd"}]}]
+
+    cache = SearchCache(db_path=tmp_path / "cache.db", ttl=60)
+    monkeypatch.setattr(Search, "search_cache", cache)
+    monkeypatch.setattr(Search, "request_tracks_from_spotify", fake_request)
+    yield requests
+    cache.close()
+
+def test_memory_and_disk_tiers(cache, tmp_path):
+    cache.put("track", "After Hours", [1])
+    assert cache.get("track", "after  hours") == ([1], False)
+    assert cache.get("artist", "after hours") is None
+
+    restarted = SearchCache(db_path=tmp_path / "cache.db")
+    assert restarted.get("track", "after hours") == ([1], False)
+    assert restarted.stats()["disk_hits"] == 1
+    assert restarted.get("track", "after hours") == ([1], False)
+    assert restarted.stats()["memory_hits"] == 1
+    restarted.close()
+
+def test_memory_tier_is_lru(cache):
+    for query in ("a", "b", "c"):
+        cache.put("track", query, [query])
+    assert list(cache.memory) == ["track:b", "track:c"]
+    cache.get("track", "a")
+    assert list(cache.memory) == ["track:c", "track:a"]
+    assert cache.stats()["entries"] == 3
+
+def test_ttl_and_max_stale(cache, monkeypatch):
+    cache.put("track", "after hours", [1])
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 120)
+    assert cache.get("track", "after hours") == ([1], True)
+    monkeypatch.setattr(time, "time", lambda: now + 1200)
+    assert cache.get("track", "after hours") is None
+    stats = cache.stats()
+    assert (stats["stale_hits"], stats["misses"]) == (1, 1)
+
+async def test_repeated_search_hits_cache(requests):
+    first = await Search.fetch_tracks_list("after hours")
+    assert await Search.fetch_tracks_list("After Hours") == first
+    assert requests == ["after hours"]
+
+async def test_stale_results_are_served_and_revalidated(requests):
+    await Search.search_tracks_from_spotify("after hours")
+    Search.search_cache.ttl = -1
+
+    stale = await asyncio.gather(*(Search.search_tracks_from_spotify("after hours") for _ in range(3)))
+    assert all(tracks[0]["name"] == "after hours #1" for tracks in stale)
+    await asyncio.gather(*Search.revalidations.values())
+
+    assert requests == ["after hours", "after hours"]
+    Search.search_cache.ttl = 60
+    tracks = await Search.search_tracks_from_spotify("after hours")
+    assert tracks[0]["name"] == "after hours #2"
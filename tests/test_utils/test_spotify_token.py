@@ -0,0 +1,51 @@
+import json
+import time
+import asyncio
+import pytest
+from ethos.utils import Search, SpotifyToken
+
+@pytest.fixture
+def requests(tmp_path, monkeypatch):
+    """Use a temporary token file and record every token request"""
+    requests = []
+
+    async def fake_request():
+        requests.append(time.time())
+        return {"access_token": f"token-{len(requests)}", "expires_in": 3600}
+
+    token = SpotifyToken(token_file=tmp_path / "spotify_token.json")
+    monkeypatch.setattr(Search, "spotify_token", token)
+    monkeypatch.setattr(Search, "request_spotify_token", fake_request)
+    yield requests
+    token.close()
+
+async def test_token_is_reused(requests):
+    tokens = await asyncio.gather(*(Search.get_spotify_token() for _ in range(5)))
+    assert tokens == ["token-1"] * 5
+    assert await Search.get_spotify_token() == "token-1"
+    assert len(requests) == 1
+
+async def test_token_persists_across_restarts(requests, tmp_path):
+    await Search.get_spotify_token()
+    saved = json.loads((tmp_path / "spotify_token.json").read_text())
+    assert saved["access_token"] == "token-1"
+
+    restarted = SpotifyToken(token_file=tmp_path / "spotify_token.json")
+    assert await restarted.get() == "token-1"
+    restarted.close()
+    assert len(requests) == 1
+
+async def test_expiring_token_is_refreshed(requests):
+    token = Search.spotify_token
+    token.refresh_margin = 3599.9
+    assert await token.get() == "token-1"
+    await asyncio.sleep(0.15)
+    assert token.access_token != "token-1"
+    assert len(requests) >= 2
+
+async def test_rejected_token_is_renewed_once(requests):
+    token = Search.spotify_token
+    await token.get()
+    await asyncio.gather(token.renew("token-1"), token.renew("token-1"))
+    assert token.access_token == "token-2"
+    assert len(requests) == 2
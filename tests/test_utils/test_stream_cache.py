@@ -0,0 +1,56 @@
+import time
+import pytest
+from ethos.cache import StreamCache
+from ethos.utils import Search
+
+def stream_url(video_id, expires):
+    return f"https://rr1.googlevideo.com/videoplayback?expire={int(expires)}&id={video_id}"
+
+@pytest.fixture
+def extractions(tmp_path, monkeypatch):
+    """Use a temporary stream cache and record every yt-dlp extraction"""
+    extractions = []
+
+    def fake_extract(target):
+        extractions.append(target)
+        return {"id": "abc123", "url": stream_url("abc123", time.time() + 6 * 3600)}
+
+    cache = StreamCache(db_path=tmp_path / "cache.db")
+    monkeypatch.setattr(Search, "stream_cache", cache)
+    monkeypatch.setattr(Search, "extract_audio_info", fake_extract)
+    yield extractions
+    cache.close()
+
+def test_replay_hits_cache(extractions):
+    url = Search.get_audio_url("After Hours by The Weeknd official music video")
+    assert Search.get_audio_url("after hours  by the weeknd OFFICIAL music video") == url
+    assert extractions == ["After Hours by The Weeknd official music video"]
+    assert Search.stream_cache.stats()["hits"] == 1
+    assert Search.stream_cache.stats()["misses"] == 1
+
+def test_expired_url_is_resolved_from_video_id(extractions):
+    Search.stream_cache.put("after hours", "abc123", stream_url("abc123", time.time() + 60))
+    Search.get_audio_url("after hours")
+    assert extractions == ["https://www.youtube.com/watch?v=abc123"]
+    assert Search.stream_cache.stats()["expired"] == 1
+    assert Search.stream_cache.get("after hours")[1] is not None
+
+def test_url_expiry_formats():
+    assert StreamCache.url_expiry("https://x.googlevideo.com/videoplayback?expire=1700000000&ei=1") == 1700000000
+    assert StreamCache.url_expiry("https://x.googlevideo.com/videoplayback/expire/1700000000/ei/1") == 1700000000
+    assert StreamCache.url_expiry("https://example.com/audio.mp3") is None
+
+def test_lru_eviction(tmp_path):
+    cache = StreamCache(db_path=tmp_path / "cache.db", max_entries=2)
+    future = time.time() + 3600
+    cache.put("one", "1", stream_url("1", future))
+    time.sleep(0.01)
+    cache.put("two", "2", stream_url("2", future))
+    time.sleep(0.01)
+    cache.get("one")
+    time.sleep(0.01)
+    cache.put("three", "3", stream_url("3", future))
+    assert cache.get("two") is None
+    assert cache.get("one")[0] == "1"
+    assert cache.stats()["entries"] == 2
+    cache.close()
@@ -0,0 +1,110 @@
+import json
+import sqlite3
+import threading
+import pytest
+from ethos.userstore import UserStore
+
+def entry(index):
+    return {"id": f"t{index}", "name": f"Song {index}", "artist": "Artist"}
+
+@pytest.fixture
+def store(tmp_path):
+    store = UserStore(tmp_path / "user.db")
+    yield store
+    store.close()
+
+def row_ids(store, name):
+    return store.conn.execute(
+        "SELECT e.track_id, e.id FROM entries e JOIN playlists p ON p.id = e.playlist_id WHERE p.name = ?", (name,)
+    ).fetchall()
+
+def test_legacy_files_are_migrated_once(tmp_path):
+    (tmp_path / "playlists").mkdir()
+    (tmp_path / "playlists" / "Mix.json").write_text(json.dumps([entry(2), entry(0), entry(1)], indent=4))
+    (tmp_path / "playlists" / "Old.json").write_text(json.dumps([{"name": "Song", "artist": "Band"}]))
+    (tmp_path / "recents.txt").write_text("Newest by A\nOlder by B\n")
+
+    store = UserStore(tmp_path / "user.db")
+    assert store.names() == ["Mix", "Old"]
+    assert store.load("Mix") == [entry(2), entry(0), entry(1)]
+    assert store.load("Old") == [{"name": "Song", "artist": "Band"}]
+    assert store.recents() == ["Newest by A", "Older by B"]
+
+    store.delete("Old")
+    store.close()
+    store = UserStore(tmp_path / "user.db")
+    assert store.names() == ["Mix"]
+    assert store.migrate() is False
+    store.close()
+
+def test_add_and_remove(store):
+    for i in range(5):
+        store.add("P", entry(i))
+    store.add("P", entry(9), first=False)
+    assert [song["id"] for song in store.load("P")] == ["t4", "t3", "t2", "t1", "t0", "t9"]
+
+    assert store.remove("P", entry(2))
+    assert store.remove("P", {"name": "Song 3", "artist": "Artist"})
+    assert not store.remove("P", entry(7))
+    assert not store.remove("Missing", entry(0))
+    assert [song["id"] for song in store.load("P")] == ["t4", "t1", "t0", "t9"]
+
+def test_add_and_remove_use_the_indexes(store):
+    store.write("P", [entry(i) for i in range(100)])
+    plans = [
+        store.conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        for sql, params in [
+            ("SELECT MIN(position) FROM entries WHERE playlist_id = ?", (1,)),
+            ("SELECT id FROM entries WHERE playlist_id = ? AND track_id = ? ORDER BY position LIMIT 1", (1, "t5")),
+        ]
+    ]
+    assert all("USING" in row["detail"] and "INDEX" in row["detail"] for plan in plans for row in plan)
+
+def test_save_touches_only_changed_rows(store):
+    songs = [entry(i) for i in range(200)]
+    store.write("P", songs)
+    before = dict(row_ids(store, "P"))
+
+    songs = songs[:50] + [entry(500)] + songs[51:150] + songs[151:] + [songs[150]]
+    songs[0] = dict(songs[0], duration_ms=1000)
+    delta = store.save("P", songs)
+
+    assert store.load("P") == songs
+    after = dict(row_ids(store, "P"))
+    changed = {track for track in after if after[track] != before.get(track)}
+    assert changed == {"t500", "t150"}
+    assert delta["remove"] == ["t50", "t150"]
+    assert delta["update"] == [["t0", songs[0]]]
+
+def test_crowded_positions_are_renumbered(store):
+    store.write("P", [entry(0), entry(1)])
+    songs = [entry(0), entry(1)]
+    for i in range(60):
+        songs.insert(1, entry(100 + i))
+        store.save("P", songs)
+    assert store.load("P") == songs
+
+def test_recents_keep_the_latest_tracks(store):
+    for i in range(15):
+        store.add_recent(f"Track {i}")
+    store.add_recent("Track 3")
+    assert store.recents() == ["Track 3"] + [f"Track {i}" for i in range(14, 5, -1)]
+
+def test_concurrent_writers(tmp_path, store):
+    other = UserStore(tmp_path / "user.db")
+    assert store.conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    def add(target, offset):
+        for i in range(50):
+            target.add("P", entry(offset + i))
+
+    threads = [threading.Thread(target=add, args=(target, offset)) for target, offset in ((store, 0), (other, 1000))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    reader = sqlite3.connect(tmp_path / "user.db")
+    assert reader.execute("SELECT COUNT(*) FROM entries").fetchone()[0] == 100
+    assert len(store.load("P")) == 100
+    other.close()